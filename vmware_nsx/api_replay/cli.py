@@ -16,6 +16,7 @@ from vmware_nsx.api_replay import client
 
 DEFAULT_DOMAIN_ID = 'default'
 DEFAULT_LOGFILE = 'nsx_migration.log'
+DEFAULT_MAX_WORKERS = 10
 
 
 class ApiReplayCli(object):
@@ -36,7 +37,9 @@ class ApiReplayCli(object):
             dest_os_password=args.dest_os_password,
             dest_os_auth_url=args.dest_os_auth_url,
             use_old_keystone=args.use_old_keystone,
-            logfile=args.logfile)
+            logfile=args.logfile,
+            max_workers=args.max_workers,
+            journal=args.journal)
 
     def _setup_argparse(self):
         parser = argparse.ArgumentParser()
@@ -114,6 +117,20 @@ class ApiReplayCli(object):
             default=DEFAULT_LOGFILE,
             help="Output logfile.")
 
+        parser.add_argument(
+            "--max-workers",
+            default=DEFAULT_MAX_WORKERS,
+            type=int,
+            help="The maximal number of objects migrated concurrently.")
+
+        parser.add_argument(
+            "--journal",
+            default=None,
+            help="Checkpoint journal of the migrated objects. Running the "
+                 "migration again with the same journal resumes it. A "
+                 "journal cannot be used with another destination. By "
+                 "default no journal is kept.")
+
         # NOTE: this will return an error message if any of the
         # require options are missing.
         return parser.parse_args()
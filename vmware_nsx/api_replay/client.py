@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import logging
 
 import six
@@ -21,6 +22,7 @@ from neutronclient.v2_0 import client
 from oslo_utils import excutils
 
 from vmware_nsx.api_replay import utils
+from vmware_nsx.common import utils as nsx_utils
 
 logging.basicConfig(level=logging.INFO)
 LOG = logging.getLogger(__name__)
@@ -38,7 +40,7 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
                  dest_os_username, dest_os_user_domain_id,
                  dest_os_tenant_name, dest_os_tenant_domain_id,
                  dest_os_password, dest_os_auth_url,
-                 use_old_keystone, logfile):
+                 use_old_keystone, logfile, max_workers=1, journal=None):
 
         if logfile:
             f_handler = logging.FileHandler(logfile)
@@ -80,14 +82,27 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
                 password=dest_os_password,
                 auth_url=dest_os_auth_url)
 
+        # Independent objects of each phase are migrated concurrently, and
+        # each migrated object is written to the journal so that an
+        # interrupted migration can be resumed
+        self.max_workers = max_workers
+        self.journal = utils.MigrationJournal(journal,
+                                              destination=dest_os_auth_url)
+        self.phases_stats = []
+
         LOG.info("Starting NSX migration.")
-        # Migrate all the objects
-        self.migrate_security_groups()
-        self.migrate_qos_policies()
-        routers_routes, routers_gw_info = self.migrate_routers()
-        self.migrate_networks_subnets_ports(routers_gw_info)
-        self.migrate_floatingips()
-        self.migrate_routers_routes(routers_routes)
+        try:
+            # Migrate all the objects
+            self.migrate_security_groups()
+            self.migrate_qos_policies()
+            routers_routes, routers_gw_info = self.migrate_routers()
+            self.migrate_networks_subnets_ports(routers_gw_info)
+            self.migrate_floatingips()
+            self.migrate_routers_routes(routers_routes)
+        finally:
+            self.journal.close()
+            for stats in self.phases_stats:
+                stats.report()
         LOG.info("NSX migration is Done.")
 
     def connect_to_client(self, username, user_domain_id,
@@ -103,26 +118,50 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
         neutron = client.Client(session=sess)
         return neutron
 
-    def find_subnet_by_id(self, subnet_id, subnets):
-        for subnet in subnets:
-            if subnet['id'] == subnet_id:
-                return subnet
+    def index_by_id(self, objects):
+        """Returns a dictionary of the given objects by their id."""
+        return dict((obj['id'], obj) for obj in objects)
 
-    def get_ports_on_network(self, network_id, ports):
-        """Returns all the ports on a given network_id."""
-        ports_on_network = []
-        for port in ports:
-            if port['network_id'] == network_id:
-                ports_on_network.append(port)
-        return ports_on_network
+    def index_by_network(self, objects):
+        """Returns a dictionary of the lists of objects by network_id."""
+        objects_by_network = collections.defaultdict(list)
+        for obj in objects:
+            objects_by_network[obj['network_id']].append(obj)
+        return objects_by_network
 
-    def have_id(self, id, groups):
-        """If the sg_id is in groups return true else false."""
-        for group in groups:
-            if id == group['id']:
-                return group
+    def migrate_objects(self, phase, objects, migrate_func):
+        """Migrate the objects of a phase using a bounded pool of workers
 
-        return False
+        Objects found in the journal are skipped. migrate_func is called with
+        each of the other objects, and may return the id of the destination
+        object, which is written to the journal.
+        Returns a list of (object, exception) tuples of the failed objects.
+        """
+        stats = utils.MigrationPhaseStats(phase)
+        self.phases_stats.append(stats)
+        objects_to_migrate = []
+        for obj in objects:
+            if self.journal.is_done(phase, obj['id']):
+                stats.skipped += 1
+            else:
+                objects_to_migrate.append(obj)
+
+        def _migrate(obj):
+            dest_id = migrate_func(obj)
+            self.journal.record(phase, obj['id'], dest_id)
+            stats.migrated += 1
+            return dest_id
+
+        failures = []
+        for obj, dest_id, e in nsx_utils.run_in_pool(
+                _migrate, objects_to_migrate, self.max_workers):
+            if e:
+                LOG.error("Failed to migrate %(phase)s %(id)s: %(e)s",
+                          {'phase': phase, 'id': obj['id'], 'e': e})
+                stats.failed += 1
+                failures.append((obj, e))
+        stats.done()
+        return failures
 
     def migrate_qos_rule(self, dest_policy, source_rule):
         """Add the QoS rule from the source to the QoS policy
@@ -176,8 +215,10 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
             # QoS disabled on source
             return
 
-        for pol in source_qos_pols:
-            dest_pol = self.have_id(pol['id'], dest_qos_pols)
+        dest_qos_pols = self.index_by_id(dest_qos_pols)
+
+        def _migrate_qos_policy(pol):
+            dest_pol = dest_qos_pols.get(pol['id'])
             # If the policy already exists on the dest_neutron
             if dest_pol:
                 # make sure all the QoS policy rules are there and
@@ -188,18 +229,15 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
             # dest server doesn't have the group so we create it here.
             else:
                 qos_rules = pol.pop('rules')
-                try:
-                    body = self.prepare_qos_policy(pol)
-                    new_pol = self.dest_neutron.create_qos_policy(
-                        body={'policy': body})
-                except Exception as e:
-                    LOG.error("Failed to create QoS policy %(pol)s: %(e)s",
-                              {'pol': pol['id'], 'e': e})
-                    continue
-                else:
-                    LOG.info("Created QoS policy %s", new_pol)
-                    for qos_rule in qos_rules:
-                        self.migrate_qos_rule(new_pol['policy'], qos_rule)
+                body = self.prepare_qos_policy(pol)
+                new_pol = self.dest_neutron.create_qos_policy(
+                    body={'policy': body})
+                LOG.info("Created QoS policy %s", new_pol)
+                for qos_rule in qos_rules:
+                    self.migrate_qos_rule(new_pol['policy'], qos_rule)
+
+        self.migrate_objects('qos_policies', source_qos_pols,
+                             _migrate_qos_policy)
 
     def migrate_security_groups(self):
         """Migrates security groups from source to dest neutron."""
@@ -210,20 +248,22 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
         dest_sec_groups = self.dest_neutron.list_security_groups()
 
         source_sec_groups = source_sec_groups['security_groups']
-        dest_sec_groups = dest_sec_groups['security_groups']
+        dest_sec_groups = self.index_by_id(
+            dest_sec_groups['security_groups'])
+
+        LOG.info("Migrating %s security groups", len(source_sec_groups))
 
-        total_num = len(source_sec_groups)
-        LOG.info("Migrating %s security groups", total_num)
-        for count, sg in enumerate(source_sec_groups, 1):
-            dest_sec_group = self.have_id(sg['id'], dest_sec_groups)
+        def _migrate_security_group(sg):
+            dest_sec_group = dest_sec_groups.get(sg['id'])
             # If the security group already exists on the dest_neutron
             if dest_sec_group:
                 # make sure all the security group rules are there and
                 # create them if not
+                dest_rule_ids = set(
+                    rule['id']
+                    for rule in dest_sec_group['security_group_rules'])
                 for sg_rule in sg['security_group_rules']:
-                    if(self.have_id(sg_rule['id'],
-                                    dest_sec_group['security_group_rules'])
-                       is False):
+                    if sg_rule['id'] not in dest_rule_ids:
                         try:
                             body = self.prepare_security_group_rule(sg_rule)
                             self.dest_neutron.create_security_group_rule(
@@ -235,38 +275,33 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
                             # that already exist because of a match an error
                             # is raised here but that's okay.
                             pass
+                return
 
             # dest server doesn't have the group so we create it here.
-            else:
-                sg_rules = sg.pop('security_group_rules')
+            sg_rules = sg.pop('security_group_rules')
+            body = self.prepare_security_group(sg)
+            new_sg = self.dest_neutron.create_security_group(
+                {'security_group': body})
+            LOG.info("Created security-group %s", new_sg)
+
+            # Note - policy security groups will have no rules, and will
+            # be created on the destination with the default rules only
+            for sg_rule in sg_rules:
                 try:
-                    body = self.prepare_security_group(sg)
-                    new_sg = self.dest_neutron.create_security_group(
-                        {'security_group': body})
-                    LOG.info("Created security-group %(count)s/%(total)s: "
-                             "%(sg)s",
-                             {'count': count, 'total': total_num,
-                              'sg': new_sg})
-                except Exception as e:
-                    LOG.error("Failed to create security group (%(sg)s): "
-                              "%(e)s",
-                              {'sg': sg, 'e': e})
-
-                # Note - policy security groups will have no rules, and will
-                # be created on the destination with the default rules only
-                for sg_rule in sg_rules:
-                    try:
-                        body = self.prepare_security_group_rule(sg_rule)
-                        rule = self.dest_neutron.create_security_group_rule(
-                            {'security_group_rule': body})
-                        LOG.debug("created security group rule %s", rule['id'])
-                    except Exception:
-                        # NOTE(arosen): when you create a default
-                        # security group it is automatically populated
-                        # with some rules. When we go to create the rules
-                        # that already exist because of a match an error
-                        # is raised here but that's okay.
-                        pass
+                    body = self.prepare_security_group_rule(sg_rule)
+                    rule = self.dest_neutron.create_security_group_rule(
+                        {'security_group_rule': body})
+                    LOG.debug("created security group rule %s", rule['id'])
+                except Exception:
+                    # NOTE(arosen): when you create a default
+                    # security group it is automatically populated
+                    # with some rules. When we go to create the rules
+                    # that already exist because of a match an error
+                    # is raised here but that's okay.
+                    pass
+
+        self.migrate_objects('security_groups', source_sec_groups,
+                             _migrate_security_group)
 
     def migrate_routers(self):
         """Migrates routers from source to dest neutron.
@@ -282,49 +317,43 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
             # L3 might be disabled in the source
             source_routers = []
 
-        dest_routers = self.dest_neutron.list_routers()['routers']
+        dest_routers = self.index_by_id(
+            self.dest_neutron.list_routers()['routers'])
         update_routes = {}
         gw_info = {}
 
-        total_num = len(source_routers)
-        LOG.info("Migrating %s routers", total_num)
-        for count, router in enumerate(source_routers, 1):
+        LOG.info("Migrating %s routers", len(source_routers))
+        for router in source_routers:
             if router.get('routes'):
                 update_routes[router['id']] = router['routes']
 
             if router.get('external_gateway_info'):
                 gw_info[router['id']] = router['external_gateway_info']
 
-            dest_router = self.have_id(router['id'], dest_routers)
-            if dest_router is False:
+        def _migrate_router(router):
+            if router['id'] not in dest_routers:
                 body = self.prepare_router(router)
-                try:
-                    new_router = (self.dest_neutron.create_router(
-                        {'router': body}))
-                    LOG.info("created router %(count)s/%(total)s: %(rtr)s",
-                             {'count': count, 'total': total_num,
-                              'rtr': new_router})
-                except Exception as e:
-                    LOG.error("Failed to create router %(rtr)s: %(e)s",
-                              {'rtr': router, 'e': e})
+                new_router = (self.dest_neutron.create_router(
+                    {'router': body}))
+                LOG.info("created router %s", new_router)
+
+        self.migrate_objects('routers', source_routers, _migrate_router)
         return update_routes, gw_info
 
     def migrate_routers_routes(self, routers_routes):
         """Add static routes to the created routers."""
-        total_num = len(routers_routes)
-        LOG.info("Migrating %s routers routes", total_num)
-        for count, (router_id, routes) in enumerate(
-            six.iteritems(routers_routes), 1):
-            try:
-                self.dest_neutron.update_router(router_id,
-                    {'router': {'routes': routes}})
-                LOG.info("Added routes to router %(rtr)s %(count)s/%(total)s:",
-                         {'count': count, 'total': total_num,
-                          'rtr': router_id})
-            except Exception as e:
-                LOG.error("Failed to add routes %(routes)s to router "
-                          "%(rtr)s: %(e)s",
-                          {'routes': routes, 'rtr': router_id, 'e': e})
+        LOG.info("Migrating %s routers routes", len(routers_routes))
+
+        def _migrate_router_routes(router):
+            self.dest_neutron.update_router(router['id'],
+                {'router': {'routes': router['routes']}})
+            LOG.info("Added routes to router %s", router['id'])
+
+        self.migrate_objects(
+            'routes',
+            [{'id': router_id, 'routes': routes}
+             for router_id, routes in six.iteritems(routers_routes)],
+            _migrate_router_routes)
 
     def migrate_subnetpools(self):
         subnetpools_map = {}
@@ -346,6 +375,9 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
                         dpool['ip_version'] == pool['ip_version']):
                         subnetpools_map[pool['id']] = dpool['id']
                         break
+            elif self.journal.is_done('subnetpools', pool['id']):
+                subnetpools_map[pool['id']] = self.journal.get_dest_id(
+                    'subnetpools', pool['id'])
             else:
                 old_id = pool['id']
                 body = self.prepare_subnetpool(pool)
@@ -356,6 +388,7 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
                     new_id = self.dest_neutron.create_subnetpool(
                         {'subnetpool': body})['subnetpool']['id']
                     subnetpools_map[old_id] = new_id
+                    self.journal.record('subnetpools', old_id, new_id)
                     # refresh the list of existing subnetpools
                     dest_subnetpools = self.dest_neutron.list_subnetpools()[
                         'subnetpools']
@@ -365,13 +398,25 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
         return subnetpools_map
 
     def migrate_networks_subnets_ports(self, routers_gw_info):
-        """Migrates networks/ports/router-uplinks from src to dest neutron."""
+        """Migrates networks/ports/router-uplinks from src to dest neutron.
+
+        The networks, subnets, ports and DHCP configuration are migrated in
+        this order, each stage migrating the objects of all the networks
+        concurrently.
+        """
         source_ports = self.source_neutron.list_ports()['ports']
         source_subnets = self.source_neutron.list_subnets()['subnets']
         source_networks = self.source_neutron.list_networks()['networks']
         dest_networks = self.dest_neutron.list_networks()['networks']
         dest_ports = self.dest_neutron.list_ports()['ports']
 
+        # Index the objects once, instead of scanning the lists for each
+        # network, subnet & port
+        source_subnets = self.index_by_id(source_subnets)
+        source_ports_by_network = self.index_by_network(source_ports)
+        dest_network_ids = set(net['id'] for net in dest_networks)
+        dest_port_ids = set(port['id'] for port in dest_ports)
+
         remove_qos = False
         if not self.dest_qos_support:
             remove_qos = True
@@ -384,39 +429,109 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
 
         subnetpools_map = self.migrate_subnetpools()
 
-        total_num = len(source_networks)
         LOG.info("Migrating %(nets)s networks, %(subnets)s subnets and "
                  "%(ports)s ports",
-                 {'nets': total_num, 'subnets': len(source_subnets),
+                 {'nets': len(source_networks),
+                  'subnets': len(source_subnets),
                   'ports': len(source_ports)})
-        for count, network in enumerate(source_networks, 1):
-            external_net = network.get('router:external')
+
+        # only create networks the dest server doesn't have, or which were
+        # created by an interrupted run of the migration
+        networks = []
+        for network in source_networks:
+            if (network['id'] in dest_network_ids and
+                    not self.journal.is_done('networks', network['id'])):
+                if not self.journal.resumed:
+                    continue
+                # The previous run was interrupted after creating the
+                # network, but before writing it to the journal
+                LOG.warning("Network %s was created on the destination "
+                            "without being journaled. Migrating its "
+                            "subnets and ports.", network['id'])
+                self.journal.record('networks', network['id'],
+                                    network['id'])
+            networks.append(network)
+
+        def _migrate_network(network):
             body = self.prepare_network(
                 network, remove_qos=remove_qos,
                 dest_default_public_net=dest_default_public_net)
-
-            # only create network if the dest server doesn't have it
-            if self.have_id(network['id'], dest_networks):
-                continue
-
             try:
                 created_net = self.dest_neutron.create_network(
                     {'network': body})['network']
-                LOG.info("Created network %(count)s/%(total)s: %(net)s",
-                         {'count': count, 'total': total_num,
-                          'net': created_net})
-            except Exception as e:
+                LOG.info("Created network %s", created_net)
+            except Exception:
                 # Print the network and exception to help debugging
                 with excutils.save_and_reraise_exception():
                     LOG.error("Failed to create network %s", body)
                     LOG.error("Source network: %s", network)
-                    raise e
+            return created_net['id']
+
+        failures = self.migrate_objects('networks', networks,
+                                        _migrate_network)
+        if failures:
+            raise failures[0][1]
 
-            subnets_map = {}
-            dhcp_subnets = []
+        subnets = self._get_subnets_to_migrate(
+            networks, source_subnets, subnetpools_map)
+
+        def _migrate_subnet(subnet):
+            created_subnet = self.dest_neutron.create_subnet(
+                {'subnet': subnet['body']})['subnet']
+            LOG.info("Created subnet: %s", created_subnet['id'])
+            return created_subnet['id']
+
+        self.migrate_objects('subnets', subnets, _migrate_subnet)
+
+        subnets_map = {}
+        dhcp_subnets = []
+        for subnet in subnets:
+            created_subnet_id = self.journal.get_dest_id(
+                'subnets', subnet['id'])
+            if created_subnet_id:
+                subnets_map[subnet['id']] = created_subnet_id
+                if subnet['enable_dhcp']:
+                    dhcp_subnets.append({'id': created_subnet_id})
+
+        # create the ports on the networks
+        ports = []
+        for network in networks:
+            for port in source_ports_by_network.get(network['id'], []):
+                # only create port if the dest server doesn't have it
+                if (port['id'] in dest_port_ids and
+                    not self.journal.is_done('ports', port['id'])):
+                    continue
+
+                # Let the neutron dhcp-agent recreate this on its own
+                # and ignore floatingip ports as we create them ourselves
+                # later
+                if port['device_owner'] in ('network:dhcp',
+                                            'network:floatingip'):
+                    continue
+                ports.append(port)
+
+        def _migrate_port(port):
+            self._migrate_port(port, subnets_map, routers_gw_info,
+                               remove_qos)
+
+        self.migrate_objects('ports', ports, _migrate_port)
+
+        # Enable dhcp on the relevant subnets:
+        def _enable_dhcp(subnet):
+            self.dest_neutron.update_subnet(subnet['id'],
+                {'subnet': {'enable_dhcp': True}})
+
+        self.migrate_objects('subnets_dhcp', dhcp_subnets, _enable_dhcp)
+
+    def _get_subnets_to_migrate(self, networks, source_subnets,
+                                subnetpools_map):
+        """Return the subnets of the networks with their creation body"""
+        subnets = []
+        for network in networks:
+            external_net = network.get('router:external')
             count_dhcp_subnet = 0
             for subnet_id in network['subnets']:
-                subnet = self.find_subnet_by_id(subnet_id, source_subnets)
+                subnet = source_subnets.get(subnet_id)
                 body = self.prepare_subnet(subnet)
 
                 # specify the network_id that we just created above
@@ -449,135 +564,70 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
                         enable_dhcp = False
                     else:
                         enable_dhcp = True
-                try:
-                    created_subnet = self.dest_neutron.create_subnet(
-                        {'subnet': body})['subnet']
-                    LOG.info("Created subnet: %s", created_subnet['id'])
-                    subnets_map[subnet_id] = created_subnet['id']
-                    if enable_dhcp:
-                        dhcp_subnets.append(created_subnet)
-                except n_exc.BadRequest as e:
-                    LOG.error("Failed to create subnet: %(subnet)s: %(e)s",
-                              {'subnet': subnet, 'e': e})
-                    # NOTE(arosen): this occurs here if you run the script
-                    # multiple times as we don't currently
-                    # preserve the subnet_id. Also, 409 would be a better
-                    # response code for this in neutron :(
-
-            # create the ports on the network
-            ports = self.get_ports_on_network(network['id'], source_ports)
-            for port in ports:
-
-                body = self.prepare_port(port, remove_qos=remove_qos)
+                subnets.append({'id': subnet_id, 'body': body,
+                                'enable_dhcp': enable_dhcp})
+        return subnets
+
+    def _migrate_port(self, port, subnets_map, routers_gw_info, remove_qos):
+        body = self.prepare_port(port, remove_qos=remove_qos)
+
+        subnet_id = None
+        if port.get('fixed_ips'):
+            old_subnet_id = port['fixed_ips'][0]['subnet_id']
+            subnet_id = subnets_map.get(old_subnet_id)
+        # remove the old subnet id field from fixed_ips dict
+        for fixed_ips in body['fixed_ips']:
+            fixed_ips.pop('subnet_id', None)
+
+        if port['device_owner'] == 'network:router_gateway':
+            router_id = port['device_id']
+            enable_snat = True
+            if router_id in routers_gw_info:
+                # keep the original snat status of the router
+                enable_snat = routers_gw_info[router_id].get(
+                    'enable_snat', True)
+            rtr_body = {
+                "external_gateway_info":
+                    {"network_id": port['network_id'],
+                     "enable_snat": enable_snat,
+                     # keep the original GW IP
+                     "external_fixed_ips": port.get('fixed_ips')}}
+            self.dest_neutron.update_router(router_id, {'router': rtr_body})
+            LOG.info("Uplinked router %(rtr)s to external network %(net)s",
+                     {'rtr': router_id, 'net': port['network_id']})
+            return
 
-                # specify the network_id that we just created above
-                port['network_id'] = network['id']
+        if port['device_owner'] == 'network:router_interface' and subnet_id:
+            # uplink router_interface ports by creating the
+            # port, and attaching it to the router
+            # NOTE(arosen): this fails if you run the script multiple times
+            # without a journal as we don't track this.
+            # Note(asarfaty): also if the same network in source is attached
+            # to 2 routers, which the v3 plugin does not support.
+            router_id = port['device_id']
+            del body['device_owner']
+            del body['device_id']
+            created_port = self.dest_neutron.create_port(
+                {'port': body})['port']
+            LOG.info("Created interface port %(port)s (subnet "
+                     "%(subnet)s, ip %(ip)s, mac %(mac)s)",
+                     {'port': created_port['id'],
+                      'subnet': subnet_id,
+                      'ip': created_port['fixed_ips'][0]['ip_address'],
+                      'mac': created_port['mac_address']})
+            self.dest_neutron.add_interface_router(
+                router_id, {'port_id': created_port['id']})
+            LOG.info("Uplinked router %(rtr)s to network %(net)s",
+                     {'rtr': router_id, 'net': port['network_id']})
+            return
 
-                subnet_id = None
-                if port.get('fixed_ips'):
-                    old_subnet_id = port['fixed_ips'][0]['subnet_id']
-                    subnet_id = subnets_map.get(old_subnet_id)
-                # remove the old subnet id field from fixed_ips dict
-                for fixed_ips in body['fixed_ips']:
-                    del fixed_ips['subnet_id']
-
-                # only create port if the dest server doesn't have it
-                if self.have_id(port['id'], dest_ports) is False:
-                    if port['device_owner'] == 'network:router_gateway':
-                        router_id = port['device_id']
-                        enable_snat = True
-                        if router_id in routers_gw_info:
-                            # keep the original snat status of the router
-                            enable_snat = routers_gw_info[router_id].get(
-                                'enable_snat', True)
-                        rtr_body = {
-                            "external_gateway_info":
-                                {"network_id": port['network_id'],
-                                 "enable_snat": enable_snat,
-                                 # keep the original GW IP
-                                 "external_fixed_ips": port.get('fixed_ips')}}
-                        try:
-                            self.dest_neutron.update_router(
-                                router_id, {'router': rtr_body})
-                            LOG.info("Uplinked router %(rtr)s to external "
-                                     "network %(net)s",
-                                     {'rtr': router_id,
-                                      'net': port['network_id']})
-
-                        except Exception as e:
-                            LOG.error("Failed to add router gateway "
-                                      "(%(port)s): %(e)s",
-                                      {'port': port, 'e': e})
-                        continue
-
-                    # Let the neutron dhcp-agent recreate this on its own
-                    if port['device_owner'] == 'network:dhcp':
-                        continue
-
-                    # ignore these as we create them ourselves later
-                    if port['device_owner'] == 'network:floatingip':
-                        continue
-
-                    if (port['device_owner'] == 'network:router_interface' and
-                        subnet_id):
-                        try:
-                            # uplink router_interface ports by creating the
-                            # port, and attaching it to the router
-                            router_id = port['device_id']
-                            del body['device_owner']
-                            del body['device_id']
-                            created_port = self.dest_neutron.create_port(
-                                {'port': body})['port']
-                            LOG.info("Created interface port %(port)s (subnet "
-                                     "%(subnet)s, ip %(ip)s, mac %(mac)s)",
-                                     {'port': created_port['id'],
-                                      'subnet': subnet_id,
-                                      'ip': created_port['fixed_ips'][0][
-                                            'ip_address'],
-                                      'mac': created_port['mac_address']})
-                            self.dest_neutron.add_interface_router(
-                                router_id,
-                                {'port_id': created_port['id']})
-                            LOG.info("Uplinked router %(rtr)s to network "
-                                     "%(net)s",
-                                     {'rtr': router_id, 'net': network['id']})
-                        except Exception as e:
-                            # NOTE(arosen): this occurs here if you run the
-                            # script multiple times as we don't track this.
-                            # Note(asarfaty): also if the same network in
-                            # source is attached to 2 routers, which the v3
-                            # plugin does not support.
-                            LOG.error("Failed to add router interface port"
-                                      "(%(port)s): %(e)s",
-                                      {'port': port, 'e': e})
-                        continue
-
-                    try:
-                        created_port = self.dest_neutron.create_port(
-                            {'port': body})['port']
-                    except Exception as e:
-                        # NOTE(arosen): this occurs here if you run the
-                        # script multiple times as we don't track this.
-                        LOG.error("Failed to create port (%(port)s) : %(e)s",
-                                  {'port': port, 'e': e})
-                    else:
-                        LOG.info("Created port %(port)s (subnet "
-                                 "%(subnet)s, ip %(ip)s, mac %(mac)s)",
-                                 {'port': created_port['id'],
-                                  'subnet': subnet_id,
-                                  'ip': created_port['fixed_ips'][0][
-                                        'ip_address'],
-                                  'mac': created_port['mac_address']})
-
-            # Enable dhcp on the relevant subnets:
-            for subnet in dhcp_subnets:
-                try:
-                    self.dest_neutron.update_subnet(subnet['id'],
-                        {'subnet': {'enable_dhcp': True}})
-                except Exception as e:
-                    LOG.error("Failed to enable DHCP on subnet %(subnet)s: "
-                              "%(e)s",
-                              {'subnet': subnet['id'], 'e': e})
+        created_port = self.dest_neutron.create_port({'port': body})['port']
+        LOG.info("Created port %(port)s (subnet %(subnet)s, ip %(ip)s, "
+                 "mac %(mac)s)",
+                 {'port': created_port['id'],
+                  'subnet': subnet_id,
+                  'ip': created_port['fixed_ips'][0]['ip_address'],
+                  'mac': created_port['mac_address']})
 
     def migrate_floatingips(self):
         """Migrates floatingips from source to dest neutron."""
@@ -587,13 +637,10 @@ class ApiReplayClient(utils.PrepareObjectForMigration):
             # L3 might be disabled in the source
             source_fips = []
 
-        total_num = len(source_fips)
-        for count, source_fip in enumerate(source_fips, 1):
+        def _migrate_floatingip(source_fip):
             body = self.prepare_floatingip(source_fip)
-            try:
-                fip = self.dest_neutron.create_floatingip({'floatingip': body})
-                LOG.info("Created floatingip %(count)s/%(total)s : %(fip)s",
-                         {'count': count, 'total': total_num, 'fip': fip})
-            except Exception as e:
-                LOG.error("Failed to create floating ip (%(fip)s) : %(e)s",
-                          {'fip': source_fip, 'e': e})
+            fip = self.dest_neutron.create_floatingip({'floatingip': body})
+            LOG.info("Created floatingip %s", fip)
+            return fip['floatingip']['id']
+
+        self.migrate_objects('floatingips', source_fips, _migrate_floatingip)
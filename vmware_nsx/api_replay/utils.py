@@ -13,9 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 import logging
+import os
+import time
 
 from neutron_lib.api import attributes as lib_attrs
 from oslo_config import cfg
+from oslo_serialization import jsonutils
 from oslo_utils import uuidutils
 import webob.exc
 
@@ -237,3 +240,112 @@ class PrepareObjectForMigration(object):
     def prepare_qos_policy(self, policy, direct_call=False):
         self.fix_description(policy)
         return self.drop_fields(policy, self.drop_qos_policy_fields)
+
+
+class MigrationJournal(object):
+    """Checkpoint journal of the migrated objects
+
+    Each line of the journal file is a json entry with the phase and the id
+    of a migrated object, and the id of the object created for it on the
+    destination. Running the migration again with the same journal skips
+    the objects already in it.
+    The first line holds the destination of the migration, so that the
+    journal is not used to resume a migration to another destination.
+    """
+
+    def __init__(self, path=None, destination=None):
+        self._path = path
+        self._destination = None
+        self._entries = {}
+        self._file = None
+        if path:
+            needs_newline = self._load()
+            if (self._destination and destination and
+                    self._destination != destination):
+                raise ValueError(
+                    "Migration journal %(path)s belongs to a migration to "
+                    "%(journal_dest)s and cannot be used for %(dest)s" %
+                    {'path': path, 'journal_dest': self._destination,
+                     'dest': destination})
+            self._file = open(path, 'a')
+            if needs_newline:
+                self._file.write('\n')
+            if not self._destination and not self._entries:
+                self._destination = destination
+                self._write({'destination': destination})
+        # Whether the journal holds entries of a previous run
+        self.resumed = bool(self._entries)
+
+    def _load(self):
+        """Load the journal entries, and return True if the last is cut"""
+        if not os.path.exists(self._path):
+            return False
+        line = ''
+        with open(self._path) as journal_file:
+            for line in journal_file:
+                if not line.strip():
+                    continue
+                try:
+                    entry = jsonutils.loads(line)
+                except ValueError:
+                    # The last entry is cut if the migration was killed
+                    # while writing it
+                    LOG.warning("Ignoring corrupted journal entry: %s", line)
+                    continue
+                if 'destination' in entry:
+                    self._destination = entry['destination']
+                    continue
+                self._entries[(entry['phase'], entry['id'])] = entry.get(
+                    'dest_id')
+        LOG.info("Loaded %(num)s entries from migration journal %(path)s",
+                 {'num': len(self._entries), 'path': self._path})
+        return bool(line) and not line.endswith('\n')
+
+    def is_done(self, phase, obj_id):
+        return (phase, obj_id) in self._entries
+
+    def get_dest_id(self, phase, obj_id):
+        return self._entries.get((phase, obj_id))
+
+    def record(self, phase, obj_id, dest_id=None):
+        self._entries[(phase, obj_id)] = dest_id
+        self._write({'phase': phase, 'id': obj_id, 'dest_id': dest_id})
+
+    def _write(self, entry):
+        if self._file:
+            self._file.write(jsonutils.dumps(entry) + '\n')
+            self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class MigrationPhaseStats(object):
+    """Throughput and error counters of a migration phase"""
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.migrated = 0
+        self.skipped = 0
+        self.failed = 0
+        self._start = time.time()
+        self._end = None
+
+    def done(self):
+        self._end = time.time()
+
+    @property
+    def duration(self):
+        return (self._end or time.time()) - self._start
+
+    def report(self):
+        duration = self.duration
+        rate = self.migrated / duration if duration else 0
+        LOG.info("Phase %(phase)s: migrated %(migrated)s, skipped "
+                 "%(skipped)s, failed %(failed)s in %(duration).1f seconds "
+                 "(%(rate).1f per second)",
+                 {'phase': self.phase, 'migrated': self.migrated,
+                  'skipped': self.skipped, 'failed': self.failed,
+                  'duration': duration, 'rate': rate})
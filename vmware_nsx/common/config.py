@@ -168,7 +168,13 @@ sync_opts = [
                        "synchronization on show operations. In this way, show "
                        "operations will always fetch the operational status "
                        "of the resource from the NSX backend, and this might "
-                       "have a considerable impact on overall performance."))
+                       "have a considerable impact on overall performance.")),
+    cfg.FloatOpt('status_read_freshness', default=0, min=0,
+                 help=_("Time, in seconds, for which the status of a "
+                        "resource fetched from the NSX backend by a show "
+                        "operation is reused by the following show operations "
+                        "of the same resource. Concurrent show operations of "
+                        "a resource always share a single backend request.")),
 ]
 
 connection_opts = [
@@ -241,6 +247,25 @@ nsx_common_opts = [
                       "parameter to tooz coordinator. By default, value is "
                       "None and oslo_concurrency is used for single-node "
                       "lock management.")),
+    cfg.FloatOpt('locking_trace_sample_rate',
+                 default=0.01,
+                 min=0,
+                 max=1,
+                 help=_("(Optional) Fraction of the lock acquisitions whose "
+                        "callers are logged when debug logging is enabled. "
+                        "0 disables the lock tracing.")),
+    cfg.IntOpt('locking_trace_depth',
+               default=5,
+               min=1,
+               help=_("(Optional) Number of callers logged for a traced lock "
+                      "acquisition.")),
+    cfg.IntOpt('locking_metrics_log_interval',
+               default=0,
+               min=0,
+               help=_("(Optional) Interval in seconds between logs of the "
+                      "lock metrics: acquisitions, contentions, wait and "
+                      "hold times by lock name prefix. 0 disables those "
+                      "logs.")),
     cfg.BoolOpt('api_replay_mode',
                 default=False,
                 help=_("If true, the server then allows the caller to "
@@ -266,6 +291,25 @@ nsx_common_opts = [
                default=10,
                help=_("Interval in seconds for Octavia statistics reporting. "
                       "0 means no reporting")),
+    cfg.BoolOpt('octavia_stats_changes_only',
+                default=False,
+                help=_("If True, only the statistics of listeners whose "
+                       "counters changed since they were last reported are "
+                       "sent to Octavia, except for a periodic full refresh "
+                       "every octavia_stats_full_refresh_interval seconds")),
+    cfg.IntOpt('octavia_stats_full_refresh_interval',
+               default=300,
+               help=_("Interval in seconds for reporting the statistics of "
+                      "all the listeners when octavia_stats_changes_only is "
+                      "set")),
+    cfg.IntOpt('octavia_stats_batch_size',
+               default=0,
+               help=_("Maximal number of listeners statistics sent to Octavia "
+                      "in a single message. 0 means no limit")),
+    cfg.IntOpt('octavia_stats_workers',
+               default=10,
+               help=_("Maximal number of concurrent backend calls used for "
+                      "collecting the Octavia statistics")),
 ]
 
 nsx_v3_and_p = [
@@ -488,6 +532,33 @@ nsx_v3_opts = nsx_v3_and_p + [
     cfg.BoolOpt('housekeeping_readonly',
                 default=True,
                 help=_("Housekeeping will only warn about breakage.")),
+    cfg.IntOpt('vpn_status_interval',
+               default=0,
+               help=_("Interval in seconds for collecting the status of all "
+                      "the VPNaaS IPsec sessions from the NSX, and updating "
+                      "the changed connections statuses in neutron. The "
+                      "collected statuses are used for connection status "
+                      "queries during this interval. 0 means disabled, and "
+                      "the statuses are fetched from the NSX on each query")),
+    cfg.IntOpt('vpn_status_workers',
+               default=10,
+               help=_("Maximal number of concurrent NSX calls used for "
+                      "fetching the VPNaaS IPsec sessions statuses")),
+    cfg.IntOpt('ipam_release_workers',
+               default=10,
+               help=_("Maximal number of concurrent NSX calls used for "
+                      "releasing the allocated IPs of a deleted IPAM "
+                      "subnet")),
+    cfg.IntOpt('ipam_reservation_block_size',
+               default=0,
+               help=_("Number of IP addresses of each IPAM subnet allocated "
+                      "on the NSX pool ahead of time, and used for the next "
+                      "ports allocations. 0 disables the reservation, and "
+                      "each IP is allocated on the NSX when needed")),
+    cfg.IntOpt('trunk_subport_workers',
+               default=10,
+               help=_("Maximal number of concurrent NSX calls used for "
+                      "adding or removing the subports of a trunk")),
 ]
 
 nsx_p_opts = nsx_v3_and_p + [
@@ -517,6 +588,18 @@ nsx_p_opts = nsx_v3_and_p + [
                 default=True,
                 help=_("If True, use nsx manager api for cases which are not "
                        "supported by the policy manager api")),
+    cfg.IntOpt('metadata_cache_ttl',
+               default=300,
+               help=_("Time, in seconds, for which the types of the NSX "
+                      "transport zones and the transport zones of the NSX "
+                      "segments are cached by the plugin. 0 disables the "
+                      "cache")),
+    cfg.IntOpt('metadata_cache_metrics_log_interval',
+               default=0,
+               min=0,
+               help=_("(Optional) Interval in seconds between logs of the "
+                      "metadata cache metrics: hits, misses and size. 0 "
+                      "disables those logs.")),
 ]
 
 
@@ -772,6 +855,11 @@ nsxv_opts = [
                default=1,
                help=_("(Optional) Set the interval (Seconds) for BGP "
                       "neighbour keep alive time.")),
+    cfg.IntOpt('bgp_edge_workers',
+               default=10,
+               help=_("(Optional) Maximal number of edges updated "
+                      "concurrently when the BGP configuration of a BGP "
+                      "speaker changes.")),
     cfg.IntOpt('ecmp_wait_time',
                default=2,
                help=_("(Optional) Set the wait time (Seconds) between "
@@ -808,6 +896,17 @@ nsxv_opts = [
                 default=False,
                 help=_("Use subnet's exclusive router as a platform for "
                        "LBaaS")),
+    cfg.IntOpt('qos_update_workers',
+               default=10,
+               help=_("Maximal number of networks port groups updated "
+                      "concurrently on the backend when a QoS policy is "
+                      "updated")),
+    cfg.IntOpt('ipam_reservation_block_size',
+               default=0,
+               help=_("Number of IP addresses of each IPAM subnet allocated "
+                      "on the NSX pool ahead of time, and used for the next "
+                      "ports allocations. 0 disables the reservation, and "
+                      "each IP is allocated on the NSX when needed")),
 ]
 
 # define the configuration of each NSX-V availability zone.
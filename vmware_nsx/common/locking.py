@@ -13,21 +13,180 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import logging
 import os
-import traceback
+import random
+import re
+import sys
+import time
 
 from oslo_concurrency import lockutils
 from oslo_config import cfg
 from oslo_log import log
 from tooz import coordination
 
+from vmware_nsx.common import config  # noqa
+
 LOG = log.getLogger(__name__)
 
+# Lock names are usually a constant prefix followed by the id of the locked
+# resource (edge-12, router-<uuid>), so the metrics are kept per prefix
+_RESOURCE_ID_RE = re.compile(
+    r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$|'
+    r'[-_]?\d+$')
+_NO_PREFIX = '<id>'
+
+# Wait time, in seconds, above which an acquisition is counted as contended
+CONTENTION_THRESHOLD = 0.001
+
+
+def _lock_name_prefix(name):
+    prefix = _RESOURCE_ID_RE.sub('', name).rstrip('-_')
+    return prefix or _NO_PREFIX
+
+
+def _get_caller(frame):
+    code = frame.f_code
+    return '%s:%s(%s)' % (code.co_filename, frame.f_lineno, code.co_name)
+
+
+def _get_short_trace(frame, depth):
+    """Return the callers of a frame, without reading any source lines"""
+    trace = []
+    while frame is not None and len(trace) < depth:
+        trace.append(_get_caller(frame))
+        frame = frame.f_back
+    return trace
+
+
+class LockMetrics(object):
+    """Acquisition metrics of the locks, by lock name prefix
+
+    Both the local and the distributed locks report here, so that the lock
+    names which serialize the workers can be found regardless of the locking
+    backend.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        # Current holder of each lock taken by this process, by lock name
+        self._holders = {}
+        self._last_report = time.time()
+
+    def _get_stats(self, prefix):
+        stats = self._stats.get(prefix)
+        if stats is None:
+            stats = {'acquired': 0,
+                     'contended': 0,
+                     'wait_time': 0.0,
+                     'max_wait_time': 0.0,
+                     'hold_time': 0.0,
+                     'max_hold_time': 0.0}
+            self._stats[prefix] = stats
+        return stats
+
+    def lock_acquired(self, name, caller, wait_time):
+        stats = self._get_stats(_lock_name_prefix(name))
+        stats['acquired'] += 1
+        stats['wait_time'] += wait_time
+        stats['max_wait_time'] = max(stats['max_wait_time'], wait_time)
+        if wait_time > CONTENTION_THRESHOLD:
+            stats['contended'] += 1
+        self._holders[name] = {'holder': caller,
+                               'pid': os.getpid(),
+                               'since': time.time()}
+
+    def lock_released(self, name, hold_time):
+        stats = self._get_stats(_lock_name_prefix(name))
+        stats['hold_time'] += hold_time
+        stats['max_hold_time'] = max(stats['max_hold_time'], hold_time)
+        self._holders.pop(name, None)
+        self._report_if_needed()
+
+    def get_holder(self, name):
+        """Return the current holder of a lock in this process, if any"""
+        return self._holders.get(name)
+
+    def get_metrics(self):
+        """Return a copy of the metrics, by lock name prefix
+
+        The current holders of the locks of each prefix are listed under
+        'holders', by lock name.
+        """
+        metrics = dict((prefix, dict(stats, holders={}))
+                       for prefix, stats in self._stats.items())
+        for name, holder in self._holders.items():
+            prefix = _lock_name_prefix(name)
+            if prefix in metrics:
+                metrics[prefix]['holders'][name] = dict(holder)
+        return metrics
+
+    def reset(self):
+        self._stats = {}
+        self._holders = {}
+        self._last_report = time.time()
+
+    def _report_if_needed(self):
+        interval = cfg.CONF.locking_metrics_log_interval
+        if not interval or time.time() - self._last_report < interval:
+            return
+        self._last_report = time.time()
+        # Report the prefixes with the longest total wait first
+        metrics = sorted(self._stats.items(),
+                         key=lambda item: item[1]['wait_time'],
+                         reverse=True)
+        for prefix, stats in metrics:
+            LOG.info("Lock %(prefix)s: acquired %(acquired)s times, "
+                     "contended %(contended)s times, wait time %(wait).3fs "
+                     "(max %(max_wait).3fs), hold time %(hold).3fs "
+                     "(max %(max_hold).3fs)",
+                     {'prefix': prefix,
+                      'acquired': stats['acquired'],
+                      'contended': stats['contended'],
+                      'wait': stats['wait_time'],
+                      'max_wait': stats['max_wait_time'],
+                      'hold': stats['hold_time'],
+                      'max_hold': stats['max_hold_time']})
+
+
+class _MeteredLock(object):
+    """Context manager wrapping a local or a distributed lock
+
+    Measures the time spent waiting for and holding the lock, and registers
+    its current holder.
+    """
+
+    def __init__(self, name, lock, caller, metrics):
+        self._name = name
+        self._lock = lock
+        self._caller = caller
+        self._metrics = metrics
+        self._acquired_at = None
+
+    def __enter__(self):
+        start = time.time()
+        result = self._lock.__enter__()
+        self._acquired_at = time.time()
+        self._metrics.lock_acquired(self._name, self._caller,
+                                    self._acquired_at - start)
+        return result
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        try:
+            return self._lock.__exit__(exc_type, exc_value, exc_tb)
+        finally:
+            self._metrics.lock_released(self._name,
+                                        time.time() - self._acquired_at)
+
+    def __getattr__(self, attr):
+        return getattr(self._lock, attr)
+
 
 class LockManager(object):
     _coordinator = None
     _coordinator_pid = None
     _connect_string = cfg.CONF.locking_coordinator_url
+    metrics = LockMetrics()
 
     def __init__(self):
         LOG.debug('LockManager initialized!')
@@ -36,16 +195,34 @@ class LockManager(object):
     def get_lock(name, **kwargs):
         if cfg.CONF.locking_coordinator_url:
             lck = LockManager._get_lock_distributed(name)
-            LOG.debug('Lock %s taken with stack trace %s', name,
-                      traceback.extract_stack())
-            return lck
         else:
             # Ensure that external=True
             kwargs['external'] = True
             lck = LockManager._get_lock_local(name, **kwargs)
-            LOG.debug('Lock %s taken with stack trace %s', name,
-                      traceback.extract_stack())
-            return lck
+        caller_frame = sys._getframe(1)
+        LockManager._trace_lock(name, caller_frame)
+        return _MeteredLock(name, lck, _get_caller(caller_frame),
+                            LockManager.metrics)
+
+    @staticmethod
+    def get_metrics():
+        """Return the lock metrics of this process, by lock name prefix"""
+        return LockManager.metrics.get_metrics()
+
+    @staticmethod
+    def _trace_lock(name, frame):
+        # Only a sample of the locks is traced, as this is on the path of
+        # most of the edge & router operations
+        sample_rate = cfg.CONF.locking_trace_sample_rate
+        if (not sample_rate or not LOG.isEnabledFor(logging.DEBUG) or
+                random.random() >= sample_rate):
+            return
+        LOG.debug('Lock %(name)s taken by %(trace)s, current holder '
+                  '%(holder)s',
+                  {'name': name,
+                   'trace': _get_short_trace(
+                       frame, cfg.CONF.locking_trace_depth),
+                   'holder': LockManager.metrics.get_holder(name)})
 
     @staticmethod
     def _get_lock_local(name, **kwargs):
@@ -15,6 +15,9 @@
 
 import copy
 import random
+import time
+
+from eventlet import event
 
 from neutron_lib import constants
 from neutron_lib import context as n_context
@@ -213,6 +216,58 @@ def _start_loopingcall(min_chunk_size, state_sync_interval, func,
     return state_synchronizer
 
 
+class SingleFlight(object):
+    """Merges the concurrent fetches of the same NSX resource
+
+    A fetch of a key which is already in progress waits for the running
+    fetch, and gets its result (or exception), instead of issuing another
+    backend request. Results are also reused by later fetches for freshness
+    seconds, if not 0.
+    """
+
+    def __init__(self, freshness=0):
+        self._freshness = freshness
+        self._in_flight = {}
+        self._results = {}
+
+    def _get_fresh_result(self, key):
+        result = self._results.get(key)
+        if result and time.time() - result[0] < self._freshness:
+            return result
+        self._results.pop(key, None)
+
+    def _store_result(self, key, value):
+        now = time.time()
+        # Drop the expired results, so the dict does not grow forever
+        for expired in [k for k, (t, v) in self._results.items()
+                        if now - t >= self._freshness]:
+            del self._results[expired]
+        self._results[key] = (now, value)
+
+    def fetch(self, key, fetch_func, *args, **kwargs):
+        result = self._get_fresh_result(key)
+        if result:
+            return result[1]
+        pending = self._in_flight.get(key)
+        if pending:
+            return pending.wait()
+        pending = event.Event()
+        self._in_flight[key] = pending
+        try:
+            value = fetch_func(*args, **kwargs)
+        except BaseException as e:
+            # Also wake the waiters if the fetch was killed or timed out
+            pending.send_exception(e)
+            raise
+        else:
+            if self._freshness:
+                self._store_result(key, value)
+            pending.send(value)
+            return value
+        finally:
+            del self._in_flight[key]
+
+
 class NsxSynchronizer(object):
 
     LS_URI = nsxlib._build_uri_path(
@@ -229,9 +284,11 @@ class NsxSynchronizer(object):
 
     def __init__(self, plugin, cluster, state_sync_interval,
                  req_delay, min_chunk_size, max_rand_delay=0,
-                 initial_delay=5):
+                 initial_delay=5, status_freshness=0):
         random.seed()
         self._nsx_cache = NsxCache()
+        # Merges the concurrent punctual status reads of a resource
+        self._single_flight = SingleFlight(status_freshness)
         # Store parameters as instance members
         # NOTE(salv-orlando): apologies if it looks java-ish
         self._plugin = plugin
@@ -268,7 +325,9 @@ class NsxSynchronizer(object):
         if not lswitches:
             # Try to get logical switches from nsx
             try:
-                lswitches = nsx_utils.fetch_nsx_switches(
+                lswitches = self._single_flight.fetch(
+                    ('network', neutron_network_data['id']),
+                    nsx_utils.fetch_nsx_switches,
                     context.session, self._cluster,
                     neutron_network_data['id'])
             except exceptions.NetworkNotFound:
@@ -346,18 +405,22 @@ class NsxSynchronizer(object):
             lswitches = [lsw.get('data') for lsw in lswitches]
             self.synchronize_network(ctx, network, lswitches)
 
+    def _fetch_lrouter(self, context, router_id):
+        nsx_router_id = nsx_utils.get_nsx_router_id(
+            context.session, self._cluster, router_id)
+        if nsx_router_id:
+            # This query will return the logical router status too
+            return routerlib.get_lrouter(self._cluster, nsx_router_id)
+
     def synchronize_router(self, context, neutron_router_data,
                            lrouter=None):
         """Synchronize a neutron router with its NSX counterpart."""
         if not lrouter:
             # Try to get router from nsx
             try:
-                # This query will return the logical router status too
-                nsx_router_id = nsx_utils.get_nsx_router_id(
-                    context.session, self._cluster, neutron_router_data['id'])
-                if nsx_router_id:
-                    lrouter = routerlib.get_lrouter(
-                        self._cluster, nsx_router_id)
+                lrouter = self._single_flight.fetch(
+                    ('router', neutron_router_data['id']),
+                    self._fetch_lrouter, context, neutron_router_data['id'])
             except exceptions.NotFound:
                 # NOTE(salv-orlando): We should be catching
                 # api_exc.ResourceNotFound here
@@ -425,6 +488,13 @@ class NsxSynchronizer(object):
             self.synchronize_router(
                 ctx, router, lrouter and lrouter.get('data'))
 
+    def _fetch_lswitchport(self, context, port_id):
+        ls_uuid, lp_uuid = nsx_utils.get_nsx_switch_and_port_id(
+            context.session, self._cluster, port_id)
+        if lp_uuid:
+            return switchlib.get_port(self._cluster, ls_uuid, lp_uuid,
+                                      relations='LogicalPortStatus')
+
     def synchronize_port(self, context, neutron_port_data,
                          lswitchport=None, ext_networks=None):
         """Synchronize a Neutron port with its NSX counterpart."""
@@ -443,12 +513,9 @@ class NsxSynchronizer(object):
         if not lswitchport:
             # Try to get port from nsx
             try:
-                ls_uuid, lp_uuid = nsx_utils.get_nsx_switch_and_port_id(
-                    context.session, self._cluster, neutron_port_data['id'])
-                if lp_uuid:
-                    lswitchport = switchlib.get_port(
-                        self._cluster, ls_uuid, lp_uuid,
-                        relations='LogicalPortStatus')
+                lswitchport = self._single_flight.fetch(
+                    ('port', neutron_port_data['id']),
+                    self._fetch_lswitchport, context, neutron_port_data['id'])
             except (exceptions.PortNotFoundOnNetwork):
                 # NOTE(salv-orlando): We should be catching
                 # api_exc.ResourceNotFound here instead
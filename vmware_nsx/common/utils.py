@@ -15,6 +15,7 @@
 
 import inspect
 import re
+import time
 
 from distutils import version
 import functools
@@ -290,3 +291,82 @@ def spawn_n(func, *args, **kwargs):
         func(*args, **kwargs)
 
     eventlet.spawn_n(context_wrapper, *args, **kwargs)
+
+
+def run_in_pool(func, items, pool_size):
+    """Run func on each of the items using a bounded pool of green threads.
+
+    Returns a list of (item, result, exception) tuples, in the order of the
+    items. Exceptions raised by func are returned rather than raised, so that
+    the caller can aggregate partial failures.
+    The context is copied to the threadlocal store of each green thread, as
+    in spawn_n.
+    """
+    items = list(items)
+    if not items:
+        return []
+    _context = common_context.get_current()
+
+    def context_wrapper(item):
+        if _context is not None:
+            _context.update_store()
+        try:
+            return item, func(item), None
+        except Exception as e:
+            return item, None, e
+
+    pool = eventlet.GreenPool(max(1, min(pool_size, len(items))))
+    return list(pool.imap(context_wrapper, items))
+
+
+class TtlCache(object):
+    """In-memory cache whose entries expire after a fixed time
+
+    Values are loaded by the caller supplied function on a miss, and kept
+    for ttl seconds, unless invalidated earlier. A ttl of 0 disables the
+    caching. Hits & misses are counted, so that the efficiency of the cache
+    can be monitored, and logged every metrics_log_interval seconds if set.
+    """
+
+    def __init__(self, ttl, name='', metrics_log_interval=0):
+        self.ttl = ttl
+        self.name = name
+        self.metrics_log_interval = metrics_log_interval
+        self._entries = {}
+        self._hits = 0
+        self._misses = 0
+        self._last_report = time.time()
+
+    def get(self, key, load_func, *args, **kwargs):
+        """Return the cached value of key, or load it with load_func"""
+        self._report_if_needed()
+        entry = self._entries.get(key)
+        if entry and time.time() - entry[0] < self.ttl:
+            self._hits += 1
+            return entry[1]
+        self._misses += 1
+        value = load_func(*args, **kwargs)
+        if self.ttl > 0:
+            self._entries[key] = (time.time(), value)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop the cached value of key, or all the cached values"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def get_metrics(self):
+        return {'hits': self._hits,
+                'misses': self._misses,
+                'size': len(self._entries)}
+
+    def _report_if_needed(self):
+        interval = self.metrics_log_interval
+        if not interval or time.time() - self._last_report < interval:
+            return
+        self._last_report = time.time()
+        LOG.info("Cache %(name)s: %(hits)s hits, %(misses)s misses, "
+                 "%(size)s entries",
+                 dict(self.get_metrics(), name=self.name))
@@ -14,9 +14,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import random
+
 import six
+from sqlalchemy import func
 from sqlalchemy.orm import exc
 
+from neutron.db import models_v2
+from neutron_lib import constants
 from neutron_lib.db import api as db_api
 from oslo_db import exception as db_exc
 from oslo_log import log as logging
@@ -277,6 +282,46 @@ def get_nsx_switch_and_port_id(session, neutron_id):
         return None, None
 
 
+def get_nsx_switch_and_port_ids(session, neutron_ids):
+    """Return a dictionary of the NSX switch & port ids of the given ports"""
+    if not neutron_ids:
+        return {}
+    mappings = session.query(nsx_models.NeutronNsxPortMapping).filter(
+        nsx_models.NeutronNsxPortMapping.neutron_id.in_(neutron_ids))
+    return dict((mapping['neutron_id'],
+                 (mapping['nsx_switch_id'], mapping['nsx_port_id']))
+                for mapping in mappings)
+
+
+def get_routers_subnets(session, router_ids):
+    """Return a dictionary of the subnets attached to the given routers
+
+    The subnets of the interface ports of all the routers are retrieved with
+    a single joined query.
+    """
+    routers_subnets = dict((router_id, []) for router_id in router_ids)
+    if not router_ids:
+        return routers_subnets
+    query = session.query(
+        models_v2.Port.device_id, models_v2.Subnet.id,
+        models_v2.Subnet.cidr, models_v2.Subnet.subnetpool_id,
+        models_v2.Subnet.ip_version, models_v2.Subnet.network_id).join(
+        models_v2.IPAllocation,
+        models_v2.IPAllocation.port_id == models_v2.Port.id).join(
+        models_v2.Subnet,
+        models_v2.Subnet.id == models_v2.IPAllocation.subnet_id).filter(
+        models_v2.Port.device_id.in_(router_ids),
+        models_v2.Port.device_owner == constants.DEVICE_OWNER_ROUTER_INTF)
+    for (router_id, subnet_id, cidr, subnetpool_id, ip_version,
+         network_id) in query:
+        routers_subnets[router_id].append({'id': subnet_id,
+                                           'cidr': cidr,
+                                           'subnetpool_id': subnetpool_id,
+                                           'ip_version': ip_version,
+                                           'network_id': network_id})
+    return routers_subnets
+
+
 def get_nsx_router_id(session, neutron_id):
     try:
         mapping = (session.query(nsx_models.NeutronNsxRouterMapping).
@@ -518,6 +563,74 @@ def del_nsx_ipam_subnet_pool(session, subnet_id, nsx_pool_id):
                       nsx_pool_id=nsx_pool_id).delete())
 
 
+def add_nsx_ipam_reserved_ip(session, subnet_id, nsx_pool_id, ip_address,
+                             owner):
+    with session.begin(subtransactions=True):
+        entry = nsx_models.NsxIpamReservedIp(
+            subnet_id=subnet_id,
+            nsx_pool_id=nsx_pool_id,
+            ip_address=ip_address,
+            owner=owner)
+        session.add(entry)
+    return entry
+
+
+def count_nsx_ipam_reserved_ips(session, subnet_id):
+    return (session.query(nsx_models.NsxIpamReservedIp).
+            filter_by(subnet_id=subnet_id).count())
+
+
+def get_nsx_ipam_reserved_ips_before(session, reserved_before):
+    """Return the (subnet id, NSX pool id, IP) of the IPs reserved before
+
+    The IPs are filtered by their last update, or creation, time.
+    """
+    model = nsx_models.NsxIpamReservedIp
+    return session.query(
+        model.subnet_id, model.nsx_pool_id, model.ip_address).filter(
+            func.coalesce(model.updated_at, model.created_at) <
+            reserved_before).all()
+
+
+def claim_nsx_ipam_reserved_ip(session, subnet_id, ip_address=None):
+    """Remove a reserved IP of the subnet, and return it
+
+    If no IP address is specified, any reserved IP may be claimed.
+    Each IP is claimed by deleting its entry, so even with concurrent
+    callers an IP can only be returned once.
+    Return None if there is no such reserved IP.
+    """
+    query = session.query(nsx_models.NsxIpamReservedIp).filter_by(
+        subnet_id=subnet_id)
+    if ip_address:
+        query = query.filter_by(ip_address=ip_address)
+    # Several candidates are fetched, as some may be claimed concurrently,
+    # and shuffled so concurrent callers try to claim different ones
+    candidates = [entry.ip_address for entry in query.limit(10)]
+    random.shuffle(candidates)
+    for candidate in candidates:
+        with session.begin(subtransactions=True):
+            deleted = (session.query(nsx_models.NsxIpamReservedIp).
+                       filter_by(subnet_id=subnet_id,
+                                 ip_address=candidate).delete())
+        if deleted:
+            return candidate
+
+
+def pop_nsx_ipam_reserved_ips(session, subnet_id, owner=None):
+    """Remove the reserved IPs of the subnet, and return them
+
+    If an owner is specified, only the IPs it reserved are removed.
+    """
+    query = session.query(nsx_models.NsxIpamReservedIp).filter_by(
+        subnet_id=subnet_id)
+    if owner:
+        query = query.filter_by(owner=owner)
+    ip_addresses = [entry.ip_address for entry in query]
+    return [ip_address for ip_address in ip_addresses
+            if claim_nsx_ipam_reserved_ip(session, subnet_id, ip_address)]
+
+
 def get_certificate(session, purpose):
     try:
         cert_entry = session.query(
@@ -597,6 +710,10 @@ def add_nsx_lbaas_listener_binding(session, loadbalancer_id, listener_id,
     return binding
 
 
+def get_nsx_lbaas_listener_bindings(session):
+    return session.query(nsx_models.NsxLbaasListener).all()
+
+
 def get_nsx_lbaas_listener_binding(session, loadbalancer_id, listener_id):
     try:
         return session.query(
@@ -782,6 +899,14 @@ def get_nsx_vpn_connection_mapping(session, neutron_id):
         return
 
 
+def get_nsx_vpn_connection_mappings(session, neutron_ids=None):
+    query = session.query(nsx_models.NsxVpnConnectionMapping)
+    if neutron_ids is not None:
+        query = query.filter(
+            nsx_models.NsxVpnConnectionMapping.neutron_id.in_(neutron_ids))
+    return query.all()
+
+
 def delete_nsx_vpn_connection_mapping(session, neutron_id):
     return (session.query(nsx_models.NsxVpnConnectionMapping).
             filter_by(neutron_id=neutron_id).delete())
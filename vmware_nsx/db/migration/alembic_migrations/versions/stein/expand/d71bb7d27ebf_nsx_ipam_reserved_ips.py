@@ -0,0 +1,40 @@
+# Copyright 2019 VMware, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""nsx_ipam_reserved_ips
+
+Revision ID: d71bb7d27ebf
+Revises: fc6308289aca
+Create Date: 2019-03-10 11:23:41.265381
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd71bb7d27ebf'
+down_revision = 'fc6308289aca'
+
+
+def upgrade():
+    op.create_table(
+        'nsx_ipam_reserved_ips',
+        sa.Column('subnet_id', sa.String(36), nullable=False),
+        sa.Column('ip_address', sa.String(64), nullable=False),
+        sa.Column('nsx_pool_id', sa.String(36), nullable=False),
+        sa.Column('owner', sa.String(255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('subnet_id', 'ip_address'))
@@ -377,6 +377,16 @@ class NsxSubnetIpam(model_base.BASEV2, models.TimestampMixin):
     nsx_pool_id = sa.Column(sa.String(36), primary_key=True)
 
 
+class NsxIpamReservedIp(model_base.BASEV2, models.TimestampMixin):
+    """IPs allocated on the backend pool ahead of time, and not used yet."""
+    __tablename__ = 'nsx_ipam_reserved_ips'
+    subnet_id = sa.Column(sa.String(36), primary_key=True)
+    ip_address = sa.Column(sa.String(64), primary_key=True)
+    nsx_pool_id = sa.Column(sa.String(36), nullable=False)
+    # The neutron server process which reserved this IP
+    owner = sa.Column(sa.String(255), nullable=False)
+
+
 class NsxCertificateRepository(model_base.BASEV2, models.TimestampMixin):
     """Stores certificate and private key per logical purpose.
 
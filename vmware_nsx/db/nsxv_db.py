@@ -725,6 +725,10 @@ def add_nsxv_lbaas_listener_binding(session, loadbalancer_id, listener_id,
     return binding
 
 
+def get_nsxv_lbaas_listener_bindings(session):
+    return session.query(nsxv_models.NsxvLbaasListenerBinding).all()
+
+
 def get_nsxv_lbaas_listener_binding(session, loadbalancer_id, listener_id):
     try:
         return session.query(
@@ -12,7 +12,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
+from eventlet import event
+from eventlet import semaphore
+
 from neutron_lib import exceptions
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
 from oslo_vmware import vim_util
@@ -29,6 +34,10 @@ QOS_IN_DIRECTION = 'incomingPackets'
 QOS_AGENT_NAME = 'dvfilter-generic-vmware'
 DSCP_RULE_DESCRIPTION = 'Openstack Dscp Marking RUle'
 
+# Port groups inventory cache related constants
+PG_CACHE_MAX_OBJECTS = 100
+PG_CACHE_WAIT_SECONDS = 60
+
 
 class SingleDvsManager(object):
     """Management class for dvs related tasks for the dvs plugin
@@ -77,14 +86,288 @@ class VCManagerBase(object):
         return self._session
 
 
+class ReconfigBatcher(object):
+    """Merge the reconfiguration requests of the same vCenter object
+
+    Requests for the same object, submitted within the batching interval,
+    are merged into a single reconfiguration task. Each object is flushed
+    by its own green thread, so the tasks of different objects are waited
+    for concurrently. The callers are blocked until the merged task is done,
+    and get its result or exception.
+
+    A request changing a key (as returned by key_func) already changed by an
+    earlier request of the batch is submitted in a later task. If a merged
+    task fails, its requests are retried one by one, so each caller gets
+    the result of its own changes.
+    """
+
+    def __init__(self, interval, submit_func, key_func=None):
+        self._interval = interval
+        self._submit = submit_func
+        self._get_key = key_func
+        self._pending = {}
+
+    def run(self, moref, changes):
+        if self._interval <= 0:
+            return self._submit(moref, changes)
+        done = event.Event()
+        if moref.value not in self._pending:
+            self._pending[moref.value] = (moref, [])
+            eventlet.spawn_n(self._flush, moref.value)
+        self._pending[moref.value][1].append((changes, done))
+        return done.wait()
+
+    def _split_conflicting(self, requests):
+        """Split the requests into batches without conflicting changes
+
+        Each request goes to the batch following the latest batch changing
+        one of its keys, so changes of the same key keep their order.
+        """
+        if not self._get_key:
+            return [requests]
+        batches = []
+        key_batch = {}
+        for request in requests:
+            keys = set(self._get_key(change) for change in request[0])
+            keys.discard(None)
+            index = max([key_batch[key] + 1 for key in keys
+                         if key in key_batch] or [0])
+            if index == len(batches):
+                batches.append([])
+            batches[index].append(request)
+            for key in keys:
+                key_batch[key] = index
+        return batches
+
+    def _submit_batch(self, moref, requests):
+        changes = []
+        for request_changes, _done in requests:
+            changes.extend(request_changes)
+        LOG.debug("Submitting %(num)s merged reconfiguration requests of "
+                  "%(moref)s", {'num': len(requests), 'moref': moref.value})
+        try:
+            result = self._submit(moref, changes)
+        except Exception as e:
+            if len(requests) == 1:
+                requests[0][1].send_exception(e)
+                return
+            LOG.warning("Merged reconfiguration of %(moref)s failed: %(e)s. "
+                        "Retrying its %(num)s requests one by one",
+                        {'moref': moref.value, 'e': e, 'num': len(requests)})
+            for request_changes, done in requests:
+                try:
+                    done.send(self._submit(moref, request_changes))
+                except Exception as request_err:
+                    done.send_exception(request_err)
+        else:
+            for _changes, done in requests:
+                done.send(result)
+
+    def _flush(self, key):
+        eventlet.sleep(self._interval)
+        moref, requests = self._pending.pop(key)
+        for batch in self._split_conflicting(requests):
+            self._submit_batch(moref, batch)
+
+
+class PortGroupCache(object):
+    """In-memory cache of the port group names and morefs of a DVS
+
+    The names of all the port groups of the DVS (or of the whole vCenter
+    inventory if no DVS is given) are loaded with a single paged
+    RetrievePropertiesEx call. The cache is then kept up to date by a
+    dedicated property collector, whose updates are consumed with
+    WaitForUpdatesEx by a background thread. If the property collector
+    fails, the cache is invalidated and reloaded on the next lookup.
+    """
+
+    def __init__(self, session, dvs_moref=None):
+        self._session = session
+        self._dvs_moref = dvs_moref
+        self._names = {}
+        self._morefs = {}
+        self._loaded = False
+        self._load_lock = semaphore.Semaphore()
+        self._watching = False
+
+    def _build_filter_spec(self):
+        vim = self._session.vim
+        client_factory = vim.client.factory
+        if self._dvs_moref:
+            traversal_spec = vim_util.build_traversal_spec(
+                client_factory, 'dvs_to_pg', 'DistributedVirtualSwitch',
+                'portgroup', False, [])
+            object_spec = vim_util.build_object_spec(
+                client_factory, self._dvs_moref, [traversal_spec])
+            object_spec.skip = True
+        else:
+            traversal_spec = vim_util.build_recursive_traversal_spec(
+                client_factory)
+            object_spec = vim_util.build_object_spec(
+                client_factory, vim.service_content.rootFolder,
+                [traversal_spec])
+        property_spec = vim_util.build_property_spec(
+            client_factory, type_='DistributedVirtualPortgroup',
+            properties_to_collect=['name'])
+        return vim_util.build_property_filter_spec(
+            client_factory, [property_spec], [object_spec])
+
+    def _set(self, pg_moref, name):
+        self._names[pg_moref.value] = name
+        self._morefs[pg_moref.value] = pg_moref
+
+    def _remove(self, pg_moref):
+        self._names.pop(pg_moref.value, None)
+        self._morefs.pop(pg_moref.value, None)
+
+    def _load(self):
+        vim = self._session.vim
+        options = vim.client.factory.create('ns0:RetrieveOptions')
+        options.maxObjects = PG_CACHE_MAX_OBJECTS
+        results = self._session.invoke_api(
+            vim, 'RetrievePropertiesEx',
+            vim.service_content.propertyCollector,
+            specSet=[self._build_filter_spec()], options=options)
+        # Build the new maps aside, so lookups served while the pages are
+        # retrieved keep using the previous content
+        names = {}
+        morefs = {}
+        while results:
+            for pg in results.objects:
+                for prop in getattr(pg, 'propSet', []):
+                    if prop.name == 'name':
+                        names[pg.obj.value] = prop.val
+                        morefs[pg.obj.value] = pg.obj
+            results = self._session.invoke_api(
+                vim_util, 'continue_retrieval', vim, results)
+        self._names, self._morefs = names, morefs
+        self._loaded = True
+        LOG.debug("Loaded %(num)s port groups of %(dvs)s into the cache",
+                  {'num': len(self._names),
+                   'dvs': self._dvs_moref.value if self._dvs_moref
+                   else 'vCenter'})
+        if not self._watching:
+            self._watching = True
+            eventlet.spawn_n(self._watch_updates)
+
+    def _apply_update_set(self, update_set):
+        for filter_update in getattr(update_set, 'filterSet', []):
+            for obj_update in getattr(filter_update, 'objectSet', []):
+                if obj_update.kind == 'leave':
+                    self._remove(obj_update.obj)
+                    continue
+                for change in getattr(obj_update, 'changeSet', []):
+                    if change.name != 'name':
+                        continue
+                    if change.op == 'remove':
+                        self._remove(obj_update.obj)
+                    else:
+                        self._set(obj_update.obj, change.val)
+
+    def _watch_updates(self):
+        vim = self._session.vim
+        collector = None
+        try:
+            collector = self._session.invoke_api(
+                vim, 'CreatePropertyCollector',
+                vim.service_content.propertyCollector)
+            self._session.invoke_api(
+                vim, 'CreateFilter', collector,
+                spec=self._build_filter_spec(), partialUpdates=False)
+            options = vim.client.factory.create('ns0:WaitOptions')
+            options.maxWaitSeconds = PG_CACHE_WAIT_SECONDS
+            version = ''
+            while True:
+                update_set = self._session.invoke_api(
+                    vim, 'WaitForUpdatesEx', collector,
+                    version=version, options=options)
+                if update_set:
+                    version = update_set.version
+                    self._apply_update_set(update_set)
+        except Exception as e:
+            LOG.warning("Stopped watching port group updates of %(dvs)s: "
+                        "%(e)s. The cache will be reloaded on next access.",
+                        {'dvs': self._dvs_moref.value if self._dvs_moref
+                         else 'vCenter', 'e': e})
+            self.invalidate()
+        finally:
+            self._watching = False
+            if collector:
+                try:
+                    self._session.invoke_api(vim, 'DestroyPropertyCollector',
+                                             collector)
+                except Exception:
+                    pass
+
+    def invalidate(self):
+        self._loaded = False
+        self._names = {}
+        self._morefs = {}
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            # The cache may have been loaded while waiting for the lock
+            if not self._loaded:
+                self._load()
+
+    def add(self, pg_moref, name):
+        if self._loaded:
+            self._set(pg_moref, name)
+
+    def remove(self, pg_moref):
+        self._remove(pg_moref)
+
+    def get_moref(self, net_id):
+        """Return the moref of the port group named or identified by net_id
+        """
+        self._ensure_loaded()
+        if net_id in self._morefs:
+            return self._morefs[net_id]
+        for moref_value, name in self._names.items():
+            if name == net_id:
+                return self._morefs.get(moref_value)
+
+    def get_name(self, pg_moref):
+        self._ensure_loaded()
+        return self._names.get(pg_moref.value)
+
+    def find_morefs(self, *name_parts):
+        """Return the morefs of the port groups whose names contain all parts
+        """
+        self._ensure_loaded()
+        return [self._morefs[moref_value]
+                for moref_value, name in list(self._names.items())
+                if all(part in name for part in name_parts)]
+
+
 class DvsManager(VCManagerBase):
     """Management class for dvs related tasks
 
     The dvs-id is not a class member, since multiple dvs-es can be supported.
     """
 
+    def __init__(self):
+        super(DvsManager, self).__init__()
+        self._use_cache = cfg.CONF.dvs.use_inventory_cache
+        self._dvs_morefs = {}
+        self._pg_caches = {}
+        self._dvs_port_batcher = ReconfigBatcher(
+            cfg.CONF.dvs.reconfig_batch_interval, self._reconfigure_dv_ports,
+            key_func=lambda port_spec: port_spec.key)
+
+    def _get_pg_cache(self, dvs_moref):
+        """Get the port groups cache of the DVS, or of the whole vCenter"""
+        key = dvs_moref.value if dvs_moref else None
+        if key not in self._pg_caches:
+            self._pg_caches[key] = PortGroupCache(self._session, dvs_moref)
+        return self._pg_caches[key]
+
     def get_dvs_moref_by_name(self, dvs_name, session=None):
         """Get the moref of DVS."""
+        if self._use_cache and dvs_name in self._dvs_morefs:
+            return self._dvs_morefs[dvs_name]
         if not session:
             session = self.get_vc_session()
         results = session.invoke_api(vim_util,
@@ -97,6 +380,8 @@ class DvsManager(VCManagerBase):
                 for prop in dvs.propSet:
                     if dvs_name == prop.val:
                         vim_util.cancel_retrieval(session.vim, results)
+                        if self._use_cache:
+                            self._dvs_morefs[dvs_name] = dvs.obj
                         return dvs.obj
             results = vim_util.continue_retrieval(session.vim, results)
         raise nsx_exc.DvsNotFound(dvs=dvs_name)
@@ -154,14 +439,15 @@ class DvsManager(VCManagerBase):
                                         dvs_moref,
                                         spec=pg_spec)
         try:
-            # NOTE(garyk): cache the returned moref
-            self._session.wait_for_task(task)
+            task_info = self._session.wait_for_task(task)
         except Exception:
             # NOTE(garyk): handle more specific exceptions
             with excutils.save_and_reraise_exception():
                 LOG.exception('Failed to create port group for '
                               '%(net_id)s with tag %(tag)s.',
                               {'net_id': net_id, 'tag': vlan_tag})
+        if self._use_cache and getattr(task_info, 'result', None):
+            self._get_pg_cache(dvs_moref).add(task_info.result, net_id)
         LOG.info("%(net_id)s with tag %(vlan_tag)s created on %(dvs)s.",
                  {'net_id': net_id,
                   'vlan_tag': vlan_tag,
@@ -185,8 +471,12 @@ class DvsManager(VCManagerBase):
 
     def _net_id_to_moref(self, dvs_moref, net_id):
         """Gets the moref for the specific neutron network."""
-        # NOTE(garyk): return this from a cache if not found then invoke
-        # code below.
+        if self._use_cache:
+            moref = self._get_pg_cache(dvs_moref).get_moref(net_id)
+            if moref:
+                return moref
+            # The port group may have been created after the last update
+            # of the cache. Fall back to a backend lookup.
         if dvs_moref:
             port_groups = self._session.invoke_api(vim_util,
                                                    'get_object_properties',
@@ -205,7 +495,9 @@ class DvsManager(VCManagerBase):
                             for prop in props[0].propSet:
                                 # match name or mor id
                                 if net_id == prop.val or net_id == val.value:
-                                    # NOTE(garyk): update cache
+                                    if self._use_cache:
+                                        self._get_pg_cache(dvs_moref).add(
+                                            val, prop.val)
                                     return val
             raise exceptions.NetworkNotFound(net_id=net_id)
         else:
@@ -365,6 +657,17 @@ class DvsManager(VCManagerBase):
                                          net_moref,
                                          spec_update_calback,
                                          spec_update_data):
+        if self._use_cache:
+            pg_morefs = self._get_pg_cache(dvs_moref).find_morefs(
+                net_id, net_moref)
+            for pg_moref in pg_morefs:
+                self._reconfigure_port_group(pg_moref,
+                                             spec_update_calback,
+                                             spec_update_data)
+            if pg_morefs:
+                return
+            # The port group may have been created after the last update
+            # of the cache. Fall back to a backend lookup.
         port_groups = self._session.invoke_api(vim_util,
                                                'get_object_properties',
                                                self._session.vim,
@@ -416,6 +719,8 @@ class DvsManager(VCManagerBase):
             with excutils.save_and_reraise_exception():
                 LOG.exception('Failed to delete port group for %s.',
                               net_id)
+        if self._use_cache:
+            self._get_pg_cache(dvs_moref).remove(moref)
         LOG.info("%(net_id)s delete from %(dvs)s.",
                  {'net_id': net_id,
                   'dvs': dvs_moref.value})
@@ -423,6 +728,10 @@ class DvsManager(VCManagerBase):
     def get_port_group_info(self, dvs_moref, net_id):
         """Get portgroup information."""
         pg_moref = self._net_id_to_moref(dvs_moref, net_id)
+        if self._use_cache:
+            name = self._get_pg_cache(dvs_moref).get_name(pg_moref)
+            if name is not None:
+                return {'name': name}, pg_moref
         # Expand the properties to collect on need basis.
         properties = ['name']
         pg_info = self._session.invoke_api(vim_util,
@@ -495,21 +804,54 @@ class DvsManager(VCManagerBase):
         setting = client_factory.create('ns0:VMwareDVSPortSetting')
         setting.securityPolicy = policy
         ps.setting = setting
-        task = self._session.invoke_api(self._session.vim,
-                                        'ReconfigureDVPort_Task',
-                                        dvs_moref,
-                                        port=ps)
         try:
-            self._session.wait_for_task(task)
+            self._dvs_port_batcher.run(dvs_moref, [ps])
             LOG.info("Updated port security status")
         except Exception as e:
             LOG.error("Failed to update port %s. Reason: %s",
                       port.key, e)
 
+    def _reconfigure_dv_ports(self, dvs_moref, port_specs):
+        task = self._session.invoke_api(self._session.vim,
+                                        'ReconfigureDVPort_Task',
+                                        dvs_moref,
+                                        port=port_specs)
+        return self._session.wait_for_task(task)
+
 
 class VMManager(VCManagerBase):
     """Management class for VMs related VC tasks."""
 
+    def __init__(self):
+        super(VMManager, self).__init__()
+        self._vm_batcher = ReconfigBatcher(
+            cfg.CONF.dvs.reconfig_batch_interval, self._reconfigure_vm,
+            key_func=self._get_device_change_key)
+
+    @staticmethod
+    def _get_device_change_key(device_change):
+        # Added devices get a new temporary key when submitted, so only the
+        # changes of existing devices may conflict
+        if device_change.operation != 'add':
+            return device_change.device.key
+
+    def _reconfigure_vm(self, vm_moref, device_changes):
+        """Reconfigure the VM devices using a single vCenter task"""
+        client_factory = self._session.vim.client.factory
+        vm_spec = client_factory.create('ns0:VirtualMachineConfigSpec')
+        # Each added device needs a unique temporary negative key
+        key = -47
+        for device_change in device_changes:
+            if device_change.operation == 'add':
+                device_change.device.key = key
+                key -= 1
+        vm_spec.deviceChange = device_changes
+        task = self._session.invoke_api(self._session.vim,
+                                        'ReconfigVM_Task',
+                                        vm_moref,
+                                        spec=vm_spec)
+        return self._session.wait_for_task(task)
+
     def get_vm_moref_obj(self, instance_uuid):
         """Get reference to the VM.
         The method will make use of FindAllByUuid to get the VM reference.
@@ -582,12 +924,8 @@ class VMManager(VCManagerBase):
                             port_mac, nsx_net_id, device_type):
         new_spec = self._build_vm_spec_attach(
             neutron_port_id, port_mac, nsx_net_id, device_type)
-        task = self._session.invoke_api(self._session.vim,
-                                        'ReconfigVM_Task',
-                                        vm_moref,
-                                        spec=new_spec)
         try:
-            self._session.wait_for_task(task)
+            self._vm_batcher.run(vm_moref, new_spec.deviceChange)
             LOG.info("Updated VM moref %(moref)s spec - "
                      "attached an interface",
                      {'moref': vm_moref.value})
@@ -598,17 +936,15 @@ class VMManager(VCManagerBase):
     def _build_vm_spec_update(self, devices):
         client_factory = self._session.vim.client.factory
         vm_spec = client_factory.create('ns0:VirtualMachineConfigSpec')
-        vm_spec.deviceChange = [devices]
+        if not isinstance(devices, list):
+            devices = [devices]
+        vm_spec.deviceChange = devices
         return vm_spec
 
     def update_vm_interface(self, vm_moref, devices):
         update_spec = self._build_vm_spec_update(devices)
-        task = self._session.invoke_api(self._session.vim,
-                                        'ReconfigVM_Task',
-                                        vm_moref,
-                                        spec=update_spec)
         try:
-            self._session.wait_for_task(task)
+            self._vm_batcher.run(vm_moref, update_spec.deviceChange)
             LOG.info("Updated VM moref %(moref)s spec - "
                      "attached an interface",
                      {'moref': vm_moref.value})
@@ -630,12 +966,8 @@ class VMManager(VCManagerBase):
 
     def detach_vm_interface(self, vm_moref, device):
         new_spec = self._build_vm_spec_detach(device)
-        task = self._session.invoke_api(self._session.vim,
-                                        'ReconfigVM_Task',
-                                        vm_moref,
-                                        spec=new_spec)
         try:
-            self._session.wait_for_task(task)
+            self._vm_batcher.run(vm_moref, new_spec.deviceChange)
             LOG.info("Updated VM %(moref)s spec - detached an interface",
                      {'moref': vm_moref.value})
         except Exception as e:
@@ -47,6 +47,18 @@ dvs_opts = [
                     'socket error, etc.'),
     cfg.StrOpt('dvs_name',
                help='The name of the preconfigured DVS.'),
+    cfg.BoolOpt('use_inventory_cache',
+                default=False,
+                help=_("If true, the names and morefs of the DVS port "
+                       "groups are cached in memory, and kept up to date "
+                       "using vCenter property collector updates, instead of "
+                       "being looked up in vCenter on each access.")),
+    cfg.FloatOpt('reconfig_batch_interval',
+                 default=0,
+                 help=_("The interval, in seconds, during which VM and DVS "
+                        "port reconfiguration requests of the same object "
+                        "are merged into a single vCenter task. 0 disables "
+                        "the batching.")),
     cfg.StrOpt('metadata_mode',
                help=_("This value should not be set. It is just required for "
                       "ensuring that the DVS plugin works with the generic "
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import weakref
+
 from neutron_lib.api.definitions import availability_zone as az_def
 from neutron_lib.api.definitions import dns
 from neutron_lib.api import validators
@@ -25,6 +27,7 @@ from neutron_lib.objects import registry as obj_reg
 from neutron_lib.plugins import directory
 from oslo_config import cfg
 from oslo_log import log as logging
+from sqlalchemy import orm
 
 from neutron.services.externaldns import driver
 
@@ -46,6 +49,11 @@ def _dotted_domain(dns_domain):
 class DNSExtensionDriver(driver_api.ExtensionDriver):
     _supported_extension_alias = 'dns-integration'
 
+    def __init__(self):
+        super(DNSExtensionDriver, self).__init__()
+        # DNS domains of networks, by the DB session of the ports extended
+        self._dns_domains_cache = weakref.WeakKeyDictionary()
+
     @property
     def extension_alias(self):
         return self._supported_extension_alias
@@ -244,18 +252,21 @@ class DNSExtensionDriver(driver_api.ExtensionDriver):
         return ('', True)
 
     def _get_request_dns_name_and_domain_name(self, dns_data_db,
-                                              network_id, context):
-        dns_domain = self._get_dns_domain(network_id, context)
+                                              network_id, context,
+                                              dns_domain=None):
+        if dns_domain is None:
+            dns_domain = self._get_dns_domain(network_id, context)
         dns_name = ''
         if ((dns_domain and dns_domain != DNS_DOMAIN_DEFAULT)):
             if dns_data_db:
                 dns_name = dns_data_db.dns_name
         return dns_name, dns_domain
 
-    def _get_dns_names_for_port(self, ips, dns_data_db, network_id, context):
+    def _get_dns_names_for_port(self, ips, dns_data_db, network_id, context,
+                                dns_domain=None):
         dns_assignment = []
         dns_name, dns_domain = self._get_request_dns_name_and_domain_name(
-            dns_data_db, network_id, context)
+            dns_data_db, network_id, context, dns_domain=dns_domain)
         for ip in ips:
             if dns_name:
                 hostname = dns_name
@@ -273,26 +284,46 @@ class DNSExtensionDriver(driver_api.ExtensionDriver):
                                    'fqdn': fqdn})
         return dns_assignment
 
-    def _get_dns_name_for_port_get(self, port, dns_data_db, context):
+    def _get_dns_name_for_port_get(self, port, dns_data_db, context,
+                                   dns_domain=None):
         if port['fixed_ips']:
             return self._get_dns_names_for_port(
                 port['fixed_ips'], dns_data_db,
-                port['network_id'], context)
+                port['network_id'], context, dns_domain=dns_domain)
         return []
 
     def _extend_port_dict(self, db_data, response_data,
-                          dns_data_db, context=None):
+                          dns_data_db, context=None, dns_domain=None):
         if not dns_data_db:
             response_data[dns.DNSNAME] = ''
         else:
             response_data[dns.DNSNAME] = dns_data_db[dns.DNSNAME]
         response_data['dns_assignment'] = self._get_dns_name_for_port_get(
-            db_data, dns_data_db, context)
+            db_data, dns_data_db, context, dns_domain=dns_domain)
         return response_data
 
+    def _get_port_db_dns_domain(self, port_db):
+        """Return the DNS domain of the network of the port
+
+        The domain is cached for the DB session the port was read with, so
+        listing many ports resolves each of their networks only once.
+        """
+        network_id = port_db['network_id']
+        session = orm.object_session(port_db)
+        if session is None:
+            return self._get_dns_domain(network_id)
+        dns_domains = self._dns_domains_cache.setdefault(session, {})
+        if network_id not in dns_domains:
+            dns_domains[network_id] = self._get_dns_domain(network_id)
+        return dns_domains[network_id]
+
     def extend_port_dict(self, session, db_data, response_data):
         dns_data_db = db_data.dns
-        return self._extend_port_dict(db_data, response_data, dns_data_db)
+        dns_domain = None
+        if db_data['fixed_ips']:
+            dns_domain = self._get_port_db_dns_domain(db_data)
+        return self._extend_port_dict(db_data, response_data, dns_data_db,
+                                      dns_domain=dns_domain)
 
     def _get_network(self, context, network_id):
         plugin = directory.get_plugin()
@@ -40,6 +40,7 @@ from neutron_lib.utils import net as nl_net_utils
 
 from vmware_nsx._i18n import _
 from vmware_nsx.common import exceptions as nsx_exc
+from vmware_nsx.db import db as nsx_db
 from vmware_nsx.services.qos.common import utils as qos_com_utils
 
 LOG = logging.getLogger(__name__)
@@ -196,19 +197,12 @@ class NsxPluginBase(db_base_plugin_v2.NeutronDbPluginV2,
 
     def _find_router_subnets(self, context, router_id):
         """Retrieve subnets attached to the specified router."""
-        ports = self._get_port_by_device_id(context, router_id,
-                                            l3_db.DEVICE_OWNER_ROUTER_INTF)
         # No need to check for overlapping CIDRs
-        subnets = []
-        for port in ports:
-            for ip in port.get('fixed_ips', []):
-                subnet_qry = context.session.query(models_v2.Subnet)
-                subnet = subnet_qry.filter_by(id=ip.subnet_id).one()
-                subnets.append({'id': subnet.id, 'cidr': subnet.cidr,
-                                'subnetpool_id': subnet.subnetpool_id,
-                                'ip_version': subnet.ip_version,
-                                'network_id': subnet.network_id})
-        return subnets
+        return self._find_routers_subnets(context, [router_id])[router_id]
+
+    def _find_routers_subnets(self, context, router_ids):
+        """Retrieve subnets attached to each of the specified routers."""
+        return nsx_db.get_routers_subnets(context.session, router_ids)
 
     def _find_router_gw_subnets(self, context, router):
         """Retrieve external subnets attached to router GW"""
@@ -249,9 +243,10 @@ class NsxPluginBase(db_base_plugin_v2.NeutronDbPluginV2,
         elevated_context = context.elevated()
         LOG.info("Inspecting routers for potential configuration changes "
                  "due to address scope change on subnetpool %s", subnetpool_id)
+        routers_subnets = self._find_routers_subnets(
+            elevated_context, [rtr['id'] for rtr in routers])
         for rtr in routers:
-            subnets = self._find_router_subnets(elevated_context,
-                                                rtr['id'])
+            subnets = routers_subnets[rtr['id']]
             gw_subnets = self._find_router_gw_subnets(elevated_context,
                                                       rtr)
 
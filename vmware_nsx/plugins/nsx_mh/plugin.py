@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import functools
 import weakref
 
 from neutron_lib.api.definitions import allowedaddresspairs as addr_apidef
@@ -27,7 +29,6 @@ from neutron_lib import exceptions as n_exc
 from neutron_lib.exceptions import allowedaddresspairs as addr_exc
 from neutron_lib.exceptions import l3 as l3_exc
 from neutron_lib.exceptions import port_security as psec_exc
-from oslo_concurrency import lockutils
 from oslo_config import cfg
 from oslo_db import exception as db_exc
 from oslo_log import log as logging
@@ -77,6 +78,7 @@ from vmware_nsx._i18n import _
 from vmware_nsx.api_client import exception as api_exc
 from vmware_nsx.common import config  # noqa
 from vmware_nsx.common import exceptions as nsx_exc
+from vmware_nsx.common import locking
 from vmware_nsx.common import nsx_utils
 from vmware_nsx.common import securitygroups as sg_utils
 from vmware_nsx.common import sync
@@ -104,6 +106,31 @@ NSX_EXTGW_NAT_RULES_ORDER = 255
 NSX_DEFAULT_NEXTHOP = '1.1.1.1'
 
 
+@contextlib.contextmanager
+def _lock_routers(router_ids):
+    """Hold the locks of the routers
+
+    The locks are always taken in the same order, so that operations which
+    involve the same routers cannot deadlock.
+    """
+    router_ids = sorted(set(r for r in router_ids if r))
+    if not router_ids:
+        yield
+        return
+    with locking.LockManager.get_lock('router-%s' % router_ids[0]):
+        with _lock_routers(router_ids[1:]):
+            yield
+
+
+def _lock_port_router(func):
+    """Run the decorated method under the lock of the router of a port"""
+    @functools.wraps(func)
+    def wrapper(self, context, port_data):
+        with _lock_routers([port_data['device_id']]):
+            return func(self, context, port_data)
+    return wrapper
+
+
 class NsxPluginV2(addr_pair_db.AllowedAddressPairsMixin,
                   agentschedulers_db.DhcpAgentSchedulerDbMixin,
                   db_base_plugin_v2.NeutronDbPluginV2,
@@ -217,7 +244,8 @@ class NsxPluginV2(addr_pair_db.AllowedAddressPairsMixin,
             self.nsx_sync_opts.state_sync_interval,
             self.nsx_sync_opts.min_sync_req_delay,
             self.nsx_sync_opts.min_chunk_size,
-            self.nsx_sync_opts.max_random_sync_delay)
+            self.nsx_sync_opts.max_random_sync_delay,
+            status_freshness=self.nsx_sync_opts.status_read_freshness)
 
     def _ensure_default_network_gateway(self):
         if self._is_default_net_gw_in_sync:
@@ -400,15 +428,9 @@ class NsxPluginV2(addr_pair_db.AllowedAddressPairsMixin,
 
     def _find_router_subnets_cidrs(self, context, router_id):
         """Retrieve subnets attached to the specified router."""
-        ports = self._get_port_by_device_id(context, router_id,
-                                            l3_db.DEVICE_OWNER_ROUTER_INTF)
         # No need to check for overlapping CIDRs
-        cidrs = []
-        for port in ports:
-            for ip in port.get('fixed_ips', []):
-                cidrs.append(self._get_subnet(context,
-                                              ip.subnet_id).cidr)
-        return cidrs
+        subnets = nsx_db.get_routers_subnets(context.session, [router_id])
+        return [subnet['cidr'] for subnet in subnets[router_id]]
 
     def _nsx_find_lswitch_for_port(self, context, port_data):
         network = self._get_network(context, port_data['network_id'])
@@ -624,7 +646,7 @@ class NsxPluginV2(addr_pair_db.AllowedAddressPairsMixin,
                          % nsx_router_id))
         return lr_port
 
-    @lockutils.synchronized('vmware', 'neutron-')
+    @_lock_port_router
     def _nsx_create_ext_gw_port(self, context, port_data):
         """Driver for creating an external gateway port on NSX platform."""
         # TODO(salvatore-orlando): Handle NSX resource
@@ -667,7 +689,7 @@ class NsxPluginV2(addr_pair_db.AllowedAddressPairsMixin,
                    'router_id': nsx_router_id,
                    'nsx_port_id': lr_port['uuid']})
 
-    @lockutils.synchronized('vmware', 'neutron-')
+    @_lock_port_router
     def _nsx_delete_ext_gw_port(self, context, port_data):
         # TODO(salvatore-orlando): Handle NSX resource
         # rollback when something goes not quite as expected
@@ -1994,31 +2016,65 @@ class NsxPluginV2(addr_pair_db.AllowedAddressPairsMixin,
                 'floating_ip_id': floatingip_db.id,
                 'context': context}
 
-    @lockutils.synchronized('vmware', 'neutron-')
+    def _get_fip_assoc_router_id(self, context, fip, tenant_id,
+                                 floating_network_id):
+        """Return the router a floating IP is to be associated with"""
+        if not fip.get('port_id'):
+            return
+        internal_port, internal_subnet_id, _ip = (
+            self._internal_fip_assoc_data(context, fip, tenant_id))
+        return self.get_router_for_floatingip(
+            context, internal_port, internal_subnet_id, floating_network_id)
+
     def create_floatingip(self, context, floatingip):
-        return super(NsxPluginV2, self).create_floatingip(context, floatingip)
+        fip = floatingip['floatingip']
+        router_id = self._get_fip_assoc_router_id(
+            context, fip, fip.get('tenant_id'), fip['floating_network_id'])
+        # The lock is taken before the DB transaction in which the NAT rules
+        # of the router are created
+        with _lock_routers([router_id]):
+            return super(NsxPluginV2, self).create_floatingip(context,
+                                                              floatingip)
 
-    @lockutils.synchronized('vmware', 'neutron-')
     def update_floatingip(self, context, floatingip_id, floatingip):
-        return super(NsxPluginV2, self).update_floatingip(context,
-                                                          floatingip_id,
-                                                          floatingip)
+        fip_db = self._get_floatingip(context, floatingip_id)
+        router_id = self._get_fip_assoc_router_id(
+            context, dict(floatingip['floatingip'], id=floatingip_id),
+            fip_db.tenant_id, fip_db.floating_network_id)
+        while True:
+            old_router_id = fip_db.router_id
+            # The NAT rules of both the old and the new router are changed
+            with _lock_routers([old_router_id, router_id]):
+                # The floating IP may have been associated with another
+                # router while waiting for the locks
+                fip_db = self._get_floatingip(context, floatingip_id)
+                if fip_db.router_id != old_router_id:
+                    continue
+                return super(NsxPluginV2, self).update_floatingip(
+                    context, floatingip_id, floatingip)
 
-    @lockutils.synchronized('vmware', 'neutron-')
     def delete_floatingip(self, context, id):
         fip_db = self._get_floatingip(context, id)
-        # Check whether the floating ip is associated or not
-        if fip_db.fixed_port_id:
-            nsx_router_id = nsx_utils.get_nsx_router_id(
-                context.session, self.cluster, fip_db.router_id)
-            self._retrieve_and_delete_nat_rules(context,
-                                                fip_db.floating_ip_address,
-                                                fip_db.fixed_ip_address,
-                                                nsx_router_id,
-                                                min_num_rules_expected=1)
-            # Remove floating IP address from logical router port
-            self._remove_floatingip_address(context, fip_db)
-        return super(NsxPluginV2, self).delete_floatingip(context, id)
+        while True:
+            router_id = fip_db.router_id
+            with _lock_routers([router_id]):
+                # The floating IP may have been associated with another
+                # router while waiting for the lock
+                fip_db = self._get_floatingip(context, id)
+                if fip_db.router_id != router_id:
+                    continue
+                # Check whether the floating ip is associated or not
+                if fip_db.fixed_port_id:
+                    nsx_router_id = nsx_utils.get_nsx_router_id(
+                        context.session, self.cluster, router_id)
+                    self._retrieve_and_delete_nat_rules(
+                        context, fip_db.floating_ip_address,
+                        fip_db.fixed_ip_address, nsx_router_id,
+                        min_num_rules_expected=1)
+                    # Remove floating IP address from logical router port
+                    self._remove_floatingip_address(context, fip_db)
+                return super(NsxPluginV2, self).delete_floatingip(context,
+                                                                  id)
 
     def disassociate_floatingips(self, context, port_id):
         try:
@@ -74,6 +74,7 @@ from vmware_nsxlib.v3 import utils as nsxlib_utils
 
 from vmware_nsxlib.v3.policy import constants as policy_constants
 from vmware_nsxlib.v3.policy import core_defs as policy_defs
+from vmware_nsxlib.v3.policy import transaction as policy_trans
 
 LOG = log.getLogger(__name__)
 NSX_P_SECURITY_GROUP_TAG = 'os-security-group'
@@ -98,6 +99,21 @@ SEG_SECURITY_PROFILE_UUID = (
 NAT_RULE_PRIORITY_FIP = 2000
 NAT_RULE_PRIORITY_GW = 3000
 
+# Transport zones & segments metadata, shared by all the plugin instances of
+# the process
+_metadata_cache = None
+
+
+def get_metadata_cache():
+    """Return the transport zones & segments metadata cache"""
+    global _metadata_cache
+    if _metadata_cache is None:
+        _metadata_cache = utils.TtlCache(
+            cfg.CONF.nsx_p.metadata_cache_ttl, name='NSX-P metadata',
+            metrics_log_interval=(
+                cfg.CONF.nsx_p.metadata_cache_metrics_log_interval))
+    return _metadata_cache
+
 
 @resource_extend.has_resource_extenders
 class NsxPolicyPlugin(nsx_plugin_common.NsxPluginV3Base):
@@ -501,12 +517,20 @@ class NsxPolicyPlugin(nsx_plugin_common.NsxPluginV3Base):
             self._delete_network_disable_dhcp(context, network_id)
 
         is_nsx_net = self._network_is_nsx_net(context, network_id)
+        if is_nsx_net:
+            # The network bindings are deleted together with the network
+            segment_id = nsx_db.get_network_bindings(
+                context.session, network_id)[0].phy_uuid
         is_external_net = self._network_is_external(context, network_id)
 
         # First call DB operation for delete network as it will perform
         # checks on active ports
         self._retry_delete_network(context, network_id)
 
+        if is_nsx_net:
+            # The segment may be moved to another TZ once the network is gone
+            get_metadata_cache().invalidate(('segment-tz', segment_id))
+
         # MD Proxy is currently supported by the passthrough api only.
         # Use it to delete mdproxy ports
         if not is_external_net and cfg.CONF.nsx_p.allow_passthrough:
@@ -1766,8 +1790,44 @@ class NsxPolicyPlugin(nsx_plugin_common.NsxPluginV3Base):
     def _get_sg_rule_local_ip_group_id(self, sg_rule):
         return '%s_local_group' % sg_rule['id']
 
+    def _get_comm_map_next_seq_num(self, domain_id, map_id):
+        """Return the first unused sequence number of a communication map
+
+        Concurrent bulk creations of the same map may get the same sequence
+        numbers. This is acceptable since the security group maps hold only
+        allow rules, so their order does not change the traffic allowed.
+        """
+        try:
+            comm_map = self.nsxpolicy.comm_map.get(domain_id, map_id)
+        except nsx_lib_exc.ResourceNotFound:
+            return 1
+        seq_nums = [int(entry['sequence_number'])
+                    for entry in comm_map.get('rules') or []]
+        return max(seq_nums or [0]) + 1
+
+    def _create_security_group_backend_rules(self, context, domain_id, map_id,
+                                             sg_rules, secgroup_logging,
+                                             first_seq_num=None):
+        """Create the NSX services, groups & entries of the SG rules
+
+        All the NSX objects of the rules are submitted together, as a single
+        hierarchical policy transaction.
+        """
+        if not sg_rules:
+            return
+        if first_seq_num is None:
+            # Entries created in a transaction cannot each look up the last
+            # sequence number of the map, so number them all from here
+            first_seq_num = self._get_comm_map_next_seq_num(domain_id, map_id)
+        with policy_trans.NsxPolicyTransaction():
+            for i, sg_rule in enumerate(sg_rules):
+                self._create_security_group_backend_rule(
+                    context, domain_id, map_id, sg_rule, secgroup_logging,
+                    sequence_number=first_seq_num + i)
+
     def _create_security_group_backend_rule(self, context, domain_id, map_id,
-                                            sg_rule, secgroup_logging):
+                                            sg_rule, secgroup_logging,
+                                            sequence_number=None):
         # The id of the map and group is the same as the security group id
         this_group_id = map_id
         # There is no rule name in neutron. Using ID instead
@@ -1819,6 +1879,7 @@ class NsxPolicyPlugin(nsx_plugin_common.NsxPluginV3Base):
         self.nsxpolicy.comm_map.create_entry(
             nsx_name, domain_id, map_id, entry_id=sg_rule['id'],
             description=sg_rule.get('description'),
+            sequence_number=sequence_number,
             service_ids=[service] if service else None,
             action=policy_constants.ACTION_ALLOW,
             source_groups=[source] if source else None,
@@ -1882,10 +1943,10 @@ class NsxPolicyPlugin(nsx_plugin_common.NsxPluginV3Base):
             # Add the security-group rules
             sg_rules = secgroup_db['security_group_rules']
             secgroup_logging = secgroup.get(sg_logging.LOGGING, False)
-            for sg_rule in sg_rules:
-                self._create_security_group_backend_rule(
-                    context, project_id, secgroup_db['id'], sg_rule,
-                    secgroup_logging)
+            # The communication map was just created, and has no entries
+            self._create_security_group_backend_rules(
+                context, project_id, secgroup_db['id'], sg_rules,
+                secgroup_logging, first_seq_num=1)
         except Exception as e:
             with excutils.save_and_reraise_exception():
                 LOG.exception("Failed to create backend SG rules "
@@ -1982,10 +2043,9 @@ class NsxPolicyPlugin(nsx_plugin_common.NsxPluginV3Base):
 
         domain_id = example_rule['tenant_id']
         secgroup_logging = self._is_security_group_logged(context, sg_id)
-        for rule_data in rules_db:
-            # create the NSX backend rule
-            self._create_security_group_backend_rule(
-                context, domain_id, sg_id, rule_data, secgroup_logging)
+        # create the NSX backend rules
+        self._create_security_group_backend_rules(
+            context, domain_id, sg_id, rules_db, secgroup_logging)
 
         return rules_db
 
@@ -2055,15 +2115,25 @@ class NsxPolicyPlugin(nsx_plugin_common.NsxPluginV3Base):
             return True
         if binding.binding_type == utils.NsxV3NetworkTypes.NSX_NETWORK:
             # check the backend network
-            segment = self.nsxpolicy.segment.get(binding.phy_uuid)
-            tz = self._get_nsx_net_tz_id(segment)
+            tz = self._get_segment_tz_id(binding.phy_uuid)
             if tz:
-                type = self.nsxpolicy.transport_zone.get_transport_type(
-                    tz)
+                type = self._get_tz_transport_type(tz)
                 return type == nsxlib_consts.TRANSPORT_TYPE_OVERLAY
 
+    def _get_segment_tz_id(self, segment_id):
+        return get_metadata_cache().get(
+            ('segment-tz', segment_id),
+            self.nsxpolicy.segment.get_transport_zone_id, segment_id)
+
+    def _get_tz_transport_type(self, tz_id):
+        return get_metadata_cache().get(
+            ('tz-transport-type', tz_id),
+            self.nsxpolicy.transport_zone.get_transport_type, tz_id)
+
     def _is_ens_tz(self, tz_id):
-        mode = self.nsxpolicy.transport_zone.get_host_switch_mode(tz_id)
+        mode = get_metadata_cache().get(
+            ('tz-host-switch-mode', tz_id),
+            self.nsxpolicy.transport_zone.get_host_switch_mode, tz_id)
         return mode == nsxlib_consts.HOST_SWITCH_MODE_ENS
 
     def _has_native_dhcp_metadata(self):
@@ -2085,8 +2155,7 @@ class NsxPolicyPlugin(nsx_plugin_common.NsxPluginV3Base):
             bind_type = bindings[0].binding_type
             if bind_type == utils.NsxV3NetworkTypes.NSX_NETWORK:
                 # If it is an NSX network, return the TZ of the backend segment
-                segment_id = bindings[0].phy_uuid
-                return self.nsxpolicy.segment.get_transport_zone_id(segment_id)
+                return self._get_segment_tz_id(bindings[0].phy_uuid)
             elif bind_type == utils.NetworkTypes.L3_EXT:
                 # External network has tier0 as phy_uuid
                 return
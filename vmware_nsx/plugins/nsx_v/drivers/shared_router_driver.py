@@ -12,12 +12,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
 import netaddr
 from oslo_config import cfg
+from oslo_utils import timeutils
+import sqlalchemy as sa
 
 from neutron.db import l3_db
 from neutron.db.models import l3 as l3_db_models
 from neutron.db import models_v2
+from neutron.db import standard_attr
 from neutron_lib.api import validators
 from neutron_lib import constants
 from neutron_lib.db import api as db_api
@@ -40,9 +45,210 @@ from vmware_nsx.plugins.nsx_v.vshield import edge_utils
 
 LOG = logging.getLogger(__name__)
 
+# Maximal number of routers loaded into the placement index in one query
+PLACEMENT_INDEX_CHUNK_SIZE = 500
+
+# Routers updated up to this many seconds before the previous sync of the
+# placement index are checked again, to tolerate clock skew between servers
+PLACEMENT_INDEX_SYNC_MARGIN = 60
+
+
+class SharedRouterPlacementIndex(object):
+    """In-memory index of the placement attributes of the shared routers.
+
+    For each shared router the index keeps its tenant, the subnet of its
+    gateway port, the IPSet of its interface subnets and whether it has
+    static routes. Entries are loaded on demand and reloaded when the driver
+    modifies a router. Before each lookup only the routers updated since the
+    previous sync are compared with their DB revision, so routers modified by
+    other workers are reloaded as well.
+
+    A lookup compares the router only with the routers bound to the edges of
+    its availability zone, which are the only ones the edge manager can use
+    or avoid.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._synced_at = timeutils.utcnow()
+
+    def _shared_routers_query(self, context, *columns):
+        ext_attrs = nsxv_models.NsxvRouterExtAttributes
+        return context.session.query(
+            l3_db_models.Router.id, *columns).join(
+                ext_attrs,
+                ext_attrs.router_id == l3_db_models.Router.id).filter(
+                    ext_attrs.router_type == 'shared')
+
+    def _get_updated_router_revisions(self, context, since):
+        query = self._shared_routers_query(
+            context, standard_attr.StandardAttribute.revision_number).join(
+                standard_attr.StandardAttribute,
+                l3_db_models.Router.standard_attr_id ==
+                standard_attr.StandardAttribute.id).filter(
+                    standard_attr.StandardAttribute.updated_at >= since)
+        return dict(query.all())
+
+    def _get_edges_routers(self, context, router_id, availability_zone):
+        """Return the shared routers bound to each candidate edge
+
+        The candidate edges are the edges of the availability zone, and the
+        edge the router is currently bound to.
+        """
+        binding_model = nsxv_models.NsxvRouterBinding
+        binding = nsxv_db.get_nsxv_router_binding(context.session, router_id)
+        edge_filter = binding_model.availability_zone == availability_zone
+        if binding and binding.edge_id:
+            edge_filter = sa.or_(edge_filter,
+                                 binding_model.edge_id == binding.edge_id)
+        query = self._shared_routers_query(
+            context, binding_model.edge_id).join(
+                binding_model,
+                binding_model.router_id == l3_db_models.Router.id).filter(
+                    binding_model.edge_id.isnot(None), edge_filter)
+        edges = {}
+        for rtr_id, edge_id in query.all():
+            if rtr_id != router_id:
+                edges.setdefault(edge_id, []).append(rtr_id)
+        return edges
+
+    def _load_routers(self, context, router_ids):
+        routers = self._shared_routers_query(
+            context, l3_db_models.Router.tenant_id,
+            l3_db_models.Router.gw_port_id,
+            standard_attr.StandardAttribute.revision_number).join(
+                standard_attr.StandardAttribute,
+                l3_db_models.Router.standard_attr_id ==
+                standard_attr.StandardAttribute.id).filter(
+                    l3_db_models.Router.id.in_(router_ids)).all()
+        ports = context.session.query(models_v2.Port).filter(
+            models_v2.Port.device_id.in_(router_ids),
+            models_v2.Port.device_owner.in_(
+                [l3_db.DEVICE_OWNER_ROUTER_INTF,
+                 l3_db.DEVICE_OWNER_ROUTER_GW])).all()
+        routed_ids = set(
+            route.router_id for route in context.session.query(
+                l3_db_models.RouterRoute.router_id).filter(
+                    l3_db_models.RouterRoute.router_id.in_(
+                        router_ids)).distinct())
+
+        gw_subnets = {}
+        intf_subnets = {}
+        for port in ports:
+            if port['device_owner'] == l3_db.DEVICE_OWNER_ROUTER_GW:
+                try:
+                    gw_subnets[port['id']] = port['fixed_ips'][0]['subnet_id']
+                except IndexError:
+                    LOG.error("Skipping GW port %s with no fixed IP",
+                              port['id'])
+            elif port['fixed_ips']:
+                intf_subnets.setdefault(port['device_id'], []).append(
+                    port['fixed_ips'][0]['subnet_id'])
+
+        subnet_ids = set(gw_subnets.values())
+        for ids in intf_subnets.values():
+            subnet_ids.update(ids)
+        cidrs = {}
+        if subnet_ids:
+            cidrs = dict(context.session.query(
+                models_v2.Subnet.id, models_v2.Subnet.cidr).filter(
+                    models_v2.Subnet.id.in_(subnet_ids)).all())
+
+        for router_id in router_ids:
+            self._entries.pop(router_id, None)
+        for router_id, tenant_id, gw_port_id, revision in routers:
+            gateway = gw_subnets.get(gw_port_id)
+            subnet_ids = intf_subnets.get(router_id, [])
+            entry = {'id': router_id,
+                     'tenant_id': tenant_id,
+                     'gateway': gateway,
+                     'gateway_cidr': cidrs.get(gateway),
+                     'subnet_ids': subnet_ids,
+                     'ip_set': netaddr.IPSet(
+                         [cidrs[s] for s in subnet_ids if s in cidrs]),
+                     'has_routes': router_id in routed_ids,
+                     'revision': revision}
+            LOG.debug('The router configuration is %s for router %s',
+                      entry, router_id)
+            self._entries[router_id] = entry
+
+    def update_routers(self, context, router_ids):
+        """Reload the index entries of the given routers from the DB"""
+        router_ids = list(router_ids)
+        for i in range(0, len(router_ids), PLACEMENT_INDEX_CHUNK_SIZE):
+            self._load_routers(
+                context, router_ids[i:i + PLACEMENT_INDEX_CHUNK_SIZE])
+
+    def update_router(self, context, router_id):
+        self.update_routers(context, [router_id])
+
+    def remove_router(self, router_id):
+        self._entries.pop(router_id, None)
+
+    def sync(self, context):
+        """Reload the cached routers modified since the previous sync"""
+        now = timeutils.utcnow()
+        revisions = self._get_updated_router_revisions(
+            context, self._synced_at - datetime.timedelta(
+                seconds=PLACEMENT_INDEX_SYNC_MARGIN))
+        self._synced_at = now
+        self.update_routers(
+            context,
+            [router_id for router_id, revision in revisions.items()
+             if (router_id in self._entries and
+                 self._entries[router_id]['revision'] != revision)])
+
+    def _get_entries(self, context, router_ids):
+        missing_ids = [r_id for r_id in router_ids
+                       if r_id not in self._entries]
+        if missing_ids:
+            self.update_routers(context, missing_ids)
+        return [self._entries[r_id] for r_id in router_ids
+                if r_id in self._entries]
+
+    def get_available_and_conflicting_ids(self, context, router_id,
+                                          availability_zone):
+        self.sync(context)
+        src_router = self._get_entries(context, [router_id])[0]
+        edges_routers = self._get_edges_routers(
+            context, router_id, availability_zone)
+
+        available_routers = []
+        conflict_routers = []
+        conflict_ip_set = src_router['ip_set']
+        if src_router['gateway_cidr']:
+            conflict_ip_set = conflict_ip_set | netaddr.IPSet(
+                [src_router['gateway_cidr']])
+        share_between_tenants = cfg.CONF.nsxv.share_edges_between_tenants
+        for edge_id, router_ids in edges_routers.items():
+            for r in self._get_entries(context, router_ids):
+                # Router with static routes is conflict with other routers
+                if src_router['has_routes'] or r['has_routes']:
+                    conflict_routers.append(r['id'])
+                # Check conflict router ids with gateway and interface
+                elif (src_router['gateway'] is None or
+                      r['gateway'] is None or
+                      src_router['gateway'] == r['gateway']):
+                    if conflict_ip_set & r['ip_set']:
+                        conflict_routers.append(r['id'])
+                    elif (not share_between_tenants and
+                          src_router['tenant_id'] != r['tenant_id']):
+                        # routers of other tenants are conflicting
+                        conflict_routers.append(r['id'])
+                    else:
+                        available_routers.append(r['id'])
+                else:
+                    conflict_routers.append(r['id'])
+
+        return (available_routers, conflict_routers)
+
 
 class RouterSharedDriver(router_driver.RouterBaseDriver):
 
+    def __init__(self, plugin):
+        super(RouterSharedDriver, self).__init__(plugin)
+        self._placement_index = SharedRouterPlacementIndex()
+
     def get_type(self):
         return "shared"
 
@@ -116,6 +322,7 @@ class RouterSharedDriver(router_driver.RouterBaseDriver):
         self._notify_after_router_edge_association(context, router_db)
 
     def delete_router(self, context, router_id):
+        self._placement_index.remove_router(router_id)
         # make sure that the router binding is cleaned up
         try:
             nsxv_db.delete_nsxv_router_binding(context.session, router_id)
@@ -370,17 +577,6 @@ class RouterSharedDriver(router_driver.RouterBaseDriver):
                 ext_net_ids.append(ext_net_id)
         return ext_net_ids
 
-    def _get_shared_routers(self, context):
-        shared_routers = []
-        routers_qry = context.session.query(l3_db_models.Router).all()
-        for r in routers_qry:
-            nsx_attr = (context.session.query(
-                nsxv_models.NsxvRouterExtAttributes).filter_by(
-                    router_id=r['id']).first())
-            if nsx_attr and nsx_attr['router_type'] == 'shared':
-                shared_routers.append(r)
-        return shared_routers
-
     def _get_available_and_conflicting_ids(self, context, router_id):
         """Query all conflicting router ids with existing router id.
         The router with static routes will be conflict with all other routers.
@@ -388,88 +584,12 @@ class RouterSharedDriver(router_driver.RouterBaseDriver):
         The routers with overlapping interface will be conflict.
         In not share_edges_between_tenants: The routers of different tenants
             will be in conflict with the router
+        Only the routers bound to the edges of the router availability zone
+        are checked, as the other routers cannot share its edge.
         """
-        # 1. Check gateway
-        # 2. Check subnet interface
-        # 3. Check static routes
-        router_list = []
-        src_router_dict = {}
-        ports_qry = context.session.query(models_v2.Port)
-        intf_ports = ports_qry.filter_by(
-            device_owner=l3_db.DEVICE_OWNER_ROUTER_INTF).all()
-        gw_ports = ports_qry.filter_by(
-            device_owner=l3_db.DEVICE_OWNER_ROUTER_GW).all()
-        shared_routers = self._get_shared_routers(context)
-        for r in shared_routers:
-            router_dict = {}
-            router_dict['id'] = r['id']
-            router_dict['gateway'] = None
-            router_dict['tenant_id'] = r['tenant_id']
-            for gwp in gw_ports:
-                if gwp['id'] == r['gw_port_id']:
-                    try:
-                        router_dict['gateway'] = (
-                            gwp['fixed_ips'][0]['subnet_id'])
-                    except IndexError:
-                        LOG.error("Skipping GW port %s with no fixed IP",
-                                  gwp['id'])
-            subnet_ids = [p['fixed_ips'][0]['subnet_id'] for p in
-                          intf_ports if p['device_id'] == r['id']]
-            router_dict['subnet_ids'] = subnet_ids
-            extra_routes = self.plugin._get_extra_routes_by_router_id(
-                context, r['id'])
-            destinations = [routes['destination'] for routes in extra_routes]
-            router_dict['destinations'] = destinations
-
-            LOG.debug('The router configuration is %s for router %s',
-                      router_dict, router_dict['id'])
-            if router_id != r['id']:
-                router_list.append(router_dict)
-            else:
-                src_router_dict = router_dict
-
-        # Router with static routes is conflict with other routers
-        available_routers = []
-        conflict_routers = []
-        if src_router_dict['destinations'] != []:
-            conflict_routers = [r['id'] for r in router_list]
-            return (available_routers, conflict_routers)
-
-        subnets_qry = context.session.query(models_v2.Subnet).all()
-        conflict_cidr_set = []
-        for subnet in subnets_qry:
-            if subnet['id'] in src_router_dict['subnet_ids']:
-                conflict_cidr_set.append(subnet['cidr'])
-            if (src_router_dict['gateway'] is not None and
-                subnet['id'] == src_router_dict['gateway']):
-                conflict_cidr_set.append(subnet['cidr'])
-        conflict_ip_set = netaddr.IPSet(conflict_cidr_set)
-        # Check conflict router ids with gateway and interface
-        for r in router_list:
-            if r['destinations'] != []:
-                conflict_routers.append(r['id'])
-            else:
-                cidr_set = []
-                for subnet in subnets_qry:
-                    if subnet['id'] in r['subnet_ids']:
-                        cidr_set.append(subnet['cidr'])
-                ip_set = netaddr.IPSet(cidr_set)
-                if (src_router_dict['gateway'] is None or
-                    r['gateway'] is None or
-                    src_router_dict['gateway'] == r['gateway']):
-                    if (conflict_ip_set & ip_set):
-                        conflict_routers.append(r['id'])
-                    else:
-                        if (not cfg.CONF.nsxv.share_edges_between_tenants and
-                            src_router_dict['tenant_id'] != r['tenant_id']):
-                            # routers of other tenants are conflicting
-                            conflict_routers.append(r['id'])
-                        else:
-                            available_routers.append(r['id'])
-                else:
-                    conflict_routers.append(r['id'])
-
-        return (available_routers, conflict_routers)
+        az = self.get_router_az_by_id(context, router_id)
+        return self._placement_index.get_available_and_conflicting_ids(
+            context, router_id, az.name)
 
     def _get_conflict_network_and_router_ids_by_intf(self, context, router_id):
         """Collect conflicting networks and routers based on interface ports.
@@ -693,6 +813,7 @@ class RouterSharedDriver(router_driver.RouterBaseDriver):
         if not edge_id:
             super(nsx_v.NsxVPluginV2, self.plugin)._update_router_gw_info(
                 context, router_id, info, router=router)
+            self._placement_index.update_router(context, router_id)
         # UPDATE gw info only if the router has been attached to an edge
         else:
             is_migrated = False
@@ -706,6 +827,7 @@ class RouterSharedDriver(router_driver.RouterBaseDriver):
                     context, router))
             super(nsx_v.NsxVPluginV2, self.plugin)._update_router_gw_info(
                 context, router_id, info, router=router)
+            self._placement_index.update_router(context, router_id)
             new_ext_net_id = (router.gw_port_id and
                               router.gw_port.network_id)
             new_enable_snat = router.enable_snat
@@ -787,8 +909,10 @@ class RouterSharedDriver(router_driver.RouterBaseDriver):
 
     def _base_add_router_interface(self, context, router_id, interface_info):
         with locking.LockManager.get_lock('nsx-shared-router-pool'):
-            return super(nsx_v.NsxVPluginV2, self.plugin).add_router_interface(
+            info = super(nsx_v.NsxVPluginV2, self.plugin).add_router_interface(
                 context, router_id, interface_info)
+            self._placement_index.update_router(context, router_id)
+            return info
 
     def add_router_interface(self, context, router_id, interface_info):
         # Lock the shared router before any action that can cause the router
@@ -807,6 +931,7 @@ class RouterSharedDriver(router_driver.RouterBaseDriver):
                 info = super(nsx_v.NsxVPluginV2,
                              self.plugin).add_router_interface(
                                  context, router_id, interface_info)
+                self._placement_index.update_router(context, router_id)
                 with locking.LockManager.get_lock(str(edge_id)):
                     router_ids = self.edge_manager.get_routers_on_same_edge(
                         context, router_id)
@@ -901,6 +1026,7 @@ class RouterSharedDriver(router_driver.RouterBaseDriver):
             info = super(
                 nsx_v.NsxVPluginV2, self.plugin).remove_router_interface(
                     context, router_id, interface_info)
+            self._placement_index.update_router(context, router_id)
             subnet = self.plugin.get_subnet(context, info['subnet_id'])
             network_id = subnet['network_id']
             ports = self.plugin._get_router_interface_ports_by_network(
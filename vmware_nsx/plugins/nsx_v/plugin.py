@@ -1469,6 +1469,13 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
         qos_data = qos_utils.NsxVQosRule(
             context=context, qos_policy_id=qos_policy_id)
 
+        for dvs_id, net_moref in self._get_network_dvs_mappings(
+                context, net_id):
+            self._update_qos_on_backend_port_groups(
+                net_id, dvs_id, net_moref, qos_data)
+
+    def _get_network_dvs_mappings(self, context, net_id):
+        """Return a list of (dvs id, moref) of the network port groups"""
         # default dvs for this network
         az = self.get_network_az_by_net_id(context, net_id)
         az_dvs_id = az.dvs_id
@@ -1476,12 +1483,16 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
         # get the network moref/s from the db
         net_mappings = nsx_db.get_nsx_network_mappings(
             context.session, net_id)
-        for mapping in net_mappings:
-            # update the qos restrictions of the network
-            self._vcm.update_port_groups_config(
-                mapping.dvs_id or az_dvs_id,
-                net_id, mapping.nsx_id,
-                self._vcm.update_port_group_spec_qos, qos_data)
+        return [(mapping.dvs_id or az_dvs_id, mapping.nsx_id)
+                for mapping in net_mappings]
+
+    def _update_qos_on_backend_port_groups(self, net_id, dvs_id, net_moref,
+                                           qos_data):
+        # update the qos restrictions of the network
+        # Note: this does not access the DB, so it may run concurrently
+        self._vcm.update_port_groups_config(
+            dvs_id, net_id, net_moref,
+            self._vcm.update_port_group_spec_qos, qos_data)
 
     def _cleanup_dhcp_edge_before_deletion(self, context, net_id):
         if self.metadata_proxy_handler:
@@ -725,13 +725,27 @@ class Vcns(object):
         headers = {'If-Match': etag}
         return headers
 
-    def remove_rule_from_section(self, section_uri, rule_id):
+    def remove_rule_from_section(self, section_uri, rule_id, h=None):
         """Deletes a rule from nsx section table."""
         uri = '%s/rules/%s?autoSaveDraft=false' % (section_uri, rule_id)
-        headers = self._get_section_header(section_uri)
+        headers = self._get_section_header(section_uri, h)
         return self.do_request(HTTP_DELETE, uri, format='xml',
                                headers=headers)
 
+    def add_rule_to_section(self, section_uri, request, h=None):
+        """Adds a rule to the end of a nsx section table."""
+        uri = '%s/rules?autoSaveDraft=false' % section_uri
+        headers = self._get_section_header(section_uri, h)
+        return self.do_request(HTTP_POST, uri, request, format='xml',
+                               decode=False, encode=False, headers=headers)
+
+    def update_section_rule(self, section_uri, rule_id, request, h=None):
+        """Replaces a rule in nsx section table."""
+        uri = '%s/rules/%s?autoSaveDraft=false' % (section_uri, rule_id)
+        headers = self._get_section_header(section_uri, h)
+        return self.do_request(HTTP_PUT, uri, request, format='xml',
+                               decode=False, encode=False, headers=headers)
+
     @retry_upon_exception(exceptions.RequestBad)
     def add_member_to_security_group(self, security_group_id, member_id):
         """Adds a vnic member to nsx security group."""
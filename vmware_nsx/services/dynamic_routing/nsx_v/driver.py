@@ -29,6 +29,7 @@ from vmware_nsx._i18n import _
 from vmware_nsx.common import exceptions as nsx_exc
 from vmware_nsx.common import locking
 from vmware_nsx.common import nsxv_constants
+from vmware_nsx.common import utils
 from vmware_nsx.db import nsxv_db
 from vmware_nsx.extensions import edge_service_gateway_bgp_peer as ext_esg_peer
 from vmware_nsx.extensions import projectpluginmap
@@ -100,6 +101,44 @@ class NSXvBgpDriver(object):
     def prefix_name(self, subnet_id):
         return 'subnet-%s' % subnet_id
 
+    def _run_on_edges(self, edge_ids, func, action, lock_edges=True):
+        """Apply a routing change to all the edges concurrently
+
+        Each edge is locked while it is updated, so that changes to the same
+        edge are applied in the order they were requested.
+        Returns the list of edges which were updated successfully. Backend
+        failures are reported together, and any other error is raised.
+        """
+        def _run_on_edge(edge_id):
+            if not lock_edges:
+                return func(edge_id)
+            with locking.LockManager.get_lock(edge_id):
+                return func(edge_id)
+
+        succeeded = []
+        failed = {}
+        unexpected_error = None
+        for edge_id, _result, error in utils.run_in_pool(
+                _run_on_edge, edge_ids, cfg.CONF.nsxv.bgp_edge_workers):
+            if error is None:
+                succeeded.append(edge_id)
+                continue
+            failed[edge_id] = error
+            if not isinstance(error, vcns_exc.VcnsApiException):
+                unexpected_error = unexpected_error or error
+
+        if failed:
+            LOG.error("Failed to %(action)s on %(failed)s out of %(num)s "
+                      "edges: %(errors)s",
+                      {'action': action, 'failed': len(failed),
+                       'num': len(edge_ids),
+                       'errors': '; '.join(
+                           "%s: %s" % (edge_id, failed[edge_id])
+                           for edge_id in sorted(failed))})
+        if unexpected_error:
+            raise unexpected_error
+        return succeeded
+
     def _get_router_edge_info(self, context, router_id):
         edge_binding = nsxv_db.get_nsxv_router_binding(context.session,
                                                        router_id)
@@ -244,12 +283,11 @@ class NSXvBgpDriver(object):
         edge_ids = [bgp_binding['edge_id'] for bgp_binding in bgp_bindings]
         action = 'Enabling' if new_enabled_state else 'Disabling'
         LOG.info("%s BGP route redistribution on edges: %s.", action, edge_ids)
-        for edge_id in edge_ids:
-            try:
-                self._nsxv.update_routing_redistribution(edge_id,
-                                                         new_enabled_state)
-            except vcns_exc.VcnsApiException:
-                LOG.warning("Failed to update BGP on edge '%s'.", edge_id)
+        self._run_on_edges(
+            edge_ids,
+            lambda edge_id: self._nsxv.update_routing_redistribution(
+                edge_id, new_enabled_state),
+            "update BGP route redistribution")
 
     def delete_bgp_speaker(self, context, bgp_speaker_id):
         bgp_bindings = nsxv_db.get_nsxv_bgp_speaker_bindings(
@@ -310,16 +348,12 @@ class NSXvBgpDriver(object):
                     continue
                 bgp_bindings = nsxv_db.get_nsxv_bgp_speaker_bindings(
                     context.session, bgp_speaker_id)
-                for binding in bgp_bindings:
-                    try:
-                        # Neighbours are identified by their ip address
-                        self._nsxv.update_bgp_neighbours(binding['edge_id'],
-                                                         [neighbour],
-                                                         [neighbour])
-                    except vcns_exc.VcnsApiException:
-                        LOG.error("Failed to update BGP neighbor '%s' on "
-                                  "edge '%s'", old_bgp_peer['peer_ip'],
-                                  binding['edge_id'])
+                # Neighbours are identified by their ip address
+                self._run_on_edges(
+                    [binding['edge_id'] for binding in bgp_bindings],
+                    lambda edge_id: self._nsxv.update_bgp_neighbours(
+                        edge_id, [neighbour], [neighbour]),
+                    "update BGP neighbor '%s'" % old_bgp_peer['peer_ip'])
 
     def _validate_bgp_peer(self, context, bgp_speaker_id, new_peer_id):
         new_peer = self._plugin._get_bgp_peer(context, new_peer_id)
@@ -340,20 +374,20 @@ class NSXvBgpDriver(object):
         speaker = self._plugin.get_bgp_speaker(context, bgp_speaker_id)
         # list of tenant edge routers to be removed as bgp-neighbours to this
         # peer if it's associated with specific ESG.
+        bgp_identifiers = dict((binding['edge_id'], binding['bgp_identifier'])
+                               for binding in bgp_bindings)
+        added_edge_ids = self._run_on_edges(
+            list(bgp_identifiers),
+            lambda edge_id: self._nsxv.add_bgp_neighbours(edge_id, [nbr]),
+            "add BGP neighbour '%s'" % bgp_peer_obj['peer_ip'])
         neighbours = []
-        for binding in bgp_bindings:
-            try:
-                self._nsxv.add_bgp_neighbours(binding['edge_id'], [nbr])
-            except vcns_exc.VcnsApiException:
-                LOG.error("Failed to add BGP neighbour on '%s'",
-                          binding['edge_id'])
-            else:
-                gw_nbr = gw_bgp_neighbour(binding['bgp_identifier'],
-                                          speaker['local_as'],
-                                          bgp_peer_obj['password'])
-                neighbours.append(gw_nbr)
-                LOG.debug("Succesfully added BGP neighbor '%s' on '%s'",
-                          bgp_peer_obj['peer_ip'], binding['edge_id'])
+        for edge_id in added_edge_ids:
+            gw_nbr = gw_bgp_neighbour(bgp_identifiers[edge_id],
+                                      speaker['local_as'],
+                                      bgp_peer_obj['password'])
+            neighbours.append(gw_nbr)
+            LOG.debug("Succesfully added BGP neighbor '%s' on '%s'",
+                      bgp_peer_obj['peer_ip'], edge_id)
 
         if bgp_peer_obj.get('esg_id'):
             edge_gw = bgp_peer_obj['esg_id']
@@ -373,20 +407,20 @@ class NSXvBgpDriver(object):
         speaker = self._plugin.get_bgp_speaker(context, bgp_speaker_id)
         # list of tenant edge routers to be removed as bgp-neighbours to this
         # peer if it's associated with specific ESG.
+        bgp_identifiers = dict((binding['edge_id'], binding['bgp_identifier'])
+                               for binding in bgp_bindings)
+        removed_edge_ids = self._run_on_edges(
+            list(bgp_identifiers),
+            lambda edge_id: self._nsxv.remove_bgp_neighbours(edge_id, [nbr]),
+            "remove BGP neighbour '%s'" % bgp_peer_obj['peer_ip'])
         neighbours = []
-        for binding in bgp_bindings:
-            try:
-                self._nsxv.remove_bgp_neighbours(binding['edge_id'], [nbr])
-            except vcns_exc.VcnsApiException:
-                LOG.error("Failed to remove BGP neighbour on '%s'",
-                          binding['edge_id'])
-            else:
-                gw_nbr = gw_bgp_neighbour(binding['bgp_identifier'],
-                                          speaker['local_as'],
-                                          bgp_peer_obj['password'])
-                neighbours.append(gw_nbr)
-                LOG.debug("Succesfully removed BGP neighbor '%s' on '%s'",
-                          bgp_peer_obj['peer_ip'], binding['edge_id'])
+        for edge_id in removed_edge_ids:
+            gw_nbr = gw_bgp_neighbour(bgp_identifiers[edge_id],
+                                      speaker['local_as'],
+                                      bgp_peer_obj['password'])
+            neighbours.append(gw_nbr)
+            LOG.debug("Succesfully removed BGP neighbor '%s' on '%s'",
+                      bgp_peer_obj['peer_ip'], edge_id)
 
         if bgp_peer_obj.get('esg_id'):
             edge_gw = bgp_peer_obj['esg_id']
@@ -439,24 +473,32 @@ class NSXvBgpDriver(object):
         bgp_peers = self._plugin.get_bgp_peers_by_bgp_speaker(
             context, bgp_speaker_id)
         local_as = speaker['local_as']
-        peers = []
+        # Collect the edges subnets from the DB before configuring all the
+        # edges concurrently
+        edge_subnets = {}
         for edge_id, edge_router_config in edge_router_dict.items():
             router_ids = edge_router_config['no_snat_routers']
-            advertise_static_routes = (
-                edge_router_config['advertise_static_routes'])
-            subnets = self._query_tenant_subnets(context, router_ids)
+            edge_subnets[edge_id] = self._query_tenant_subnets(context,
+                                                               router_ids)
+
+        def _configure_edge(edge_id):
+            edge_router_config = edge_router_dict[edge_id]
             # router_id here is in IP address format and is required for
             # the BGP configuration.
-            bgp_identifier = edge_router_config['bgp_identifier']
-            try:
-                self._start_bgp_on_edge(context, edge_id, speaker,
-                                        bgp_peers, bgp_identifier, subnets,
-                                        advertise_static_routes)
-            except vcns_exc.VcnsApiException:
-                LOG.error("Failed to configure BGP speaker %s on edge '%s'.",
-                          bgp_speaker_id, edge_id)
-            else:
-                peers.append(bgp_identifier)
+            self._configure_bgp_on_edge(
+                edge_id, speaker, bgp_peers,
+                edge_router_config['bgp_identifier'], edge_subnets[edge_id],
+                edge_router_config['advertise_static_routes'])
+
+        configured_edge_ids = self._run_on_edges(
+            list(edge_router_dict), _configure_edge,
+            "configure BGP speaker %s" % bgp_speaker_id)
+        peers = []
+        for edge_id in configured_edge_ids:
+            bgp_identifier = edge_router_dict[edge_id]['bgp_identifier']
+            nsxv_db.add_nsxv_bgp_speaker_binding(context.session, edge_id,
+                                                 speaker['id'], bgp_identifier)
+            peers.append(bgp_identifier)
 
         for edge_gw, password in [(peer['esg_id'], peer['password'])
                                   for peer in bgp_peers if peer.get('esg_id')]:
@@ -470,6 +512,15 @@ class NSXvBgpDriver(object):
 
     def _start_bgp_on_edge(self, context, edge_id, speaker, bgp_peers,
                            bgp_identifier, subnets, advertise_static_routes):
+        self._configure_bgp_on_edge(edge_id, speaker, bgp_peers,
+                                    bgp_identifier, subnets,
+                                    advertise_static_routes)
+        nsxv_db.add_nsxv_bgp_speaker_binding(context.session, edge_id,
+                                             speaker['id'], bgp_identifier)
+
+    def _configure_bgp_on_edge(self, edge_id, speaker, bgp_peers,
+                               bgp_identifier, subnets,
+                               advertise_static_routes):
         enabled_state = speaker['advertise_tenant_networks']
         local_as = speaker['local_as']
         prefixes, redis_rules = self._get_prefixes_and_redistribution_rules(
@@ -486,25 +537,22 @@ class NSXvBgpDriver(object):
             with excutils.save_and_reraise_exception():
                 LOG.error("Failed to configure BGP speaker '%s' on edge '%s'.",
                           speaker['id'], edge_id)
-        else:
-            nsxv_db.add_nsxv_bgp_speaker_binding(context.session, edge_id,
-                                                 speaker['id'], bgp_identifier)
 
-    def _stop_bgp_on_edges(self, context, bgp_bindings, speaker_id):
+    def _stop_bgp_on_edges(self, context, bgp_bindings, speaker_id,
+                           lock_edges=True):
         peers_to_remove = []
         speaker = self._plugin.get_bgp_speaker(context, speaker_id)
         local_as = speaker['local_as']
-        for bgp_binding in bgp_bindings:
-            edge_id = bgp_binding['edge_id']
-            try:
-                self._nsxv.delete_bgp_speaker_config(edge_id)
-            except vcns_exc.VcnsApiException:
-                LOG.error("Failed to delete BGP speaker '%s' config on edge "
-                          "'%s'.", speaker_id, edge_id)
-            else:
-                nsxv_db.delete_nsxv_bgp_speaker_binding(context.session,
-                                                        edge_id)
-                peers_to_remove.append(bgp_binding['bgp_identifier'])
+        bgp_identifiers = dict((bgp_binding['edge_id'],
+                                bgp_binding['bgp_identifier'])
+                               for bgp_binding in bgp_bindings)
+        stopped_edge_ids = self._run_on_edges(
+            list(bgp_identifiers), self._nsxv.delete_bgp_speaker_config,
+            "delete BGP speaker '%s' config" % speaker_id,
+            lock_edges=lock_edges)
+        for edge_id in stopped_edge_ids:
+            nsxv_db.delete_nsxv_bgp_speaker_binding(context.session, edge_id)
+            peers_to_remove.append(bgp_identifiers[edge_id])
 
         # We should also remove all bgp neighbours on gw-edges which
         # corresponds with tenant routers that are associated with this bgp
@@ -669,7 +717,9 @@ class NSXvBgpDriver(object):
                 self._update_edge_bgp_identifier(context, bgp_binding, speaker,
                                                  alt_bgp_identifiers[0])
         else:
-            self._stop_bgp_on_edges(context, [bgp_binding], speaker['id'])
+            # This may be called while the core plugin holds the edge lock
+            self._stop_bgp_on_edges(context, [bgp_binding], speaker['id'],
+                                    lock_edges=False)
 
     def advertise_subnet(self, context, speaker_id, router_id, subnet):
         router = self._core_plugin._get_router(context, router_id)
@@ -33,6 +33,8 @@ from vmware_nsx.common import config  # noqa
 from vmware_nsx.common import exceptions as nsx_exc
 from vmware_nsx.common import locking
 from vmware_nsx.common import nsxv_constants
+from vmware_nsx.plugins.nsx_v.vshield.common import (
+    exceptions as vcns_exc)
 from vmware_nsx.plugins.nsx_v.vshield import vcns as nsxv_api
 from vmware_nsx.plugins.nsx_v.vshield import vcns_driver
 from vmware_nsx.services.flowclassifier.nsx_v import utils as fc_utils
@@ -40,6 +42,8 @@ from vmware_nsx.services.flowclassifier.nsx_v import utils as fc_utils
 LOG = logging.getLogger(__name__)
 
 REDIRECT_FW_SECTION_NAME = 'OS Flow Classifier Rules'
+# HTTP statuses of a rule update rejected because the section has changed
+SECTION_CHANGED_STATUSES = (409, 412)
 
 
 class NsxvFlowClassifierDriver(fc_driver.FlowClassifierDriverBase):
@@ -49,6 +53,10 @@ class NsxvFlowClassifierDriver(fc_driver.FlowClassifierDriverBase):
 
     def initialize(self):
         self._nsxv = vcns_driver.VcnsDriver(None)
+        # The ETag of the redirect section and the ids of its rules by the
+        # flow classifier id, as last seen by this driver
+        self._section_etag = None
+        self._rule_ids = {}
         self.init_profile_id()
         self.init_security_group()
         self.init_security_group_in_profile()
@@ -181,20 +189,6 @@ class NsxvFlowClassifierDriver(fc_driver.FlowClassifierDriverBase):
                              nsxv_api.FIREWALL_REDIRECT_SEC_TYPE,
                              self.get_redirect_fw_section_id())
 
-    def get_redirect_fw_section_from_backend(self):
-        section_uri = self.get_redirect_fw_section_uri()
-        section_resp = self._nsxv.vcns.get_section(section_uri)
-        if section_resp and len(section_resp) > 1:
-            xml_section = section_resp[1]
-            return et.fromstring(xml_section)
-
-    def update_redirect_section_in_backed(self, section):
-        section_uri = self.get_redirect_fw_section_uri()
-        self._nsxv.vcns.update_section(
-            section_uri,
-            et.tostring(section, encoding="us-ascii"),
-            None)
-
     def _rule_ip_type(self, flow_classifier):
         if flow_classifier.get('ethertype') == 'IPv6':
             return 'Ipv6Address'
@@ -219,8 +213,52 @@ class NsxvFlowClassifierDriver(fc_driver.FlowClassifierDriverBase):
         return (flow_classifier.get('name')[:200] + '-' +
                 flow_classifier.get('id'))
 
-    def _is_the_same_rule(self, rule, flow_classifier_id):
-        return rule.find('name').text.endswith(flow_classifier_id)
+    def _sync_redirect_section(self):
+        """Reload the section ETag & rules ids from the backend"""
+        section_uri = self.get_redirect_fw_section_uri()
+        h, xml_section = self._nsxv.vcns.get_section(section_uri)
+        self._rule_ids = {}
+        for rule in et.fromstring(xml_section).iter('rule'):
+            # The rule name ends with the flow classifier id
+            name = rule.find('name').text or ''
+            self._rule_ids[name[-36:]] = rule.attrib.get('id')
+        self._set_section_etag(h)
+
+    def _set_section_etag(self, h):
+        # Without the new ETag the section will be reloaded on next update
+        self._section_etag = h.get('etag') if h else None
+
+    def _get_section_header(self):
+        # Without a cached ETag, vcns fetches the current one of the section
+        if self._section_etag:
+            return {'etag': self._section_etag}
+
+    def _get_rule_id(self, flow_classifier_id):
+        rule_id = self._rule_ids.get(flow_classifier_id)
+        if rule_id is None:
+            # The rule may have been created by another neutron server
+            self._sync_redirect_section()
+            rule_id = self._rule_ids.get(flow_classifier_id)
+        return rule_id
+
+    def _update_redirect_rule(self, func):
+        """Run a single rule update of the redirect section
+
+        The update is done with the cached section ETag. If the section has
+        changed on the backend since, the cache is reloaded and the update
+        is retried.
+        """
+        if self._section_etag is None:
+            self._sync_redirect_section()
+        try:
+            return func()
+        except vcns_exc.VcnsApiException as e:
+            if e.status not in SECTION_CHANGED_STATUSES:
+                raise
+            LOG.info("Redirect section was changed on the backend. "
+                     "Reloading it.")
+            self._sync_redirect_section()
+            return func()
 
     def init_redirect_fw_rule(self, redirect_rule, flow_classifier):
         et.SubElement(redirect_rule, 'name').text = self._rule_name(
@@ -284,60 +322,74 @@ class NsxvFlowClassifierDriver(fc_driver.FlowClassifierDriverBase):
         """Create a redirect rule at the backend
         """
         flow_classifier = context.current
+        new_rule = et.Element('rule')
+        self.init_redirect_fw_rule(new_rule, flow_classifier)
+
+        def _add_rule():
+            h, xml_rule = self._nsxv.vcns.add_rule_to_section(
+                self.get_redirect_fw_section_uri(),
+                et.tostring(new_rule, encoding="us-ascii"),
+                self._get_section_header())
+            self._set_section_etag(h)
+            self._rule_ids[flow_classifier['id']] = et.fromstring(
+                xml_rule).attrib.get('id')
+
         with self._loc_fw_section():
-            section = self.get_redirect_fw_section_from_backend()
-            new_rule = et.SubElement(section, 'rule')
-            self.init_redirect_fw_rule(new_rule, flow_classifier)
-            self.update_redirect_section_in_backed(section)
+            self._update_redirect_rule(_add_rule)
 
     @log_helpers.log_method_call
     def update_flow_classifier(self, context):
         """Update the backend redirect rule
         """
         flow_classifier = context.current
-
-        with self._loc_fw_section():
-            section = self.get_redirect_fw_section_from_backend()
-            redirect_rule = None
-            for rule in section.iter('rule'):
-                if self._is_the_same_rule(rule, flow_classifier['id']):
-                    redirect_rule = rule
-                    break
-
-            if redirect_rule is None:
+        # The flowclassifier plugin currently supports updating only
+        # name or description, so the rest of the rule is unchanged
+        redirect_rule = et.Element('rule')
+        self.init_redirect_fw_rule(redirect_rule, flow_classifier)
+
+        def _update_rule():
+            rule_id = self._get_rule_id(flow_classifier['id'])
+            if rule_id is None:
                 msg = _("Failed to find redirect rule %s "
                         "on backed") % flow_classifier['id']
                 raise exc.FlowClassifierException(message=msg)
-            else:
-                # The flowclassifier plugin currently supports updating only
-                # name or description
-                name = redirect_rule.find('name')
-                name.text = self._rule_name(flow_classifier)
-                notes = redirect_rule.find('notes')
-                notes.text = flow_classifier.get('description') or ''
-                self.update_redirect_section_in_backed(section)
+            redirect_rule.attrib['id'] = rule_id
+            h, xml_rule = self._nsxv.vcns.update_section_rule(
+                self.get_redirect_fw_section_uri(), rule_id,
+                et.tostring(redirect_rule, encoding="us-ascii"),
+                self._get_section_header())
+            self._set_section_etag(h)
+
+        with self._loc_fw_section():
+            self._update_redirect_rule(_update_rule)
 
     @log_helpers.log_method_call
     def delete_flow_classifier(self, context):
         """Delete the backend redirect rule
         """
         flow_classifier_id = context.current['id']
-        with self._loc_fw_section():
-            section = self.get_redirect_fw_section_from_backend()
-            redirect_rule = None
-            for rule in section.iter('rule'):
-                if self._is_the_same_rule(rule, flow_classifier_id):
-                    redirect_rule = rule
-                    section.remove(redirect_rule)
-                    break
-
-            if redirect_rule is None:
+
+        def _delete_rule():
+            rule_id = self._get_rule_id(flow_classifier_id)
+            if rule_id is None:
                 LOG.error("Failed to delete redirect rule %s: "
                           "Could not find rule on backed",
                           flow_classifier_id)
                 # should not fail the deletion
-            else:
-                self.update_redirect_section_in_backed(section)
+                return
+            try:
+                h, c = self._nsxv.vcns.remove_rule_from_section(
+                    self.get_redirect_fw_section_uri(), rule_id,
+                    self._get_section_header())
+            except vcns_exc.ResourceNotFound:
+                LOG.warning("Redirect rule %s was already deleted from the "
+                            "backend", flow_classifier_id)
+                h = None
+            self._set_section_etag(h)
+            self._rule_ids.pop(flow_classifier_id, None)
+
+        with self._loc_fw_section():
+            self._update_redirect_rule(_delete_rule)
 
     @log_helpers.log_method_call
     def create_flow_classifier_precommit(self, context):
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import weakref
+
 from oslo_config import cfg
 from oslo_log import log as logging
 
@@ -20,6 +22,7 @@ from neutron.agent.l3 import router_info
 from neutron.common import config as neutron_config  # noqa
 from neutron_lib import constants as nl_constants
 from neutron_lib import context as n_context
+from neutron_lib import exceptions as n_exc
 from neutron_lib.plugins import directory
 
 LOG = logging.getLogger(__name__)
@@ -49,6 +52,9 @@ class NsxFwaasCallbacksV2(firewall_l3_agent_v2.L3WithFWaaS):
         super(NsxFwaasCallbacksV2, self).__init__(conf=neutron_conf)
         self.agent_api = DummyAgentApi()
         self._core_plugin = None
+        # Ports & routers already fetched while handling an RPC callback,
+        # by the callback context. Entries go away with the context.
+        self._callback_cache = weakref.WeakKeyDictionary()
 
     @property
     def plugin_type(self):
@@ -89,7 +95,8 @@ class NsxFwaasCallbacksV2(firewall_l3_agent_v2.L3WithFWaaS):
                             router.internal_ports])
 
         # Return in-namespace port objects.
-        ports = self._get_in_ns_ports(fwg_port_ids, ignore_errors=to_delete)
+        ports = self._get_in_ns_ports(fwg_port_ids, ignore_errors=to_delete,
+                                      context=context)
         # On illegal ports - change FW status to Error
         if ports is None:
             self.fwplugin_rpc.set_firewall_group_status(
@@ -98,15 +105,19 @@ class NsxFwaasCallbacksV2(firewall_l3_agent_v2.L3WithFWaaS):
                 nl_constants.ERROR)
         return ports
 
-    def _get_in_ns_ports(self, port_ids, ignore_errors=False):
+    def _get_in_ns_ports(self, port_ids, ignore_errors=False, context=None):
         """Returns port objects in the local namespace, along with their
            router_info.
+
+           If the context of the RPC callback is given, the ports and
+           routers fetched are reused by later calls with the same context.
         """
-        context = n_context.get_admin_context()
+        ports, routers = self._get_ports_and_routers(port_ids, context)
         in_ns_ports = {}  # This will be converted to a list later.
+        routers_info = {}
         for port_id in port_ids:
             # find the router of this port:
-            port = self.core_plugin.get_port(context, port_id)
+            port = ports[port_id]
             # verify that this is a router interface port
             if port['device_owner'] != nl_constants.DEVICE_OWNER_ROUTER_INTF:
                 if not ignore_errors:
@@ -119,8 +130,12 @@ class NsxFwaasCallbacksV2(firewall_l3_agent_v2.L3WithFWaaS):
                 router_info = 'Dummy'
             else:
                 router_id = port['device_id']
-                router = self.core_plugin.get_router(context, router_id)
-                router_info = self._router_dict_to_obj(router)
+                if router_id not in routers:
+                    raise n_exc.RouterNotFound(router_id=router_id)
+                if router_id not in routers_info:
+                    routers_info[router_id] = self._router_dict_to_obj(
+                        routers[router_id])
+                router_info = routers_info[router_id]
             if router_info:
                 if router_info in in_ns_ports:
                     in_ns_ports[router_info].append(port_id)
@@ -128,6 +143,40 @@ class NsxFwaasCallbacksV2(firewall_l3_agent_v2.L3WithFWaaS):
                     in_ns_ports[router_info] = [port_id]
         return list(in_ns_ports.items())
 
+    def _get_ports_and_routers(self, port_ids, context=None):
+        """Return the ports and their routers, by id
+
+        Ports & routers which were not fetched yet for this callback context
+        are retrieved with one get_ports and one get_routers call.
+        """
+        if context is None:
+            cache = {'ports': {}, 'routers': {}}
+        else:
+            cache = self._callback_cache.setdefault(
+                context, {'ports': {}, 'routers': {}})
+        ports = cache['ports']
+        routers = cache['routers']
+
+        admin_ctx = n_context.get_admin_context()
+        missing_ports = list(set(port_ids) - set(ports))
+        if missing_ports:
+            for port in self.core_plugin.get_ports(
+                    admin_ctx, filters={'id': missing_ports}):
+                ports[port['id']] = port
+            for port_id in missing_ports:
+                if port_id not in ports:
+                    raise n_exc.PortNotFound(port_id=port_id)
+
+        missing_routers = set(
+            ports[port_id]['device_id'] for port_id in port_ids
+            if (ports[port_id]['device_owner'] ==
+                nl_constants.DEVICE_OWNER_ROUTER_INTF)) - set(routers)
+        if missing_routers:
+            for router in self.core_plugin.get_routers(
+                    admin_ctx, filters={'id': list(missing_routers)}):
+                routers[router['id']] = router
+        return ports, routers
+
     def delete_firewall_group(self, context, firewall_group, host):
         """Handles RPC from plugin to delete a firewall group.
 
@@ -169,15 +218,33 @@ class NsxFwaasCallbacksV2(firewall_l3_agent_v2.L3WithFWaaS):
         if not self.fwaas_enabled:
             return False
 
+        return self.get_ports_fwg(context, [port_id]).get(port_id)
+
+    def get_ports_fwg(self, context, port_ids):
+        """Return the firewall groups of the ports, by port id
+
+        Only ports whose FWaaS rules should be added to the backend router
+        are included. The firewall groups of all the ports are resolved with
+        one DB query and one plugin call.
+        """
+        if not self.fwaas_enabled or not port_ids:
+            return {}
+
         ctx = context.elevated()
-        fwg_id = self._get_port_firewall_group_id(ctx, port_id)
-        if fwg_id is None:
-            # No FWaas Firewall was assigned to this port
-            return
+        fwg_ids = self._get_ports_firewall_group_ids(ctx, port_ids)
+        if not fwg_ids:
+            # No FWaas Firewall was assigned to those ports
+            return {}
 
-        # check the state of this firewall group
-        fwg = self._get_fw_group_from_plugin(ctx, fwg_id)
-        if fwg is not None:
+        # NOTE(asarfaty): currently there is no api to get a specific firewall
+        fwg_list = self.fwplugin_rpc.get_firewall_groups_for_project(ctx)
+        fwgs = dict((fwg['id'], fwg) for fwg in fwg_list)
+        ports_fwg = {}
+        for port_id, fwg_id in fwg_ids.items():
+            # check the state of this firewall group
+            fwg = fwgs.get(fwg_id)
+            if fwg is None:
+                continue
             if fwg.get('status') in (nl_constants.ERROR,
                                      nl_constants.PENDING_DELETE):
                 # Do not add rules of firewalls with errors
@@ -185,21 +252,17 @@ class NsxFwaasCallbacksV2(firewall_l3_agent_v2.L3WithFWaaS):
                             "group %(fwg)s which is in %(status)s",
                             {'port': port_id, 'fwg': fwg_id,
                              'status': fwg['status']})
-                return
-
-        return fwg
+                continue
+            ports_fwg[port_id] = fwg
 
-    def _get_fw_group_from_plugin(self, context, fwg_id):
-        # NOTE(asarfaty): currently there is no api to get a specific firewall
-        fwg_list = self.fwplugin_rpc.get_firewall_groups_for_project(context)
-        for fwg in fwg_list:
-            if fwg['id'] == fwg_id:
-                return fwg
+        return ports_fwg
 
     # TODO(asarfaty): add this api to fwaas firewall_db_v2
-    def _get_port_firewall_group_id(self, context, port_id):
-        entry = context.session.query(
-            firewall_db_v2.FirewallGroupPortAssociation).filter_by(
-            port_id=port_id).first()
-        if entry:
-            return entry.firewall_group_id
+    def _get_ports_firewall_group_ids(self, context, port_ids):
+        """Return a dictionary of the firewall group id of each port"""
+        entries = context.session.query(
+            firewall_db_v2.FirewallGroupPortAssociation).filter(
+            firewall_db_v2.FirewallGroupPortAssociation.port_id.in_(
+                port_ids))
+        return dict((entry.port_id, entry.firewall_group_id)
+                    for entry in entries)
@@ -69,8 +69,9 @@ class Nsxv3FwaasCallbacksV2(com_callbacks.NsxFwaasCallbacksV2):
             nsx_ls_id, fwg, plugin_rules)
 
     def router_with_fwg(self, context, router_interfaces):
-        for port in router_interfaces:
-            fwg = self.get_port_fwg(context, port['id'])
+        ports_fwg = self.get_ports_fwg(
+            context, [port['id'] for port in router_interfaces])
+        for fwg in ports_fwg.values():
             if fwg and fwg.get('status') == nl_constants.ACTIVE:
                 return True
         return False
@@ -87,14 +88,20 @@ class Nsxv3FwaasCallbacksV2(com_callbacks.NsxFwaasCallbacksV2):
         """
         fw_rules = []
         with_fw = False
+        # Resolve the NSX ids and the firewall groups of all the router
+        # interfaces together
+        port_ids = [port['id'] for port in router_interfaces]
+        ports_fwg = self.get_ports_fwg(context, port_ids)
+        nsx_ids = nsx_db.get_nsx_switch_and_port_ids(
+            context.session, [port_id for port_id in port_ids
+                              if port_id in ports_fwg])
         # Add firewall rules per port attached to a firewall group
         for port in router_interfaces:
-            nsx_ls_id, _nsx_port_id = nsx_db.get_nsx_switch_and_port_id(
-                context.session, port['id'])
-
             # Check if this port has a firewall
-            fwg = self.get_port_fwg(context, port['id'])
+            fwg = ports_fwg.get(port['id'])
             if fwg:
+                nsx_ls_id, _nsx_port_id = nsx_ids.get(port['id'],
+                                                      (None, None))
                 with_fw = True
                 # Add plugin additional allow rules
                 plugin_rules = self.core_plugin.get_extra_fw_rules(
@@ -15,23 +15,79 @@
 #    under the License.
 
 import abc
+import atexit
+import datetime
+import os
+import time
 
 import six
 
+from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import timeutils
 
 from neutron.ipam import driver as ipam_base
 from neutron.ipam.drivers.neutrondb_ipam import driver as neutron_driver
 from neutron.ipam import exceptions as ipam_exc
 from neutron.ipam import requests as ipam_req
 from neutron.ipam import subnet_alloc
+from neutron_lib import context as n_context
+from neutron_lib import exceptions as n_exc
 from neutron_lib.plugins import directory
 
+from vmware_nsx.common import locking
+from vmware_nsx.common import utils
 from vmware_nsx.db import db as nsx_db
 from vmware_nsx.extensions import projectpluginmap
 
 LOG = logging.getLogger(__name__)
 
+# Reserved IPs unused for longer than this (in seconds) are returned to the
+# backend pools
+RESERVATION_MAX_AGE = 3600
+
+# Subnets with an IP reservation refill pending in this process
+_refills_in_progress = set()
+# Subnets with IPs reserved by this process, by subnet id
+_reserving_subnets = {}
+# When this process last released the IPs reserved for too long
+_stale_reservations_released_at = 0
+
+
+def _get_reservation_owner():
+    return '%s:%s' % (cfg.CONF.host, os.getpid())
+
+
+def _backend_release(subnet, ip_addresses):
+    """Release IPs dropped from the reservation on the backend pool"""
+    for ip_address in ip_addresses:
+        try:
+            subnet.backend_deallocate(ip_address)
+        except Exception as e:
+            # Continue anyway, as the reservation is already dropped
+            LOG.warning("Failed to release reserved ip %(ip)s of "
+                        "subnet %(id)s: %(e)s",
+                        {'ip': ip_address, 'id': subnet._subnet_id, 'e': e})
+
+
+def _release_reserved_ips():
+    """Return the IPs reserved by this process to the backend pools
+
+    The IPs left behind by a process which did not stop gracefully are
+    still used by the other processes, and are released once they are
+    reserved for longer than RESERVATION_MAX_AGE.
+    """
+    context = n_context.get_admin_context()
+    owner = _get_reservation_owner()
+    for subnet_id, subnet in list(_reserving_subnets.items()):
+        try:
+            _backend_release(subnet, nsx_db.pop_nsx_ipam_reserved_ips(
+                context.session, subnet_id, owner=owner))
+        except Exception as e:
+            LOG.warning("Failed to release the reserved IPs of subnet "
+                        "%(id)s: %(e)s", {'id': subnet_id, 'e': e})
+    _reserving_subnets.clear()
+
 
 @six.add_metaclass(abc.ABCMeta)
 class NsxIpamBase(object):
@@ -226,6 +282,8 @@ class NsxAbstractIpamDriver(subnet_alloc.SubnetAllocator, NsxIpamBase):
 
         # update the relevant attributes at the backend pool
         if gateway_changed or pools_changed:
+            # The reserved IPs may be out of the updated pool ranges
+            self._release_reserved_ips(subnet_request.subnet_id, nsx_pool_id)
             self.update_backend_pool(nsx_pool_id, subnet_request)
 
     @abc.abstractmethod
@@ -241,13 +299,23 @@ class NsxAbstractIpamDriver(subnet_alloc.SubnetAllocator, NsxIpamBase):
             self.default_ipam.remove_subnet(subnet_id)
             return
 
-        # Delete from backend
+        # Release the IPs reserved ahead of time, and delete from backend
+        self._release_reserved_ips(subnet_id, nsx_pool_id)
         self.delete_backend_pool(nsx_pool_id)
 
         # delete pool from DB
         nsx_db.del_nsx_ipam_subnet_pool(self._context.session,
                                         subnet_id, nsx_pool_id)
 
+    def _release_reserved_ips(self, subnet_id, nsx_pool_id):
+        ip_addresses = nsx_db.pop_nsx_ipam_reserved_ips(
+            self._context.session, subnet_id)
+        if not ip_addresses:
+            return
+        subnet = self._subnet_class.load(subnet_id, nsx_pool_id,
+                                         self._context)
+        _backend_release(subnet, ip_addresses)
+
 
 class NsxIpamSubnetManager(object):
 
@@ -276,9 +344,150 @@ class NsxAbstractIpamSubnet(ipam_base.Subnet, NsxIpamBase):
         """Load an IPAM subnet object given its neutron ID."""
         return cls(neutron_subnet_id, nsx_pool_id, ctx, tenant_id)
 
+    @property
+    def _reservation_block_size(self):
+        """Number of IPs to allocate on the backend ahead of time
+
+        0 means that each IP is allocated on the backend when requested.
+        """
+        return 0
+
+    @abc.abstractproperty
+    def _plugin_type(self):
+        """Return the type of the core plugin of this driver."""
+        pass
+
+    def _claim_reserved_ip(self, ip_address=None):
+        # The IP is claimed in its own short transaction, so the reservation
+        # is not locked by the port transaction of the caller until it ends
+        session = n_context.get_admin_context().session
+        return nsx_db.claim_nsx_ipam_reserved_ip(
+            session, self._subnet_id, ip_address=ip_address)
+
     def allocate(self, address_request):
-        """Allocate an IP from the pool"""
-        return self.backend_allocate(address_request)
+        """Allocate an IP from the pool
+
+        If IP reservation is enabled, the IP is taken from the IPs already
+        allocated on the backend pool, if possible.
+        """
+        if not self._reservation_block_size:
+            return self.backend_allocate(address_request)
+
+        if isinstance(address_request, ipam_req.SpecificAddressRequest):
+            ip_address = self._claim_reserved_ip(
+                ip_address=str(address_request.address))
+            return ip_address or self.backend_allocate(address_request)
+
+        ip_address = self._claim_reserved_ip()
+        if not ip_address:
+            try:
+                ip_address = self.backend_allocate(address_request)
+            except ipam_exc.IpAddressGenerationFailure:
+                # The last IPs of the pool may have just been reserved
+                ip_address = self._claim_reserved_ip()
+                if not ip_address:
+                    raise
+        self._refill_reservation_if_needed()
+        return ip_address
+
+    def _refill_reservation_if_needed(self):
+        """Reserve more IPs in the background if the reservation is low"""
+        if self._subnet_id in _refills_in_progress:
+            return
+        reserved = nsx_db.count_nsx_ipam_reserved_ips(
+            self._context.session, self._subnet_id)
+        if reserved > self._reservation_block_size // 2:
+            return
+        _refills_in_progress.add(self._subnet_id)
+        utils.spawn_n(self._refill_reservation)
+
+    def _is_driver_subnet(self, context, subnet_id):
+        """Return True if the subnet belongs to the plugin of this driver"""
+        p = self.get_core_plugin()
+        if not p.is_tvd_plugin():
+            return True
+        try:
+            subnet = self._fetch_subnet(context, subnet_id)
+        except n_exc.SubnetNotFound:
+            return False
+        return (p.get_plugin_type_from_project(
+            context, subnet['project_id']) == self._plugin_type)
+
+    def _release_stale_reservations(self, context):
+        """Release the IPs reserved for longer than RESERVATION_MAX_AGE
+
+        This returns the IPs left behind by the processes which did not stop
+        gracefully to the backend pools. As each IP is claimed before it is
+        released, IPs still reserved by a running process can be released
+        too, it will simply reserve new ones when needed.
+        The IPs of the subnets of the other TVD plugin are left to its driver.
+        """
+        reserved_before = timeutils.utcnow() - datetime.timedelta(
+            seconds=RESERVATION_MAX_AGE)
+        stale_ips = {}
+        for subnet_id, nsx_pool_id, ip_address in (
+                nsx_db.get_nsx_ipam_reserved_ips_before(
+                    context.session, reserved_before)):
+            stale_ips.setdefault((subnet_id, nsx_pool_id), []).append(
+                ip_address)
+        for (subnet_id, nsx_pool_id), ip_addresses in stale_ips.items():
+            if not self._is_driver_subnet(context, subnet_id):
+                continue
+            ip_addresses = [ip_address for ip_address in ip_addresses
+                            if nsx_db.claim_nsx_ipam_reserved_ip(
+                                context.session, subnet_id,
+                                ip_address=ip_address)]
+            LOG.info("Releasing %(num)s IPs of subnet %(id)s reserved for "
+                     "more than %(age)s seconds",
+                     {'num': len(ip_addresses), 'id': subnet_id,
+                      'age': RESERVATION_MAX_AGE})
+            _backend_release(self.load(subnet_id, nsx_pool_id, context),
+                             ip_addresses)
+
+    def _refill_reservation(self):
+        global _stale_reservations_released_at
+        context = n_context.get_admin_context()
+        if not _reserving_subnets:
+            atexit.register(_release_reserved_ips)
+        _reserving_subnets[self._subnet_id] = self
+        try:
+            if (time.time() - _stale_reservations_released_at >
+                    RESERVATION_MAX_AGE):
+                _stale_reservations_released_at = time.time()
+                try:
+                    self._release_stale_reservations(context)
+                except Exception as e:
+                    LOG.warning("Failed to release the stale reserved IPs: "
+                                "%s", e)
+            # The refill is serialized between the processes, so the
+            # reservation is only refilled once by one of them
+            with locking.LockManager.get_lock(
+                    'nsx-ipam-reservation-%s' % self._subnet_id):
+                count = (self._reservation_block_size -
+                         nsx_db.count_nsx_ipam_reserved_ips(
+                             context.session, self._subnet_id))
+                self._reserve_ips(context, count)
+        finally:
+            _refills_in_progress.discard(self._subnet_id)
+
+    def _reserve_ips(self, context, count):
+        owner = _get_reservation_owner()
+        request = ipam_req.AnyAddressRequest()
+        try:
+            for _i in range(count):
+                ip_address = self.backend_allocate(request)
+                try:
+                    nsx_db.add_nsx_ipam_reserved_ip(
+                        context.session, self._subnet_id, self._nsx_pool_id,
+                        ip_address, owner)
+                except Exception:
+                    self.backend_deallocate(ip_address)
+                    raise
+        except ipam_exc.IpAddressGenerationFailure:
+            LOG.debug("No more IPs to reserve for subnet %s", self._subnet_id)
+        except Exception as e:
+            LOG.warning("Failed to reserve IPs for subnet %(id)s: %(e)s",
+                        {'id': self._subnet_id, 'e': e})
 
     @abc.abstractmethod
     def backend_allocate(self, address_request):
@@ -286,6 +495,10 @@ class NsxAbstractIpamSubnet(ipam_base.Subnet, NsxIpamBase):
 
     def deallocate(self, address):
         """Return an IP to the pool"""
+        if self._reservation_block_size:
+            # Make sure an IP released without being allocated is not
+            # handed out again from the reservation
+            self._claim_reserved_ip(ip_address=address)
         self.backend_deallocate(address)
 
     @abc.abstractmethod
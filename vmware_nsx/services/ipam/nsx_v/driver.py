@@ -23,9 +23,12 @@ from neutron_lib.api.definitions import external_net as extnet_apidef
 from neutron_lib.api.definitions import multiprovidernet as mpnet_apidef
 from neutron_lib.api.definitions import provider_net as pnet
 from neutron_lib.api import validators
+from oslo_config import cfg
 from oslo_log import log as logging
 
 from vmware_nsx._i18n import _
+from vmware_nsx.common import config  # noqa
+from vmware_nsx.extensions import projectpluginmap
 from vmware_nsx.plugins.nsx_v.vshield.common import constants
 from vmware_nsx.plugins.nsx_v.vshield.common import exceptions as vc_exc
 from vmware_nsx.services.ipam.common import driver as common
@@ -126,6 +129,14 @@ class NsxvIpamSubnet(common.NsxAbstractIpamSubnet, common.NsxIpamBase):
             LOG.error('IPAM pool: Error code not present. %s',
                 e.response)
 
+    @property
+    def _plugin_type(self):
+        return projectpluginmap.NsxPlugins.NSX_V
+
+    @property
+    def _reservation_block_size(self):
+        return cfg.CONF.nsxv.ipam_reservation_block_size
+
     def backend_allocate(self, address_request):
         try:
             # allocate a specific IP
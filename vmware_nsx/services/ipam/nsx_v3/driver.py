@@ -16,18 +16,27 @@
 
 import netaddr
 
+from oslo_config import cfg
 from oslo_log import log as logging
 
 from neutron.ipam import exceptions as ipam_exc
 from neutron.ipam import requests as ipam_req
 
 from vmware_nsx._i18n import _
+from vmware_nsx.common import config  # noqa
+from vmware_nsx.common import utils
+from vmware_nsx.extensions import projectpluginmap
 from vmware_nsx.services.ipam.common import driver as common
 from vmware_nsxlib.v3 import exceptions as nsx_lib_exc
 from vmware_nsxlib.v3 import nsx_constants as error
 
 LOG = logging.getLogger(__name__)
 
+# Number of attempts to release each allocation of a deleted pool
+RELEASE_ATTEMPTS = 3
+# Maximal number of failed releases detailed in the failures summary
+MAX_REPORTED_FAILURES = 10
+
 
 class Nsxv3IpamDriver(common.NsxAbstractIpamDriver):
     """IPAM Driver For NSX-V3 networks."""
@@ -92,20 +101,44 @@ class Nsxv3IpamDriver(common.NsxAbstractIpamDriver):
         # or else it will fail.
         pool_allocations = self.nsxlib_ipam.get_allocations(nsx_pool_id)
         if pool_allocations and pool_allocations.get('result_count'):
-            for allocation in pool_allocations.get('results', []):
-                ip_addr = allocation.get('allocation_id')
-                try:
-                    self.nsxlib_ipam.release(nsx_pool_id, ip_addr)
-                except Exception as e:
-                    LOG.warning("Failed to release ip %(ip)s from pool "
-                                "%(pool)s: %(e)s",
-                                {'ip': ip_addr, 'pool': nsx_pool_id, 'e': e})
+            self._release_backend_allocations(
+                nsx_pool_id,
+                [allocation.get('allocation_id') for allocation in
+                 pool_allocations.get('results', [])])
         try:
             self.nsxlib_ipam.delete(nsx_pool_id)
         except Exception as e:
             LOG.error("Failed to delete IPAM from backend: %s", e)
             # Continue anyway, since this subnet was already removed
 
+    def _release_backend_allocations(self, nsx_pool_id, ip_addresses):
+        """Release the IPs of the pool concurrently
+
+        Failed releases are retried, and the IPs that could not be released
+        are logged in a single summary.
+        """
+        def _release(ip_addr):
+            self.nsxlib_ipam.release(nsx_pool_id, ip_addr)
+
+        total_num = len(ip_addresses)
+        failures = []
+        for attempt in range(RELEASE_ATTEMPTS):
+            failures = [(ip_addr, e) for ip_addr, result, e in
+                        utils.run_in_pool(_release, ip_addresses,
+                                          cfg.CONF.nsx_v3.ipam_release_workers)
+                        if e]
+            if not failures:
+                return
+            ip_addresses = [ip_addr for ip_addr, e in failures]
+
+        LOG.warning("Failed to release %(num)s out of %(total)s IPs from "
+                    "pool %(pool)s: %(failures)s",
+                    {'num': len(failures), 'total': total_num,
+                     'pool': nsx_pool_id,
+                     'failures': ', '.join(
+                         '%s (%s)' % failure for failure in
+                         failures[:MAX_REPORTED_FAILURES])})
+
     def update_backend_pool(self, nsx_pool_id, subnet_request):
         update_args = {
             'cidr': self._get_cidr_from_request(subnet_request),
@@ -142,6 +175,14 @@ class Nsxv3IpamSubnet(common.NsxAbstractIpamSubnet):
             subnet_id, nsx_pool_id, ctx, tenant_id)
         self.nsxlib_ipam = self._nsxlib.ip_pool
 
+    @property
+    def _plugin_type(self):
+        return projectpluginmap.NsxPlugins.NSX_T
+
+    @property
+    def _reservation_block_size(self):
+        return cfg.CONF.nsx_v3.ipam_reservation_block_size
+
     def backend_allocate(self, address_request):
         try:
             # allocate a specific IP
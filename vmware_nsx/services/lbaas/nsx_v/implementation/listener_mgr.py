@@ -15,13 +15,16 @@
 
 import copy
 
+from oslo_config import cfg
 from oslo_log import helpers as log_helpers
 from oslo_log import log as logging
 from oslo_utils import excutils
 
 from vmware_nsx._i18n import _
+from vmware_nsx.common import config  # noqa
 from vmware_nsx.common import exceptions as nsxv_exc
 from vmware_nsx.common import locking
+from vmware_nsx.common import utils as nsx_utils
 from vmware_nsx.db import nsxv_db
 from vmware_nsx.plugins.nsx_v.vshield.common import exceptions as vcns_exc
 from vmware_nsx.services.lbaas import base_mgr
@@ -307,37 +310,46 @@ def stats_getter(context, core_plugin, ignore_list=None):
     vcns = core_plugin.nsx_v.vcns
     # go over all LB edges
     bindings = nsxv_db.get_nsxv_lbaas_loadbalancer_bindings(context.session)
-    for binding in bindings:
+    bindings = [binding for binding in bindings
+                if not ignore_list or
+                binding['loadbalancer_id'] not in ignore_list]
+
+    # Map each (loadbalancer, virtual server) to its listener
+    listener_ids = dict(
+        ((list_bind['loadbalancer_id'], list_bind['vse_id']),
+         list_bind['listener_id']) for list_bind in
+        nsxv_db.get_nsxv_lbaas_listener_bindings(context.session))
+
+    def _get_edge_stats(binding):
+        return vcns.get_loadbalancer_statistics(binding['edge_id'])
+
+    # get the statistics of the LB edges concurrently
+    for binding, lb_stats, error in nsx_utils.run_in_pool(
+            _get_edge_stats, bindings, cfg.CONF.octavia_stats_workers):
         lb_id = binding['loadbalancer_id']
-        if ignore_list and lb_id in ignore_list:
-            continue
         edge_id = binding['edge_id']
-
-        try:
-            lb_stats = vcns.get_loadbalancer_statistics(edge_id)
-
-            virtual_servers_stats = lb_stats[1].get('virtualServer', [])
-            for vs_stats in virtual_servers_stats:
-                # Get the stats of the virtual server
-                stats = copy.copy(lb_const.LB_EMPTY_STATS)
-                stats['bytes_in'] += vs_stats.get('bytesIn', 0)
-                stats['bytes_out'] += vs_stats.get('bytesOut', 0)
-                stats['active_connections'] += vs_stats.get('curSessions', 0)
-                stats['total_connections'] += vs_stats.get('totalSessions', 0)
-                stats['request_errors'] = 0  # currently unsupported
-
-                # Find the listener Id
-                vs_id = vs_stats.get('virtualServerId')
-                list_bind = nsxv_db.get_nsxv_lbaas_listener_binding_by_vse(
-                    context.session, lb_id, vs_id)
-                if not list_bind:
-                    continue
-                stats['id'] = list_bind['listener_id']
-
-                stat_list.append(stats)
-
-        except vcns_exc.VcnsApiException as e:
+        if error:
             LOG.warning('Failed to read load balancer statistics for %s: %s',
-                        edge_id, e)
+                        edge_id, error)
+            continue
+
+        virtual_servers_stats = lb_stats[1].get('virtualServer', [])
+        for vs_stats in virtual_servers_stats:
+            # Find the listener Id
+            vs_id = vs_stats.get('virtualServerId')
+            listener_id = listener_ids.get((lb_id, vs_id))
+            if not listener_id:
+                continue
+
+            # Get the stats of the virtual server
+            stats = copy.copy(lb_const.LB_EMPTY_STATS)
+            stats['bytes_in'] += vs_stats.get('bytesIn', 0)
+            stats['bytes_out'] += vs_stats.get('bytesOut', 0)
+            stats['active_connections'] += vs_stats.get('curSessions', 0)
+            stats['total_connections'] += vs_stats.get('totalSessions', 0)
+            stats['request_errors'] = 0  # currently unsupported
+            stats['id'] = listener_id
+
+            stat_list.append(stats)
 
     return stat_list
@@ -16,12 +16,15 @@
 import copy
 
 from neutron_lib import exceptions as n_exc
+from oslo_config import cfg
 from oslo_log import helpers as log_helpers
 from oslo_log import log as logging
 from oslo_utils import excutils
 
 from vmware_nsx._i18n import _
+from vmware_nsx.common import config  # noqa
 from vmware_nsx.common import exceptions as nsx_exc
+from vmware_nsx.common import utils as nsx_utils
 from vmware_nsx.db import db as nsx_db
 from vmware_nsx.services.lbaas import base_mgr
 from vmware_nsx.services.lbaas import lb_const
@@ -295,33 +298,49 @@ def stats_getter(context, core_plugin, ignore_list=None):
     # Go over all the loadbalancers & services
     lb_bindings = nsx_db.get_nsx_lbaas_loadbalancer_bindings(
         context.session)
+    lb_service_ids = []
     for lb_binding in lb_bindings:
         if ignore_list and lb_binding['loadbalancer_id'] in ignore_list:
             continue
-
         lb_service_id = lb_binding.get('lb_service_id')
+        if lb_service_id not in lb_service_ids:
+            lb_service_ids.append(lb_service_id)
+
+    # Map each virtual server to its listener binding
+    vs_bindings = dict(
+        (vs_bind['lb_vs_id'], vs_bind) for vs_bind in
+        nsx_db.get_nsx_lbaas_listener_bindings(context.session))
+
+    def _get_service_stats(lb_service_id):
         LOG.debug("Getting listeners statistics for NSX lb service %s",
                   lb_service_id)
-        try:
-            # get the NSX statistics for this LB service
-            rsp = lb_service_client.get_stats(lb_service_id)
-            if rsp and 'virtual_servers' in rsp:
-                # Go over each virtual server in the response
-                for vs in rsp['virtual_servers']:
-                    # look up the virtual server in the DB
-                    vs_bind = nsx_db.get_nsx_lbaas_listener_binding_by_vs_id(
-                        context.session, vs['virtual_server_id'])
-                    if vs_bind and 'statistics' in vs:
-                        vs_stats = vs['statistics']
-                        stats = copy.copy(lb_const.LB_EMPTY_STATS)
-                        stats['id'] = vs_bind.listener_id
-                        stats['request_errors'] = 0  # currently unsupported
-                        for stat in lb_const.LB_STATS_MAP:
-                            lb_stat = lb_const.LB_STATS_MAP[stat]
-                            stats[stat] += vs_stats[lb_stat]
-                        stat_list.append(stats)
+        return lb_service_client.get_stats(lb_service_id)
 
-        except nsxlib_exc.ManagerError:
-            pass
+    # get the NSX statistics of the LB services concurrently
+    for lb_service_id, rsp, error in nsx_utils.run_in_pool(
+            _get_service_stats, lb_service_ids,
+            cfg.CONF.octavia_stats_workers):
+        if error:
+            if not isinstance(error, nsxlib_exc.ManagerError):
+                LOG.warning("Failed to read statistics of NSX lb service "
+                            "%(srv)s: %(e)s", {'srv': lb_service_id,
+                                               'e': error})
+            continue
+        if rsp and 'virtual_servers' in rsp:
+            # Go over each virtual server in the response
+            for vs in rsp['virtual_servers']:
+                vs_bind = vs_bindings.get(vs['virtual_server_id'])
+                if (not vs_bind or 'statistics' not in vs or
+                    (ignore_list and
+                     vs_bind['loadbalancer_id'] in ignore_list)):
+                    continue
+                vs_stats = vs['statistics']
+                stats = copy.copy(lb_const.LB_EMPTY_STATS)
+                stats['id'] = vs_bind['listener_id']
+                stats['request_errors'] = 0  # currently unsupported
+                for stat in lb_const.LB_STATS_MAP:
+                    lb_stat = lb_const.LB_STATS_MAP[stat]
+                    stats[stat] += vs_stats[lb_stat]
+                stat_list.append(stats)
 
     return stat_list
@@ -329,6 +329,10 @@ class NSXOctaviaStatisticsCollector(object):
     def __init__(self, core_plugin, listener_stats_getter):
         self.core_plugin = core_plugin
         self.listener_stats_getter = listener_stats_getter
+        self.last_collect_duration = None
+        # The last statistics sent to Octavia per listener id
+        self._published_stats = {}
+        self._last_full_refresh = 0
         if cfg.CONF.octavia_stats_interval:
             eventlet.spawn_n(self.thread_runner,
                              cfg.CONF.octavia_stats_interval)
@@ -353,6 +357,18 @@ class NSXOctaviaStatisticsCollector(object):
         nl_loadbalancers = context.session.query(models.LoadBalancer).all()
         return [lb.id for lb in nl_loadbalancers]
 
+    def _report_duration(self, duration, num_listeners):
+        self.last_collect_duration = duration
+        LOG.debug("Collected Octavia statistics of %(num)s listeners in "
+                  "%(duration).2f seconds",
+                  {'num': num_listeners, 'duration': duration})
+        interval = cfg.CONF.octavia_stats_interval
+        if interval and duration > interval:
+            LOG.warning("Collecting Octavia statistics took %(duration).2f "
+                        "seconds, which is longer than the configured "
+                        "octavia_stats_interval of %(interval)s seconds",
+                        {'duration': duration, 'interval': interval})
+
     @log_helpers.log_method_call
     def collect(self):
         if not self.core_plugin.octavia_listener:
@@ -366,11 +382,54 @@ class NSXOctaviaStatisticsCollector(object):
         # Note(asarfaty): The Octavia plugin/DB is unavailable from the
         # neutron context, so there is no option to query the Octavia DB for
         # the relevant loadbalancers.
+        start_time = time.time()
         nl_loadbalancers = self._get_nl_loadbalancers(context)
         listeners_stats = self.listener_stats_getter(
             context, self.core_plugin, ignore_list=nl_loadbalancers)
+        self._report_duration(time.time() - start_time,
+                              len(listeners_stats or []))
         if not listeners_stats:
             # Avoid sending empty stats
             return
-        stats = {'listeners': listeners_stats}
-        endpoint.update_listener_statistics(stats)
+        now = time.time()
+        full_refresh = (
+            not cfg.CONF.octavia_stats_changes_only or
+            now - self._last_full_refresh >=
+            cfg.CONF.octavia_stats_full_refresh_interval)
+        listeners_stats = self._get_stats_to_publish(listeners_stats,
+                                                     full_refresh)
+        if not listeners_stats:
+            return
+        batch_size = (cfg.CONF.octavia_stats_batch_size or
+                      len(listeners_stats))
+        for i in range(0, len(listeners_stats), batch_size):
+            batch = listeners_stats[i:i + batch_size]
+            stats = {'listeners': batch}
+            endpoint.update_listener_statistics(stats)
+            for listener_stats in batch:
+                self._published_stats[listener_stats['id']] = listener_stats
+        if full_refresh:
+            # A failed refresh is retried on the next collection
+            self._last_full_refresh = now
+
+    def _get_stats_to_publish(self, listeners_stats, full_refresh):
+        """Return the listeners statistics that should be sent to Octavia
+
+        If octavia_stats_changes_only is set, listeners whose counters did
+        not change since they were last sent are skipped, except on the
+        periodic full refresh.
+        """
+        # Forget the listeners which no longer exist
+        current_ids = set(stats['id'] for stats in listeners_stats)
+        self._published_stats = dict(
+            (listener_id, stats) for listener_id, stats in
+            self._published_stats.items() if listener_id in current_ids)
+
+        if full_refresh:
+            return listeners_stats
+        changed_stats = [stats for stats in listeners_stats
+                         if self._published_stats.get(stats['id']) != stats]
+        LOG.debug("Reporting statistics of %(changed)s out of %(all)s "
+                  "listeners", {'changed': len(changed_stats),
+                                'all': len(listeners_stats)})
+        return changed_stats
@@ -18,9 +18,15 @@ from neutron_lib import constants
 from neutron_lib.db import constants as db_constants
 from neutron_lib.services.qos import base
 from neutron_lib.services.qos import constants as qos_consts
+from oslo_config import cfg
 from oslo_log import log as logging
 
+from vmware_nsx._i18n import _
+from vmware_nsx.common import config  # noqa
+from vmware_nsx.common import exceptions as nsx_exc
+from vmware_nsx.common import utils
 from vmware_nsx.extensions import projectpluginmap
+from vmware_nsx.services.qos.nsx_v import utils as qos_utils
 
 LOG = logging.getLogger(__name__)
 DRIVER = None
@@ -73,10 +79,49 @@ class NSXvQosDriver(base.DriverBase):
     def update_policy(self, context, policy):
         # get all the bound networks of this policy
         networks = policy.get_bound_networks()
+        if not networks:
+            return
+        qos_data = qos_utils.NsxVQosRule(
+            context=context, qos_policy_id=policy.id)
+
+        # Read all the networks mappings from the DB first, so that only
+        # the backend calls run concurrently
+        port_groups = []
         for net_id in networks:
+            mappings = self.core_plugin._get_network_dvs_mappings(
+                context, net_id)
+            for dvs_id, net_moref in mappings:
+                port_groups.append((net_id, dvs_id, net_moref))
+
+        def _update_port_groups(port_group):
+            net_id, dvs_id, net_moref = port_group
             # update the new bw limitations for this network
-            self.core_plugin._update_qos_on_backend_network(
-                context, net_id, policy.id)
+            self.core_plugin._update_qos_on_backend_port_groups(
+                net_id, dvs_id, net_moref, qos_data)
+
+        failed_networks = {}
+        for port_group, _result, error in utils.run_in_pool(
+                _update_port_groups, port_groups,
+                cfg.CONF.nsxv.qos_update_workers):
+            if error:
+                net_id = port_group[0]
+                LOG.error("Failed to update QoS policy %(policy)s on "
+                          "network %(net)s port group %(moref)s: %(err)s",
+                          {'policy': policy.id, 'net': net_id,
+                           'moref': port_group[2], 'err': error})
+                failed_networks[net_id] = error
+
+        LOG.debug("Updated QoS policy %(policy)s on %(num)s networks, "
+                  "%(failed)s failed",
+                  {'policy': policy.id, 'num': len(networks),
+                   'failed': len(failed_networks)})
+        if failed_networks:
+            msg = (_("Failed to update QoS policy %(policy)s on %(failed)s "
+                     "out of %(num)s networks: %(nets)s") %
+                   {'policy': policy.id, 'failed': len(failed_networks),
+                    'num': len(networks),
+                    'nets': ', '.join(sorted(failed_networks))})
+            raise nsx_exc.NsxPluginException(err_msg=msg)
 
     def delete_policy(self, context, policy):
         pass
@@ -14,6 +14,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
@@ -23,7 +25,9 @@ from neutron.services.trunk.drivers import base
 from neutron_lib.api.definitions import portbindings
 from neutron_lib.callbacks import events
 from neutron_lib.callbacks import registry
+from neutron_lib import exceptions as n_exc
 
+from vmware_nsx.common import config  # noqa
 from vmware_nsx.common import nsx_constants as nsx_consts
 from vmware_nsx.common import utils as nsx_utils
 from vmware_nsx.db import db as nsx_db
@@ -55,12 +59,8 @@ class NsxV3TrunkHandler(object):
         return switching_profile.build_switch_profile_ids(
             switching_profile.client, *profiles)
 
-    def _update_port_at_backend(self, context, parent_port_id, subport):
-        # Retrieve the child port details
-        child_port = self.plugin_driver.get_port(context, subport.port_id)
-        # Retrieve the logical port ID based on the child port's neutron ID
-        nsx_child_port_id = nsx_db.get_nsx_switch_and_port_id(
-            session=context.session, neutron_id=subport.port_id)[1]
+    def _update_port_at_backend(self, parent_port_id, subport, child_port,
+                                nsx_child_port_id):
         # Retrieve child logical port from the backend
         try:
             nsx_child_port = self._nsxlib.logical_port.get(
@@ -112,16 +112,75 @@ class NsxV3TrunkHandler(object):
                           "type. Setting trunk status to ERROR. "
                           "Exception is %s", e)
 
+    def _update_subports_at_backend(self, context, parent_port_id, subports):
+        """Set or unset the parent port of the subports on the backend
+
+        The subports are updated concurrently, and the result of each one is
+        returned as a dictionary of the exceptions by the subport port id.
+        """
+        port_ids = [subport.port_id for subport in subports]
+        # The DB is accessed here, and only the NSX calls are concurrent
+        child_ports = dict(
+            (port['id'], port) for port in self.plugin_driver.get_ports(
+                context, filters={'id': port_ids}))
+        for port_id in port_ids:
+            if port_id not in child_ports:
+                raise n_exc.PortNotFound(port_id=port_id)
+        nsx_port_ids = nsx_db.get_nsx_switch_and_port_ids(
+            context.session, port_ids)
+
+        def _update_subport(subport):
+            self._update_port_at_backend(
+                parent_port_id, subport, child_ports[subport.port_id],
+                nsx_port_ids.get(subport.port_id, (None, None))[1])
+
+        results = nsx_utils.run_in_pool(
+            _update_subport, subports, cfg.CONF.nsx_v3.trunk_subport_workers)
+        return collections.OrderedDict(
+            (subport.port_id, e) for subport, _r, e in results)
+
     def _set_subports(self, context, parent_port_id, subports):
-        for subport in subports:
-            # Update port with parent port for backend.
-            self._update_port_at_backend(context, parent_port_id, subport)
+        if not subports:
+            return
+        results = self._update_subports_at_backend(
+            context, parent_port_id, subports)
+        failed = [port_id for port_id, e in results.items() if e]
+        if not failed:
+            return
+        LOG.error("Failed to add %(failed)d of %(total)d subports to trunk "
+                  "port %(parent)s: %(errors)s",
+                  {'failed': len(failed), 'total': len(subports),
+                   'parent': parent_port_id,
+                   'errors': dict((port_id, results[port_id])
+                                  for port_id in failed)})
+        # Remove the subports which were added, so the trunk is not left
+        # with only some of them on the backend
+        added = [subport for subport in subports
+                 if not results[subport.port_id]]
+        if added:
+            rollback = self._update_subports_at_backend(
+                context, None, added)
+            not_removed = [port_id for port_id, e in rollback.items() if e]
+            if not_removed:
+                LOG.error("Failed to remove the added subports %(ports)s "
+                          "from trunk port %(parent)s",
+                          {'ports': not_removed, 'parent': parent_port_id})
+        raise results[failed[0]]
 
     def _unset_subports(self, context, subports):
-        for subport in subports:
-            # Update port and remove parent port attachment in the backend
-            self._update_port_at_backend(
-                context=context, parent_port_id=None, subport=subport)
+        if not subports:
+            return
+        # Remove as many subports as possible, even if some of them fail
+        results = self._update_subports_at_backend(context, None, subports)
+        failed = [port_id for port_id, e in results.items() if e]
+        if not failed:
+            return
+        LOG.error("Failed to remove %(failed)d of %(total)d subports from "
+                  "their trunk: %(errors)s",
+                  {'failed': len(failed), 'total': len(subports),
+                   'errors': dict((port_id, results[port_id])
+                                  for port_id in failed)})
+        raise results[failed[0]]
 
     def trunk_created(self, context, trunk):
         # Retrieve the logical port ID based on the parent port's neutron ID
@@ -40,8 +40,18 @@ class NsxVPNPlugin(plugin.VPNDriverPlugin):
             context)
         if not connections:
             return
-        # TODO(asarfaty): This will not scale well. Should use a bulk action
-        # instead for the NSX api
+        driver = self.drivers[self.default_provider]
+        if hasattr(driver, 'get_ipsec_site_connections_status'):
+            statuses = driver.get_ipsec_site_connections_status(
+                context, [connection['id'] for connection in connections])
+            # update only the connections with a changed status
+            for connection in connections:
+                status = statuses.get(connection['id'])
+                if status and status != connection['status']:
+                    self._update_connection_status(
+                        context, connection['id'], status, False)
+            return
+
         for connection in connections:
             self._update_nsx_connection_status(context, connection['id'])
 
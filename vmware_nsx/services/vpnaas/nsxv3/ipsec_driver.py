@@ -13,11 +13,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import bisect
+import time
+
+import eventlet
 import netaddr
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
+import sqlalchemy as sa
 
+from neutron.db import models_v2
 from neutron_lib.callbacks import events
 from neutron_lib.callbacks import registry
 from neutron_lib.callbacks import resources
@@ -25,9 +31,11 @@ from neutron_lib import constants
 from neutron_lib import context as n_context
 from neutron_lib import exceptions as nexception
 from neutron_lib.plugins import directory
+from neutron_vpnaas.db.vpn import vpn_models
 from neutron_vpnaas.services.vpn import service_drivers
 
 from vmware_nsx.common import exceptions as nsx_exc
+from vmware_nsx.common import utils
 from vmware_nsx.db import db
 from vmware_nsx.extensions import projectpluginmap
 from vmware_nsx.services.vpnaas.nsxv3 import ipsec_utils
@@ -38,6 +46,9 @@ from vmware_nsxlib.v3 import vpn_ipsec
 
 LOG = logging.getLogger(__name__)
 IPSEC = 'ipsec'
+# Time in seconds after which the connections CIDR index is reloaded from the
+# DB, to catch changes done by other neutron workers
+CIDR_INDEX_RELOAD_INTERVAL = 300
 
 
 class RouterWithSNAT(nexception.BadRequest):
@@ -55,6 +66,128 @@ class RouterOverlapping(nexception.BadRequest):
                 "local subnet and cannot be added")
 
 
+class ConnectionCidrIndex(object):
+    """Index of the local CIDRs of all the IPsec site connections
+
+    The CIDRs are kept as address intervals sorted by their first address,
+    so finding the connections overlapping a subnet does not depend on the
+    number of connections: two CIDRs overlap if and only if one of them
+    contains the first address of the other.
+    The index holds connections of all statuses. The status is checked in
+    the DB only for the overlapping connections.
+    """
+
+    def __init__(self):
+        self._conn_cidrs = {}
+        self._intervals = []
+        self._networks = {}
+        self._loaded_at = None
+        self._fingerprint = None
+
+    def _get_fingerprint(self, context):
+        """Return the number and the extreme ids of the connections
+
+        This single aggregate row changes when connections are created or
+        deleted, without reading the connections.
+        """
+        conn_id = vpn_models.IPsecSiteConnection.id
+        return tuple(context.session.query(
+            sa.func.count(conn_id), sa.func.min(conn_id),
+            sa.func.max(conn_id)).one())
+
+    def _get_query(self, context):
+        return context.session.query(
+            vpn_models.IPsecSiteConnection.id, models_v2.Subnet.cidr).join(
+            vpn_models.VPNService,
+            vpn_models.VPNService.id ==
+            vpn_models.IPsecSiteConnection.vpnservice_id).join(
+            models_v2.Subnet,
+            models_v2.Subnet.id == vpn_models.VPNService.subnet_id)
+
+    def _load(self, context):
+        self._fingerprint = self._get_fingerprint(context)
+        self._conn_cidrs = {}
+        self._intervals = []
+        self._networks = {}
+        for conn_id, cidr in self._get_query(context).all():
+            self.add_connection(conn_id, cidr)
+        self._loaded_at = time.time()
+
+    def sync(self, context):
+        """Bring the index up to date with the DB
+
+        The connections have no revision number, and their local CIDR cannot
+        change after their creation. Connections created or deleted by other
+        workers change the count or the extreme ids of the connections. Only
+        then the ids of the connections are compared with the index, to add
+        or remove the changed ones. A deletion and a creation which keep the
+        same count and extreme ids are caught by the periodic reload.
+        """
+        if (self._loaded_at is None or
+            time.time() - self._loaded_at > CIDR_INDEX_RELOAD_INTERVAL):
+            self._load(context)
+            return
+        fingerprint = self._get_fingerprint(context)
+        if fingerprint == self._fingerprint:
+            return
+        self._fingerprint = fingerprint
+        query = self._get_query(context)
+        conn_ids = set(conn_id for conn_id, in query.with_entities(
+            vpn_models.IPsecSiteConnection.id).all())
+        for conn_id in set(self._conn_cidrs) - conn_ids:
+            self.remove_connection(conn_id)
+        new_ids = conn_ids - set(self._conn_cidrs)
+        if new_ids:
+            for conn_id, cidr in query.filter(
+                    vpn_models.IPsecSiteConnection.id.in_(new_ids)).all():
+                self.add_connection(conn_id, cidr)
+
+    def add_connection(self, conn_id, cidr):
+        self.remove_connection(conn_id)
+        net = netaddr.IPNetwork(cidr).cidr
+        self._conn_cidrs[conn_id] = net
+        bisect.insort(self._intervals,
+                      (net.version, net.first, net.last, conn_id))
+        key = (net.version, net.prefixlen, net.first)
+        self._networks.setdefault(key, set()).add(conn_id)
+
+    def remove_connection(self, conn_id):
+        net = self._conn_cidrs.pop(conn_id, None)
+        if net is None:
+            return
+        interval = (net.version, net.first, net.last, conn_id)
+        index = bisect.bisect_left(self._intervals, interval)
+        if (index < len(self._intervals) and
+                self._intervals[index] == interval):
+            del self._intervals[index]
+        key = (net.version, net.prefixlen, net.first)
+        conn_ids = self._networks.get(key)
+        if conn_ids:
+            conn_ids.discard(conn_id)
+            if not conn_ids:
+                del self._networks[key]
+
+    def get_overlapping_connections(self, cidrs):
+        """Return the ids of the connections overlapping any of the cidrs"""
+        conn_ids = set()
+        for cidr in cidrs:
+            net = netaddr.IPNetwork(cidr).cidr
+            # connections starting inside this cidr
+            start = bisect.bisect_left(self._intervals,
+                                       (net.version, net.first))
+            end = bisect.bisect_left(self._intervals,
+                                     (net.version, net.last + 1))
+            conn_ids.update(interval[3]
+                            for interval in self._intervals[start:end])
+            # connections containing the first address of this cidr
+            width = 32 if net.version == 4 else 128
+            for prefixlen in range(net.prefixlen):
+                host_mask = (1 << (width - prefixlen)) - 1
+                key = (net.version, prefixlen, net.first & ~host_mask)
+                conn_ids.update(self._networks.get(key, ()))
+        return conn_ids
+
+
 class NSXv3IPsecVpnDriver(service_drivers.VpnDriver):
 
     def __init__(self, service_plugin):
@@ -67,6 +200,12 @@ class NSXv3IPsecVpnDriver(service_drivers.VpnDriver):
         self._nsx_vpn = self._nsxlib.vpn_ipsec
         validator = ipsec_validator.IPsecV3Validator(service_plugin)
         super(NSXv3IPsecVpnDriver, self).__init__(service_plugin, validator)
+        self._cidr_index = ConnectionCidrIndex()
+        # The last NSX status of each connection, with its collection time
+        self._status_cache = {}
+        if cfg.CONF.nsx_v3.vpn_status_interval:
+            eventlet.spawn_n(self._status_collector,
+                             cfg.CONF.nsx_v3.vpn_status_interval)
 
         registry.subscribe(
             self._delete_local_endpoint, resources.ROUTER_GATEWAY,
@@ -400,19 +539,18 @@ class NSXv3IPsecVpnDriver(service_drivers.VpnDriver):
             self.l3_plugin.delete_port(ctx, port['id'], force_delete_vpn=True)
 
     def _check_subnets_overlap_with_all_conns(self, context, subnets):
-        # find all vpn services with connections
-        filters = {'status': [constants.ACTIVE]}
-        connections = self.vpn_plugin.get_ipsec_site_connections(
-            context, filters=filters)
-        for conn in connections:
-            srv_id = conn.get('vpnservice_id')
-            srv = self.vpn_plugin._get_vpnservice(context, srv_id)
-            srv_subnet = self.l3_plugin.get_subnet(
-                context, srv['subnet_id'])
-            if netaddr.IPSet(subnets) & netaddr.IPSet([srv_subnet['cidr']]):
-                return False
-
-        return True
+        # find all the connections with an overlapping local subnet
+        self._cidr_index.sync(context)
+        conn_ids = self._cidr_index.get_overlapping_connections(subnets)
+        if not conn_ids:
+            return True
+
+        # check if any of those connections is active
+        active_conn = context.session.query(
+            vpn_models.IPsecSiteConnection.id).filter(
+            vpn_models.IPsecSiteConnection.id.in_(conn_ids),
+            vpn_models.IPsecSiteConnection.status == constants.ACTIVE).first()
+        return active_conn is None
 
     def _verify_overlap_subnet(self, resource, event, trigger, **kwargs):
         """Upon router interface creation validation overlapping with vpn"""
@@ -496,15 +634,8 @@ class NSXv3IPsecVpnDriver(service_drivers.VpnDriver):
             policy_rules=rules,
             enabled=enabled)
 
-    def get_ipsec_site_connection_status(self, context, ipsec_site_conn_id):
-        mapping = db.get_nsx_vpn_connection_mapping(
-            context.session, ipsec_site_conn_id)
-        if not mapping or not mapping['session_id']:
-            LOG.info("Couldn't find NSX session for VPN connection %s",
-                     ipsec_site_conn_id)
-            return
-
-        status_result = self._nsx_vpn.session.get_status(mapping['session_id'])
+    def _get_session_status(self, session_id):
+        status_result = self._nsx_vpn.session.get_status(session_id)
         if status_result and 'session_status' in status_result:
             status = status_result['session_status']
             # NSX statuses are UP, DOWN, DEGRADE
@@ -514,6 +645,86 @@ class NSXv3IPsecVpnDriver(service_drivers.VpnDriver):
             elif status == 'DOWN' or status == 'DEGRADED':
                 return 'DOWN'
 
+    def _fetch_connections_status(self, context, ipsec_site_conn_ids=None):
+        """Get the status of the connections sessions from the NSX
+
+        If no connections ids are given, all the sessions are fetched.
+        The sessions statuses are fetched concurrently, and cached.
+        """
+        mappings = db.get_nsx_vpn_connection_mappings(
+            context.session, neutron_ids=ipsec_site_conn_ids)
+        sessions = dict((mapping['neutron_id'], mapping['session_id'])
+                        for mapping in mappings if mapping['session_id'])
+        for conn_id in set(ipsec_site_conn_ids or []) - set(sessions):
+            LOG.info("Couldn't find NSX session for VPN connection %s",
+                     conn_id)
+
+        now = time.time()
+        statuses = {}
+        for conn_id, status, error in utils.run_in_pool(
+                lambda conn_id: self._get_session_status(sessions[conn_id]),
+                sessions, cfg.CONF.nsx_v3.vpn_status_workers):
+            if error:
+                LOG.warning("Failed to get the status of NSX session %(sess)s "
+                            "of VPN connection %(conn)s: %(err)s",
+                            {'sess': sessions[conn_id], 'conn': conn_id,
+                             'err': error})
+                continue
+            statuses[conn_id] = status
+            self._status_cache[conn_id] = (status, now)
+
+        if ipsec_site_conn_ids is None:
+            # forget the deleted connections
+            for conn_id in set(self._status_cache) - set(sessions):
+                self._status_cache.pop(conn_id, None)
+        return statuses
+
+    def get_ipsec_site_connections_status(self, context, ipsec_site_conn_ids):
+        """Return a dictionary of the status of each of the connections
+
+        Statuses collected during the last vpn_status_interval are used
+        without calling the NSX.
+        """
+        statuses = {}
+        missing_ids = []
+        interval = cfg.CONF.nsx_v3.vpn_status_interval
+        now = time.time()
+        for conn_id in ipsec_site_conn_ids:
+            cached = self._status_cache.get(conn_id)
+            if interval and cached and now - cached[1] < interval:
+                statuses[conn_id] = cached[0]
+            else:
+                missing_ids.append(conn_id)
+        if missing_ids:
+            statuses.update(self._fetch_connections_status(
+                context, ipsec_site_conn_ids=missing_ids))
+        return statuses
+
+    def get_ipsec_site_connection_status(self, context, ipsec_site_conn_id):
+        return self.get_ipsec_site_connections_status(
+            context, [ipsec_site_conn_id]).get(ipsec_site_conn_id)
+
+    def _status_collector(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.collect_connections_status()
+            except Exception as e:
+                LOG.warning("Failed to collect VPN connections status: %s", e)
+
+    def collect_connections_status(self):
+        """Fetch all the sessions statuses and update the changed ones"""
+        context = n_context.get_admin_context()
+        statuses = self._fetch_connections_status(context)
+        connections = context.session.query(
+            vpn_models.IPsecSiteConnection.id,
+            vpn_models.IPsecSiteConnection.status).all()
+        for conn_id, db_status in connections:
+            status = statuses.get(conn_id)
+            if status and status != db_status:
+                self.service_plugin._update_connection_status(
+                    context, conn_id, status, False)
+
     def _delete_session(self, session_id):
         self._nsx_vpn.session.delete(session_id)
 
@@ -575,6 +786,9 @@ class NSXv3IPsecVpnDriver(service_drivers.VpnDriver):
 
             self._update_status(context, vpnservice_id, ipsec_id,
                                 constants.ACTIVE)
+            if vpnservice['subnet']:
+                self._cidr_index.add_connection(
+                    ipsec_id, vpnservice['subnet']['cidr'])
 
         except nsx_exc.NsxPluginException:
             with excutils.save_and_reraise_exception():
@@ -607,6 +821,8 @@ class NSXv3IPsecVpnDriver(service_drivers.VpnDriver):
         vpnservice_id = ipsec_site_conn['vpnservice_id']
         vpnservice = self.service_plugin._get_vpnservice(
             context, vpnservice_id)
+        self._cidr_index.remove_connection(ipsec_site_conn['id'])
+        self._status_cache.pop(ipsec_site_conn['id'], None)
 
         # get all data from the nsx based on the connection id in the DB
         mapping = db.get_nsx_vpn_connection_mapping(
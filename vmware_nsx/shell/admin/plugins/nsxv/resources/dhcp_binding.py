@@ -16,6 +16,8 @@
 import pprint
 import sys
 
+import eventlet
+from eventlet import queue
 from neutron_lib import context as n_context
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -41,6 +43,58 @@ LOG = logging.getLogger(__name__)
 nsxv = utils.get_nsxv_client()
 neutron_db = utils.NeutronDbClient()
 
+# Number of edges whose configuration is fetched concurrently
+DEFAULT_EDGE_WORKERS = 10
+
+
+def _get_edge_workers(kwargs):
+    """Return the number of edge workers, or None if it is not valid"""
+    if kwargs.get('property'):
+        properties = admin_utils.parse_multi_keyval_opt(kwargs['property'])
+        if properties.get('workers'):
+            try:
+                workers = int(properties['workers'])
+            except ValueError:
+                workers = 0
+            if workers < 1:
+                LOG.error("The number of workers should be a positive "
+                          "integer. Usage: nsxadmin -r dhcp-binding -o list "
+                          "--property workers=<number of edges fetched "
+                          "concurrently>")
+                return
+            return workers
+    return DEFAULT_EDGE_WORKERS
+
+
+def run_on_edges(func, edge_ids, pool_size=DEFAULT_EDGE_WORKERS):
+    """Run func on the edges using a bounded pool of green threads.
+
+    Yields (count, edge_id, result) tuples in the order in which the edges
+    complete, so that the findings of each edge can be printed while the
+    other edges are still fetched from the backend.
+    """
+    edge_ids = list(edge_ids)
+    results = queue.LightQueue()
+    pool = eventlet.GreenPool(max(1, min(pool_size, len(edge_ids))))
+
+    def _run(edge_id):
+        result = None
+        try:
+            result = func(edge_id)
+        except Exception as e:
+            LOG.error("Failed to get the configuration of edge %(edge)s: "
+                      "%(e)s", {'edge': edge_id, 'e': e})
+        results.put((edge_id, result))
+
+    def _spawn_all():
+        for edge_id in edge_ids:
+            pool.spawn_n(_run, edge_id)
+
+    eventlet.spawn_n(_spawn_all)
+    for count in range(1, len(edge_ids) + 1):
+        edge_id, result = results.get()
+        yield count, edge_id, result
+
 
 def nsx_get_static_bindings_by_edge(edge_id):
     nsx_dhcp_static_bindings = set()
@@ -80,12 +134,21 @@ def list_missing_dhcp_bindings(resource, event, trigger, **kwargs):
 
     Missing DHCP bindings are those that exist in Neutron DB;
     but are not present on corresponding NSXv Edge.
+    The edges bindings are fetched concurrently, and the results of each edge
+    are printed as soon as it is done.
     """
-    for (edge_id, count) in nsxv_db.get_nsxv_dhcp_bindings_count_per_edge(
-            neutron_db.context.session):
+    workers = _get_edge_workers(kwargs)
+    if not workers:
+        return
+    edge_ids = [edge_id for (edge_id, count) in
+                nsxv_db.get_nsxv_dhcp_bindings_count_per_edge(
+                    neutron_db.context.session)]
+    total_num = len(edge_ids)
+    for (count, edge_id, nsx_dhcp_static_bindings) in run_on_edges(
+            nsx_get_static_bindings_by_edge, edge_ids, pool_size=workers):
         LOG.info("%s", "=" * 60)
-        LOG.info("For edge: %s", edge_id)
-        nsx_dhcp_static_bindings = nsx_get_static_bindings_by_edge(edge_id)
+        LOG.info("For edge: %(edge)s (%(count)s/%(total)s)",
+                 {'edge': edge_id, 'count': count, 'total': total_num})
         if nsx_dhcp_static_bindings is None:
             continue
         neutron_dhcp_static_bindings = \
@@ -312,17 +375,26 @@ def nsx_redistribute_dhcp_edges(resource, event, trigger, **kwargs):
         nsxv_manager = vcns_driver.VcnsDriver(
                            edge_utils.NsxVCallbacks(plugin))
         edge_manager = edge_utils.EdgeManager(nsxv_manager, plugin)
+        # get all the DHCP edges bindings at once
+        dhcp_edge_bindings = dict(
+            (binding['router_id'], binding)
+            for binding in nsxv_db.get_nsxv_router_bindings(
+                context.session,
+                like_filters={
+                    'router_id': nsxv_constants.DHCP_EDGE_PREFIX + '%'}))
         # go over all DHCP subnets
         networks = plugin.get_networks(context)
-        for network in networks:
+        total_num = len(networks)
+        for count, network in enumerate(networks, 1):
             network_id = network['id']
             # Check if the network has a related DHCP edge
             resource_id = (nsxv_constants.DHCP_EDGE_PREFIX + network_id)[:36]
-            dhcp_edge_binding = nsxv_db.get_nsxv_router_binding(
-                context.session, resource_id)
+            dhcp_edge_binding = dhcp_edge_bindings.get(resource_id)
             if not dhcp_edge_binding:
                 continue
-            LOG.info("Checking network %s", network_id)
+            LOG.info("Checking network %(net)s (%(count)s/%(total)s)",
+                     {'net': network_id, 'count': count,
+                      'total': total_num})
             edge_id = dhcp_edge_binding['edge_id']
             availability_zone = plugin.get_network_az_by_net_id(
                 context, network['id'])
@@ -0,0 +1,111 @@
+# Copyright 2019 VMware, Inc.
+# All Rights Reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from neutron.tests import base
+from oslo_config import cfg
+
+from vmware_nsx.common import locking
+
+
+class TestLockManager(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestLockManager, self).setUp()
+        mock.patch.object(locking.LockManager, 'metrics',
+                          locking.LockMetrics()).start()
+        lock = mock.MagicMock()
+        lock.__exit__.return_value = False
+        self.local_lock = mock.patch.object(
+            locking.LockManager, '_get_lock_local',
+            return_value=lock).start()
+        self.distributed_lock = mock.patch.object(
+            locking.LockManager, '_get_lock_distributed',
+            return_value=lock).start()
+
+    def test_lock_name_prefix(self):
+        self.assertEqual('edge', locking._lock_name_prefix('edge-12'))
+        self.assertEqual(
+            'router',
+            locking._lock_name_prefix(
+                'router-6a2a2e36-3c5e-4a3e-9e0e-b5f5e57a3ea1'))
+        self.assertEqual(
+            'neutron-security-ops',
+            locking._lock_name_prefix(
+                'neutron-security-ops6a2a2e36-3c5e-4a3e-9e0e-b5f5e57a3ea1'))
+        self.assertEqual(
+            '<id>',
+            locking._lock_name_prefix('6a2a2e36-3c5e-4a3e-9e0e-b5f5e57a3ea1'))
+        self.assertEqual('nsx-dhcp-edge-pool',
+                         locking._lock_name_prefix('nsx-dhcp-edge-pool'))
+
+    def _lock_edges(self):
+        with locking.LockManager.get_lock('edge-1'):
+            holders = locking.LockManager.get_metrics()['edge']['holders']
+            self.assertEqual(['edge-1'], list(holders))
+            self.assertIn('_lock_edges', holders['edge-1']['holder'])
+        with locking.LockManager.get_lock('edge-2'):
+            pass
+        metrics = locking.LockManager.get_metrics()
+        self.assertEqual(2, metrics['edge']['acquired'])
+        self.assertEqual({}, metrics['edge']['holders'])
+
+    def test_local_lock_metrics(self):
+        self._lock_edges()
+        self.assertEqual(2, self.local_lock.call_count)
+        self.distributed_lock.assert_not_called()
+
+    def test_distributed_lock_metrics(self):
+        cfg.CONF.set_override('locking_coordinator_url', 'fake://')
+        self._lock_edges()
+        self.assertEqual(2, self.distributed_lock.call_count)
+        self.local_lock.assert_not_called()
+
+    def test_lock_contention(self):
+        # The lock is acquired after 2 seconds, and held for 3 seconds
+        with mock.patch.object(locking.time, 'time',
+                               side_effect=[10, 12, 12, 15]):
+            with locking.LockManager.get_lock('edge-1'):
+                pass
+        metrics = locking.LockManager.get_metrics()['edge']
+        self.assertEqual(1, metrics['contended'])
+        self.assertEqual(2, metrics['wait_time'])
+        self.assertEqual(3, metrics['hold_time'])
+
+    def test_lock_released_on_error(self):
+        def _fail():
+            with locking.LockManager.get_lock('edge-1'):
+                raise ValueError()
+        self.assertRaises(ValueError, _fail)
+        metrics = locking.LockManager.get_metrics()['edge']
+        self.assertEqual(1, metrics['acquired'])
+        self.assertEqual({}, metrics['holders'])
+
+    def test_lock_trace_sampling(self):
+        with mock.patch.object(locking.LOG, 'isEnabledFor',
+                               return_value=True),\
+            mock.patch.object(locking.LOG, 'debug') as debug:
+            cfg.CONF.set_override('locking_trace_sample_rate', 0)
+            with locking.LockManager.get_lock('edge-1'):
+                pass
+            debug.assert_not_called()
+
+            cfg.CONF.set_override('locking_trace_sample_rate', 1)
+            with locking.LockManager.get_lock('edge-1'):
+                pass
+            debug.assert_called_once()
+            trace = debug.call_args[0][1]['trace']
+            self.assertEqual(5, len(trace))
+            self.assertIn('test_lock_trace_sampling', trace[0])
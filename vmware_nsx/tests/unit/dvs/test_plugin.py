@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import eventlet
 import mock
 from neutron_lib import context
 from oslo_config import cfg
@@ -132,6 +133,138 @@ class DvsTestCase(base.BaseTestCase):
         fake_get_spec.assert_called_once_with(net_id, vlan, trunk_mode=False)
 
 
+class ReconfigBatcherTestCase(base.BaseTestCase):
+
+    def test_no_batching(self):
+        submit = mock.Mock(return_value='result')
+        batcher = dvs.ReconfigBatcher(0, submit)
+        moref = mock.Mock(value='vm-1')
+        self.assertEqual('result', batcher.run(moref, ['change1']))
+        submit.assert_called_once_with(moref, ['change1'])
+
+    def test_merge_changes_of_same_object(self):
+        submit = mock.Mock(return_value='result')
+        batcher = dvs.ReconfigBatcher(0.01, submit)
+        vm1 = mock.Mock(value='vm-1')
+        vm2 = mock.Mock(value='vm-2')
+        threads = [eventlet.spawn(batcher.run, vm1, ['change1']),
+                   eventlet.spawn(batcher.run, vm1, ['change2']),
+                   eventlet.spawn(batcher.run, vm2, ['change3'])]
+        self.assertEqual(['result'] * 3, [t.wait() for t in threads])
+        self.assertEqual(2, submit.call_count)
+        submit.assert_has_calls([mock.call(vm1, ['change1', 'change2']),
+                                 mock.call(vm2, ['change3'])],
+                                any_order=True)
+
+    def test_failure_raised_to_all_requests(self):
+        submit = mock.Mock(side_effect=exp.NeutronException())
+        batcher = dvs.ReconfigBatcher(0.01, submit)
+        vm1 = mock.Mock(value='vm-1')
+        threads = [eventlet.spawn(batcher.run, vm1, ['change1']),
+                   eventlet.spawn(batcher.run, vm1, ['change2'])]
+        for thread in threads:
+            self.assertRaises(exp.NeutronException, thread.wait)
+        submit.assert_has_calls([mock.call(vm1, ['change1', 'change2']),
+                                 mock.call(vm1, ['change1']),
+                                 mock.call(vm1, ['change2'])])
+
+    def test_failed_merge_retried_per_request(self):
+        def submit(moref, changes):
+            if 'bad-change' in changes:
+                raise exp.NeutronException()
+            return changes
+
+        batcher = dvs.ReconfigBatcher(0.01, submit)
+        vm1 = mock.Mock(value='vm-1')
+        good = eventlet.spawn(batcher.run, vm1, ['change1'])
+        bad = eventlet.spawn(batcher.run, vm1, ['bad-change'])
+        self.assertEqual(['change1'], good.wait())
+        self.assertRaises(exp.NeutronException, bad.wait)
+
+    def test_conflicting_changes_not_merged(self):
+        submit = mock.Mock(return_value='result')
+        batcher = dvs.ReconfigBatcher(0.01, submit,
+                                      key_func=lambda change: change[0])
+        vm1 = mock.Mock(value='vm-1')
+        threads = [eventlet.spawn(batcher.run, vm1, [('dev1', 'a')]),
+                   eventlet.spawn(batcher.run, vm1, [('dev1', 'b')]),
+                   eventlet.spawn(batcher.run, vm1, [('dev2', 'c')])]
+        self.assertEqual(['result'] * 3, [t.wait() for t in threads])
+        self.assertEqual(
+            [mock.call(vm1, [('dev1', 'a'), ('dev2', 'c')]),
+             mock.call(vm1, [('dev1', 'b')])],
+            submit.call_args_list)
+
+
+class PortGroupCacheTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(PortGroupCacheTestCase, self).setUp()
+        self.session = mock.Mock()
+        self.cache = dvs.PortGroupCache(self.session,
+                                        mock.Mock(value='dvs-1'))
+
+    def _prop(self, name, val):
+        prop = mock.Mock(val=val)
+        prop.name = name
+        return prop
+
+    def _pg(self, moref_value, pg_name):
+        return mock.Mock(obj=mock.Mock(value=moref_value),
+                         propSet=[self._prop('name', pg_name)])
+
+    @mock.patch.object(dvs.eventlet, 'spawn_n')
+    def test_lookups_served_from_cache(self, mock_spawn):
+        results = mock.Mock(objects=[self._pg('dvportgroup-1', 'net1'),
+                                     self._pg('dvportgroup-2', 'net2')])
+        # RetrievePropertiesEx and then continue_retrieval
+        self.session.invoke_api.side_effect = [results, None]
+        self.assertEqual('dvportgroup-2',
+                         self.cache.get_moref('net2').value)
+        self.assertEqual('dvportgroup-1',
+                         self.cache.get_moref('dvportgroup-1').value)
+        self.assertIsNone(self.cache.get_moref('net3'))
+        self.assertEqual(
+            'net1', self.cache.get_name(mock.Mock(value='dvportgroup-1')))
+        self.assertEqual(2, self.session.invoke_api.call_count)
+        mock_spawn.assert_called_once_with(self.cache._watch_updates)
+
+    @mock.patch.object(dvs.eventlet, 'spawn_n')
+    def test_concurrent_lookups_load_once(self, mock_spawn):
+        results = mock.Mock(objects=[self._pg('dvportgroup-1', 'net1')])
+
+        def invoke_api(module, method, *args, **kwargs):
+            # Let the other lookups run while the cache is being loaded
+            eventlet.sleep(0)
+            if method == 'RetrievePropertiesEx':
+                return results
+
+        self.session.invoke_api.side_effect = invoke_api
+        threads = [eventlet.spawn(self.cache.get_moref, 'net1')
+                   for i in range(5)]
+        self.assertEqual(['dvportgroup-1'] * 5,
+                         [thread.wait().value for thread in threads])
+        # RetrievePropertiesEx and then continue_retrieval, only once
+        self.assertEqual(2, self.session.invoke_api.call_count)
+
+    @mock.patch.object(dvs.eventlet, 'spawn_n')
+    def test_apply_update_set(self, mock_spawn):
+        results = mock.Mock(objects=[self._pg('dvportgroup-1', 'net1')])
+        self.session.invoke_api.side_effect = [results, None]
+        self.assertIsNotNone(self.cache.get_moref('net1'))
+        change = self._prop('name', 'vxlan-net2')
+        change.op = 'assign'
+        update_set = mock.Mock(filterSet=[mock.Mock(objectSet=[
+            mock.Mock(kind='leave', obj=mock.Mock(value='dvportgroup-1')),
+            mock.Mock(kind='enter', obj=mock.Mock(value='dvportgroup-2'),
+                      changeSet=[change])])])
+        self.cache._apply_update_set(update_set)
+        self.assertIsNone(self.cache.get_moref('net1'))
+        self.assertEqual(['dvportgroup-2'],
+                         [moref.value for moref in
+                          self.cache.find_morefs('net2', 'vxlan')])
+
+
 class NeutronSimpleDvsTestCase(test_plugin.NeutronDbPluginV2TestCase):
 
     @mock.patch.object(dvs_utils, 'dvs_create_session',
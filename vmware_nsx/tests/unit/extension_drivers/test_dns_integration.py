@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
 from neutron_lib.api.definitions import dns
 from neutron_lib import context
 from neutron_lib.plugins import directory
@@ -115,3 +116,23 @@ class NsxV3DNSIntegrationTestCase(NsxDNSIntegrationTestCase,
                              dns_assignment['ip_address'])
             self.assertEqual(PORT_DNS_NAME + '.' + NETWORK_DOMAIN_NAME,
                              dns_assignment['fqdn'])
+
+    def test_list_ports_dns_domain_per_network(self):
+        with self.network(dns_domain=NETWORK_DOMAIN_NAME,
+                          arg_list=(dns.DNSDOMAIN,)) as network,\
+            self.subnet(network=network, cidr='10.0.0.0/24'):
+            net_id = network['network']['id']
+            for i in range(5):
+                self._create_port(self.fmt, net_id)
+            driver_cls = dns_integration.DNSExtensionDriverNSXv3
+            with mock.patch.object(
+                    driver_cls, '_get_network_and_az', autospec=True,
+                    side_effect=driver_cls._get_network_and_az) as get_net:
+                ports = self._list(
+                    'ports', query_params='network_id=%s' % net_id)['ports']
+                # The network of all the ports is fetched once
+                get_net.assert_called_once_with(mock.ANY, net_id, None)
+            self.assertGreaterEqual(len(ports), 5)
+            for port in ports:
+                self.assertTrue(port[dns.DNSASSIGNMENT][0]['fqdn'].endswith(
+                    '.' + NETWORK_DOMAIN_NAME))
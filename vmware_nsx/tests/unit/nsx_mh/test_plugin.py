@@ -14,6 +14,7 @@
 # limitations under the License.
 import copy
 
+import eventlet
 import mock
 from neutron.extensions import l3
 from neutron.extensions import securitygroup as secgrp
@@ -33,6 +34,7 @@ from neutron_lib import constants
 from neutron_lib import context
 from neutron_lib import exceptions as ntn_exc
 from neutron_lib.plugins import directory
+from oslo_concurrency import lockutils
 from oslo_config import cfg
 from oslo_db import exception as db_exc
 from oslo_log import log
@@ -43,6 +45,8 @@ import webob.exc
 from vmware_nsx.api_client import exception as api_exc
 from vmware_nsx.api_client import version as ver_module
 from vmware_nsx.common import exceptions as nsx_exc
+from vmware_nsx.common import locking
+from vmware_nsx.common import nsx_utils
 from vmware_nsx.common import sync
 from vmware_nsx.common import utils
 from vmware_nsx.db import db as nsx_db
@@ -892,6 +896,95 @@ class TestL3NatTestCase(L3NatTest,
     def test__notify_gateway_port_ip_changed(self):
         self.skipTest('not supported')
 
+    def test_find_router_subnets_cidrs(self):
+        plugin = directory.get_plugin()
+        ctx = context.get_admin_context()
+        with self.router() as r1, self.router() as r2,\
+            self.subnet(cidr='10.0.1.0/24') as s1,\
+            self.subnet(cidr='10.0.2.0/24') as s2:
+            r1_id = r1['router']['id']
+            r2_id = r2['router']['id']
+            for s in (s1, s2):
+                self._router_interface_action(
+                    'add', r1_id, s['subnet']['id'], None)
+            self.assertEqual(
+                set(['10.0.1.0/24', '10.0.2.0/24']),
+                set(plugin._find_router_subnets_cidrs(ctx, r1_id)))
+            routers_subnets = nsx_db.get_routers_subnets(
+                ctx.session, [r1_id, r2_id])
+            self.assertEqual(
+                set([s1['subnet']['id'], s2['subnet']['id']]),
+                set(subnet['id'] for subnet in routers_subnets[r1_id]))
+            self.assertEqual([], routers_subnets[r2_id])
+            for s in (s1, s2):
+                self._router_interface_action(
+                    'remove', r1_id, s['subnet']['id'], None)
+
+    def test_ext_gw_port_operations_locked_per_router(self):
+        plugin = directory.get_plugin()
+        events = []
+
+        def _find_router_gw_port(context, port_data):
+            router_id = port_data['device_id']
+            events.append(('start', router_id))
+            eventlet.sleep(0.01)
+            events.append(('end', router_id))
+            raise ntn_exc.NotFound()
+
+        ctx = context.get_admin_context()
+        ports = [{'device_id': router_id, 'network_id': 'ext_net'}
+                 for router_id in ('router1', 'router1', 'router2')]
+        with mock.patch.object(plugin, '_find_router_gw_port',
+                               side_effect=_find_router_gw_port),\
+            mock.patch.object(nsx_utils, 'get_nsx_router_id',
+                              return_value='nsx_router'),\
+            mock.patch.object(locking.LockManager, '_get_lock_local',
+                              side_effect=lambda name, **kw:
+                              lockutils.lock(name)):
+            pool = eventlet.GreenPool()
+            for port in ports:
+                pool.spawn(plugin._nsx_delete_ext_gw_port, ctx, port)
+            pool.waitall()
+
+        # The operation on router2 did not wait for those on router1
+        self.assertLess(events.index(('start', 'router2')),
+                        events.index(('end', 'router1')))
+        # The operations on router1 did not overlap
+        self.assertEqual(['start', 'end', 'start', 'end'],
+                         [e for e, r in events if r == 'router1'])
+
+    def test_delete_floatingip_reassociated_while_locked(self):
+        plugin = directory.get_plugin()
+        ctx = context.get_admin_context()
+        old_fip = mock.Mock(router_id='router1', fixed_port_id='port1')
+        new_fip = mock.Mock(router_id='router2', fixed_port_id='port2')
+        locked = []
+
+        def _get_lock(name, **kwargs):
+            locked.append(name)
+            return mock.MagicMock()
+
+        # The base class which deletes the floating IP from the DB
+        base = next(cls for cls in type(plugin).__mro__[1:]
+                    if 'delete_floatingip' in vars(cls))
+        with mock.patch.object(plugin, '_get_floatingip',
+                               side_effect=[old_fip, new_fip, new_fip]),\
+            mock.patch.object(locking.LockManager, 'get_lock',
+                              side_effect=_get_lock),\
+            mock.patch.object(nsx_utils, 'get_nsx_router_id',
+                              return_value='nsx_router') as get_nsx_id,\
+            mock.patch.object(plugin, '_retrieve_and_delete_nat_rules'),\
+            mock.patch.object(plugin, '_remove_floatingip_address') as rm,\
+            mock.patch.object(base, 'delete_floatingip') as delete_fip:
+            plugin.delete_floatingip(ctx, 'fip1')
+
+        # The lock of the new router was taken once the change was seen
+        self.assertEqual(['router-router1', 'router-router2'], locked)
+        get_nsx_id.assert_called_once_with(ctx.session, plugin.cluster,
+                                           'router2')
+        rm.assert_called_once_with(ctx, new_fip)
+        delete_fip.assert_called_once_with(ctx, 'fip1')
+
 
 class ExtGwModeTestCase(NsxPluginV2TestCase,
                         test_ext_gw_mode.ExtGwModeIntTestCase):
@@ -18,6 +18,7 @@ import contextlib
 import sys
 import time
 
+import eventlet
 import mock
 from neutron_lib import constants
 from neutron_lib import context
@@ -244,6 +245,83 @@ class CacheTestCase(base.BaseTestCase):
             self._verify_delete(resource, hit=False, deleted=deleted)
 
 
+class SingleFlightTestCase(base.BaseTestCase):
+
+    def _fetch_concurrently(self, single_flight, fetch_func, readers):
+        pool = eventlet.GreenPool()
+        results = []
+
+        def _read():
+            try:
+                results.append(single_flight.fetch('key', fetch_func))
+            except Exception as e:
+                results.append(e)
+
+        for i in range(readers):
+            pool.spawn(_read)
+        pool.waitall()
+        return results
+
+    def test_concurrent_fetches_merged(self):
+        def _fetch():
+            # Let the other readers start while the request is in progress
+            eventlet.sleep(0.01)
+            return {'fetched': len(fetch.mock_calls)}
+
+        fetch = mock.Mock(side_effect=_fetch)
+        single_flight = sync.SingleFlight()
+        self.assertEqual([{'fetched': 1}] * 5,
+                         self._fetch_concurrently(single_flight, fetch, 5))
+        # Without a freshness window, later reads fetch the data again
+        self.assertEqual([{'fetched': 2}],
+                         self._fetch_concurrently(single_flight, fetch, 1))
+
+    def test_concurrent_fetches_failure(self):
+        error = api_exc.RequestTimeout()
+
+        def _fetch():
+            eventlet.sleep(0.01)
+            raise error
+
+        fetch = mock.Mock(side_effect=_fetch)
+        single_flight = sync.SingleFlight()
+        self.assertEqual([error] * 3,
+                         self._fetch_concurrently(single_flight, fetch, 3))
+        fetch.assert_called_once_with()
+
+    def test_concurrent_fetches_timeout(self):
+        fetch = mock.Mock(side_effect=lambda: eventlet.sleep(10))
+        single_flight = sync.SingleFlight()
+        results = []
+
+        def _read(timeout):
+            try:
+                with eventlet.Timeout(timeout):
+                    results.append(single_flight.fetch('key', fetch))
+            except eventlet.Timeout as e:
+                results.append(e)
+
+        pool = eventlet.GreenPool()
+        # The fetching reader times out before the waiting one
+        pool.spawn(_read, 0.01)
+        pool.spawn(_read, 5)
+        pool.waitall()
+        self.assertEqual(2, len(results))
+        self.assertIs(results[0], results[1])
+        fetch.assert_called_once_with()
+
+    def test_freshness(self):
+        fetch = mock.Mock(return_value='data')
+        single_flight = sync.SingleFlight(freshness=10)
+        for i in range(3):
+            self.assertEqual('data', single_flight.fetch('key', fetch))
+        fetch.assert_called_once_with()
+        with mock.patch.object(sync.time, 'time',
+                               return_value=time.time() + 11):
+            single_flight.fetch('key', fetch)
+        self.assertEqual(2, fetch.call_count)
+
+
 class SyncLoopingCallTestCase(base.BaseTestCase):
 
     def test_looping_calls(self):
@@ -721,6 +799,34 @@ class SyncTestCase(testlib_api.SqlTestCase):
             q_rtr_data = self._plugin.get_router(ctx, q_rtr_id)
             self.assertEqual(constants.NET_STATUS_DOWN, q_rtr_data['status'])
 
+    def test_synchronize_router_concurrent_reads(self):
+        ctx = context.get_admin_context()
+        get_lrouter = sync.routerlib.get_lrouter
+        backend_calls = []
+
+        def _get_lrouter(cluster, lrouter_id):
+            backend_calls.append(lrouter_id)
+            # Let the other readers start while the request is in progress
+            eventlet.sleep(0.01)
+            return get_lrouter(cluster, lrouter_id)
+
+        with self._populate_data(ctx, net_size=0, router_size=1),\
+            mock.patch.object(sync.routerlib, 'get_lrouter',
+                              side_effect=_get_lrouter):
+            q_rtr = self._plugin.get_routers(ctx)[0]
+            for readers in (1, 10, 100):
+                del backend_calls[:]
+                pool = eventlet.GreenPool()
+                for i in range(readers):
+                    pool.spawn(self._plugin._synchronizer.synchronize_router,
+                               context.get_admin_context(), q_rtr)
+                pool.waitall()
+                LOG.debug("%(readers)s concurrent status reads issued "
+                          "%(calls)s backend requests",
+                          {'readers': readers, 'calls': len(backend_calls)})
+                # All the readers shared a single backend request
+                self.assertEqual(1, len(backend_calls))
+
     def test_sync_nsx_failure_backoff(self):
         self.mock_api.return_value.request.side_effect = api_exc.RequestTimeout
         # chunk size won't matter here
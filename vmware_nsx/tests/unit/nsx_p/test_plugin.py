@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
+
 import mock
 
 import decorator
@@ -93,6 +95,8 @@ class NsxPPluginTestCaseMixin(
     def _mock_nsx_policy_backend_calls(self):
         resource_list_result = {'results': [{'id': 'test',
                                              'display_name': 'test'}]}
+        # Start every test with an empty metadata cache
+        mock.patch.object(nsx_plugin, '_metadata_cache', None).start()
         mock.patch(
             "vmware_nsxlib.v3.policy.NsxPolicyLib.get_version",
             return_value=nsx_constants.NSX_VERSION_2_4_0).start()
@@ -560,6 +564,48 @@ class NsxPTestNetworks(test_db_base_plugin_v2.TestNetworksV2,
                               context.get_admin_context(),
                               network['id'], data)
 
+    def test_tz_metadata_cache(self):
+        with mock.patch('vmware_nsxlib.v3.policy.core_resources.'
+                        'NsxPolicyTransportZoneApi.get_host_switch_mode',
+                        return_value='ENS') as get_mode,\
+            mock.patch('vmware_nsxlib.v3.policy.core_resources.'
+                       'NsxPolicySegmentApi.get_transport_zone_id',
+                       return_value='tz1') as get_tz:
+            for i in range(3):
+                self.assertTrue(self.plugin._is_ens_tz('tz1'))
+                self.assertEqual('tz1',
+                                 self.plugin._get_segment_tz_id('seg1'))
+            get_mode.assert_called_once_with('tz1')
+            get_tz.assert_called_once_with('seg1')
+            cache = nsx_plugin.get_metadata_cache()
+            self.assertEqual({'hits': 4, 'misses': 2, 'size': 2},
+                             cache.get_metrics())
+
+            # Invalidated and expired entries are loaded again
+            cache.invalidate(('segment-tz', 'seg1'))
+            self.plugin._get_segment_tz_id('seg1')
+            self.assertEqual(2, get_tz.call_count)
+            with mock.patch.object(utils.time, 'time',
+                                   return_value=time.time() + 301):
+                self.plugin._is_ens_tz('tz1')
+            self.assertEqual(2, get_mode.call_count)
+
+    def test_tz_metadata_cache_metrics_log(self):
+        cfg.CONF.set_override('metadata_cache_metrics_log_interval', 60,
+                              'nsx_p')
+        with mock.patch('vmware_nsxlib.v3.policy.core_resources.'
+                        'NsxPolicyTransportZoneApi.get_host_switch_mode',
+                        return_value='ENS'),\
+            mock.patch.object(utils.LOG, 'info') as log_info:
+            self.plugin._is_ens_tz('tz1')
+            log_info.assert_not_called()
+            with mock.patch.object(utils.time, 'time',
+                                   return_value=time.time() + 61):
+                self.plugin._is_ens_tz('tz1')
+            log_info.assert_called_once_with(
+                mock.ANY, {'name': 'NSX-P metadata', 'hits': 0,
+                           'misses': 1, 'size': 1})
+
 
 class NsxPTestPorts(test_db_base_plugin_v2.TestPortsV2,
                     NsxPPluginTestCaseMixin):
@@ -1147,6 +1193,24 @@ class NsxPTestSecurityGroup(common_v3.FixExternalNetBaseTest,
                 for k, v, in keys:
                     self.assertEqual(rule['security_group_rule'][k], v)
 
+    def test_create_security_group_rule_bulk_single_transaction(self):
+        with self.security_group() as sg:
+            sg_id = sg['security_group']['id']
+            rules = [self._build_security_group_rule(
+                sg_id, 'ingress', 'tcp', str(port), str(port),
+                '10.0.%s.0/24' % i)
+                for i, port in enumerate((22, 80, 443))]
+            with mock.patch("vmware_nsxlib.v3.client.RESTClient."
+                            "patch") as nsx_patch:
+                res = self._create_security_group_rule(
+                    self.fmt, {'security_group_rules': rules})
+                self.assertEqual(201, res.status_int)
+            # The services, remote groups & entries of all the rules are
+            # created with one policy call
+            nsx_patch.assert_called_once()
+            body = nsx_patch.call_args[0][1]
+            self.assertEqual('Infra', body['resource_type'])
+
     def _test_create_direct_network(self, vlan_id=0):
         net_type = vlan_id and 'vlan' or 'flat'
         name = 'direct_net'
@@ -5513,6 +5513,58 @@ class TestSharedRouterTestCase(L3NatTest, L3NatTestCaseBase,
             self.assertIn(r2['router']['id'], conflict_router_ids)
             self.assertEqual(0, len(available_router_ids))
 
+    def test_get_available_and_conflicting_ids_after_intf_removal(self):
+        with self.router() as r1, self.router() as r2,\
+                self.subnet(cidr='11.0.0.0/24') as s1,\
+                self.subnet(cidr='11.0.0.0/24') as s2,\
+                self.subnet(cidr='12.0.0.0/24') as s3:
+            self._router_interface_action('add',
+                                          r1['router']['id'],
+                                          s1['subnet']['id'],
+                                          None)
+            self._router_interface_action('add',
+                                          r2['router']['id'],
+                                          s2['subnet']['id'],
+                                          None)
+            # Keep r2 bound to its edge after the removal below
+            self._router_interface_action('add',
+                                          r2['router']['id'],
+                                          s3['subnet']['id'],
+                                          None)
+            router_driver = (self.plugin_instance._router_managers.
+                             get_tenant_router_driver(context, 'shared'))
+            available_router_ids, conflict_router_ids = (
+                router_driver._get_available_and_conflicting_ids(
+                    context.get_admin_context(), r1['router']['id']))
+            self.assertIn(r2['router']['id'], conflict_router_ids)
+
+            # The placement index should reflect the removed interface
+            self._router_interface_action('remove',
+                                          r2['router']['id'],
+                                          s2['subnet']['id'],
+                                          None)
+            available_router_ids, conflict_router_ids = (
+                router_driver._get_available_and_conflicting_ids(
+                    context.get_admin_context(), r1['router']['id']))
+            self.assertIn(r2['router']['id'], available_router_ids)
+            self.assertEqual(0, len(conflict_router_ids))
+
+    def test_get_available_and_conflicting_ids_skips_unbound_routers(self):
+        with self.router() as r1, self.router() as r2,\
+                self.subnet(cidr='11.0.0.0/24') as s1:
+            self._router_interface_action('add',
+                                          r1['router']['id'],
+                                          s1['subnet']['id'],
+                                          None)
+            router_driver = (self.plugin_instance._router_managers.
+                             get_tenant_router_driver(context, 'shared'))
+            # r2 has no interfaces, so it is not bound to any edge
+            available_router_ids, conflict_router_ids = (
+                router_driver._get_available_and_conflicting_ids(
+                    context.get_admin_context(), r1['router']['id']))
+            self.assertNotIn(r2['router']['id'],
+                             available_router_ids + conflict_router_ids)
+
     def test_migrate_shared_router_to_exclusive(self):
         with self.router(name='r7') as r1, \
                 self.subnet(cidr='11.0.0.0/24') as s1:
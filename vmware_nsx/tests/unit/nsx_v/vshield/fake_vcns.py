@@ -1071,20 +1071,63 @@ class FakeVcns(object):
         headers = {'status': 200}
         return (headers, response)
 
-    def remove_rule_from_section(self, section_uri, rule_id):
+    def _check_section_etag(self, section, h):
+        # Rules updates are rejected if the section has changed since it
+        # was read
+        if h is not None and h['etag'] != section['etag']:
+            raise exceptions.VcnsApiException(
+                status=412, header={}, response='Precondition Failed')
+
+    def _update_rule_etag(self, section):
+        section['etag'] = 'Etag-%s' % (
+            int(section['etag'].split('-')[-1]) + 1)
+
+    def remove_rule_from_section(self, section_uri, rule_id, h=None):
         section_id = self._get_section_id_from_uri(section_uri)
         if section_id not in self._sections:
             headers, response = self._section_not_found(section_id)
         else:
             section = self._sections[section_id]
+            self._check_section_etag(section, h)
             if rule_id in section['rules']:
                 del section['rules'][rule_id]
+                self._update_rule_etag(section)
                 response = ''
-                headers = {'status': 204}
+                headers = {'status': 204, 'etag': section['etag']}
             else:
                 headers, response = self._unknown_error()
         return (headers, response)
 
+    def add_rule_to_section(self, section_uri, request, h=None):
+        section_id = self._get_section_id_from_uri(section_uri)
+        if section_id not in self._sections:
+            return self._section_not_found(section_id)
+        section = self._sections[section_id]
+        self._check_section_etag(section, h)
+        rule = ET.fromstring(request)
+        rule_id = str(self._sections['rule_ids'])
+        self._sections['rule_ids'] += 1
+        rule.attrib['id'] = rule_id
+        section['rules'][rule_id] = ET.tostring(rule)
+        self._update_rule_etag(section)
+        headers = {'status': 201, 'etag': section['etag']}
+        return (headers, ET.tostring(rule))
+
+    def update_section_rule(self, section_uri, rule_id, request, h=None):
+        section_id = self._get_section_id_from_uri(section_uri)
+        if section_id not in self._sections:
+            return self._section_not_found(section_id)
+        section = self._sections[section_id]
+        self._check_section_etag(section, h)
+        if rule_id not in section['rules']:
+            return self._unknown_error()
+        rule = ET.fromstring(request)
+        rule.attrib['id'] = rule_id
+        section['rules'][rule_id] = ET.tostring(rule)
+        self._update_rule_etag(section)
+        headers = {'status': 200, 'etag': section['etag']}
+        return (headers, ET.tostring(rule))
+
     def add_member_to_security_group(self, security_group_id, member_id):
         if security_group_id not in self._securitygroups:
             msg = ("The requested object : %s could not be found."
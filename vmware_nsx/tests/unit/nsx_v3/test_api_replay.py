@@ -13,11 +13,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import copy
+
+import mock
+
+from vmware_nsx.api_replay import client
+from vmware_nsx.api_replay import utils
 from vmware_nsx.tests.unit.nsx_v3 import test_plugin
+from vmware_nsx.tests.unit import test_utils
 
+from neutron.tests import base
 from neutron_lib.api import attributes
 from neutron_lib.plugins import directory
 from oslo_config import cfg
+from oslo_utils import uuidutils
 
 
 class TestApiReplay(test_plugin.NsxV3PluginTestCaseMixin):
@@ -60,3 +70,191 @@ class TestApiReplay(test_plugin.NsxV3PluginTestCaseMixin):
                                      id=specified_port_id)
         port = self.deserialize(self.fmt, port_res)
         self.assertEqual(specified_port_id, port['port']['id'])
+
+
+class FakeNeutronClient(object):
+    """In-memory neutron client, keeping the created objects"""
+
+    def __init__(self, networks=None, subnets=None, ports=None):
+        self.objects = collections.defaultdict(list)
+        self.objects['networks'] = networks or []
+        self.objects['subnets'] = subnets or []
+        self.objects['ports'] = ports or []
+        self.list_calls = collections.Counter()
+        # ids of the objects whose creation fails
+        self.failing_ids = set()
+
+    def _list(self, resource):
+        self.list_calls[resource] += 1
+        return {resource: copy.deepcopy(self.objects[resource])}
+
+    def _create(self, resource, obj):
+        if obj.get('id') in self.failing_ids:
+            raise Exception('Failed to create %s' % obj['id'])
+        obj = copy.deepcopy(obj)
+        obj.setdefault('id', uuidutils.generate_uuid())
+        self.objects[resource].append(obj)
+        return obj
+
+    def list_networks(self):
+        return self._list('networks')
+
+    def list_subnets(self):
+        return self._list('subnets')
+
+    def list_ports(self):
+        return self._list('ports')
+
+    def list_security_groups(self):
+        return self._list('security_groups')
+
+    def list_qos_policies(self):
+        return {'policies': []}
+
+    def list_routers(self):
+        return self._list('routers')
+
+    def list_subnetpools(self):
+        return self._list('subnetpools')
+
+    def list_floatingips(self):
+        return self._list('floatingips')
+
+    def create_network(self, body):
+        return {'network': self._create('networks', body['network'])}
+
+    def create_subnet(self, body):
+        return {'subnet': self._create('subnets', body['subnet'])}
+
+    def create_port(self, body):
+        return {'port': self._create('ports', body['port'])}
+
+    def update_subnet(self, subnet_id, body):
+        pass
+
+
+class TestApiReplayClient(base.BaseTestCase):
+
+    def _get_source_client(self, num_networks, ports_per_network):
+        networks = []
+        subnets = []
+        ports = []
+        for net_num in range(num_networks):
+            net_id = 'net-%s' % net_num
+            subnet_id = 'subnet-%s' % net_num
+            networks.append({'id': net_id, 'name': net_id,
+                             'subnets': [subnet_id]})
+            subnets.append({'id': subnet_id, 'network_id': net_id,
+                            'ip_version': 4, 'enable_dhcp': True,
+                            'cidr': '10.0.0.0/16'})
+            for port_num in range(ports_per_network):
+                ports.append({'id': 'port-%s-%s' % (net_num, port_num),
+                              'network_id': net_id,
+                              'device_owner': 'compute:nova',
+                              'device_id': 'vm-%s' % port_num,
+                              'mac_address': 'fa:16:3e:00:00:01',
+                              'fixed_ips': [{'subnet_id': subnet_id,
+                                             'ip_address': '10.0.0.1'}]})
+        return FakeNeutronClient(networks=networks, subnets=subnets,
+                                 ports=ports)
+
+    def _migrate(self, source, dest, max_workers=1, journal=None,
+                 dest_url='url'):
+        with mock.patch.object(client.ApiReplayClient, 'connect_to_client',
+                               side_effect=[source, dest]),\
+            mock.patch.object(client, 'LOG'):
+            return client.ApiReplayClient(
+                'user', 'domain', 'tenant', 'domain', 'password', 'url',
+                'user', 'domain', 'tenant', 'domain', 'password', dest_url,
+                False, None, max_workers=max_workers, journal=journal)
+
+    def test_migrate_many_ports(self):
+        num_networks = 20
+        ports_per_network = 20
+        source = self._get_source_client(num_networks, ports_per_network)
+        dest = FakeNeutronClient()
+        self._migrate(source, dest, max_workers=10)
+
+        self.assertEqual(num_networks, len(dest.objects['networks']))
+        self.assertEqual(num_networks, len(dest.objects['subnets']))
+        self.assertEqual(num_networks * ports_per_network,
+                         len(dest.objects['ports']))
+        # Each resource list is fetched once from each side, and indexed
+        # instead of being searched for each port
+        self.assertEqual(1, source.list_calls['ports'])
+        self.assertEqual(1, dest.list_calls['ports'])
+        self.assertEqual(1, source.list_calls['subnets'])
+
+    @test_utils.benchmark
+    def test_benchmark_migrate_ports(self):
+        ports_per_network = 100
+        for num_ports in (5000, 50000):
+            num_networks = num_ports // ports_per_network
+            source = self._get_source_client(num_networks, ports_per_network)
+            dest = FakeNeutronClient()
+            test_utils.report_timing(
+                self, '%s ports' % num_ports,
+                self._migrate, source, dest, max_workers=10)
+            self.assertEqual(num_ports, len(dest.objects['ports']))
+
+    def test_resume_migration(self):
+        journal = self.get_temp_file_path('nsx_migration.journal')
+        source = self._get_source_client(10, 10)
+        dest = FakeNeutronClient()
+        dest.failing_ids = set(['port-3-1', 'port-7-7'])
+        replay = self._migrate(source, dest, max_workers=5, journal=journal)
+        stats = dict((stats.phase, stats) for stats in replay.phases_stats)
+        self.assertEqual(10, stats['networks'].migrated)
+        self.assertEqual(98, stats['ports'].migrated)
+        self.assertEqual(2, stats['ports'].failed)
+        self.assertEqual(98, len(dest.objects['ports']))
+
+        # The second run migrates only the failed ports, on the subnets
+        # created by the first run
+        dest.failing_ids = set()
+        replay = self._migrate(source, dest, max_workers=5, journal=journal)
+        stats = dict((stats.phase, stats) for stats in replay.phases_stats)
+        self.assertEqual(0, stats['networks'].migrated)
+        self.assertEqual(10, stats['networks'].skipped)
+        self.assertEqual(10, stats['subnets'].skipped)
+        self.assertEqual(2, stats['ports'].migrated)
+        self.assertEqual(98, stats['ports'].skipped)
+        self.assertEqual(10, len(dest.objects['networks']))
+        self.assertEqual(10, len(dest.objects['subnets']))
+        self.assertEqual(100, len(dest.objects['ports']))
+
+    def test_resume_network_not_journaled(self):
+        journal = self.get_temp_file_path('nsx_migration.journal')
+        source = self._get_source_client(3, 2)
+        # The previous run was interrupted after creating net-1, before
+        # writing it to the journal
+        dest = FakeNeutronClient(networks=[{'id': 'net-0'}, {'id': 'net-1'}])
+        previous_run = utils.MigrationJournal(journal, destination='url')
+        previous_run.record('networks', 'net-0', 'net-0')
+        previous_run.close()
+        replay = self._migrate(source, dest, journal=journal)
+        stats = dict((stats.phase, stats) for stats in replay.phases_stats)
+        self.assertEqual(1, stats['networks'].migrated)
+        self.assertEqual(2, stats['networks'].skipped)
+        # The subnets and ports of all the networks were migrated
+        self.assertEqual(3, len(dest.objects['networks']))
+        self.assertEqual(3, len(dest.objects['subnets']))
+        self.assertEqual(6, len(dest.objects['ports']))
+
+    def test_existing_network_not_migrated(self):
+        source = self._get_source_client(2, 2)
+        dest = FakeNeutronClient(networks=[{'id': 'net-0'}])
+        self._migrate(source, dest)
+        # Without a journal to resume, the network found on the destination
+        # is left as is
+        self.assertEqual(2, len(dest.objects['networks']))
+        self.assertEqual(1, len(dest.objects['subnets']))
+        self.assertEqual(2, len(dest.objects['ports']))
+
+    def test_journal_of_other_destination(self):
+        journal = self.get_temp_file_path('nsx_migration.journal')
+        source = self._get_source_client(2, 2)
+        self._migrate(source, FakeNeutronClient(), journal=journal)
+        self.assertRaises(ValueError, self._migrate,
+                          source, FakeNeutronClient(), journal=journal,
+                          dest_url='other_url')
@@ -17,6 +17,8 @@ import copy
 
 import mock
 
+from neutron_lib import constants
+from neutron_lib import context
 from neutron_lib.exceptions import firewall_v2 as exceptions
 from neutron_lib.plugins import directory
 
@@ -209,12 +211,12 @@ class Nsxv3FwaasTestCase(test_v3_plugin.NsxV3PluginTestCaseMixin):
                                return_value=[port]),\
             mock.patch.object(self.plugin, 'get_port',
                               return_value=port),\
-            mock.patch.object(self.plugin.fwaas_callbacks, 'get_port_fwg',
-                              return_value=firewall),\
+            mock.patch.object(self.plugin.fwaas_callbacks, 'get_ports_fwg',
+                              return_value={FAKE_PORT_ID: firewall}),\
             mock.patch.object(self.plugin, 'service_router_has_services',
                               return_value=True),\
-            mock.patch("vmware_nsx.db.db.get_nsx_switch_and_port_id",
-                       return_value=(FAKE_NSX_LS_ID, 0)),\
+            mock.patch("vmware_nsx.db.db.get_nsx_switch_and_port_ids",
+                       return_value={FAKE_PORT_ID: (FAKE_NSX_LS_ID, 0)}),\
             mock.patch("vmware_nsxlib.v3.security.NsxLibFirewallSection."
                        "update") as update_fw:
             self.firewall.create_firewall_group('nsx', apply_list, firewall)
@@ -246,12 +248,12 @@ class Nsxv3FwaasTestCase(test_v3_plugin.NsxV3PluginTestCaseMixin):
                                return_value=[port]),\
             mock.patch.object(self.plugin, 'get_port',
                               return_value=port),\
-            mock.patch.object(self.plugin.fwaas_callbacks, 'get_port_fwg',
-                              return_value=firewall), \
+            mock.patch.object(self.plugin.fwaas_callbacks, 'get_ports_fwg',
+                              return_value={FAKE_PORT_ID: firewall}), \
             mock.patch.object(self.plugin, 'service_router_has_services',
                               return_value=True), \
-            mock.patch("vmware_nsx.db.db.get_nsx_switch_and_port_id",
-                       return_value=(FAKE_NSX_LS_ID, 0)),\
+            mock.patch("vmware_nsx.db.db.get_nsx_switch_and_port_ids",
+                       return_value={FAKE_PORT_ID: (FAKE_NSX_LS_ID, 0)}),\
             mock.patch("vmware_nsxlib.v3.security.NsxLibFirewallSection."
                        "update") as update_fw:
             func('nsx', apply_list, firewall)
@@ -307,10 +309,10 @@ class Nsxv3FwaasTestCase(test_v3_plugin.NsxV3PluginTestCaseMixin):
                               return_value=port), \
             mock.patch.object(self.plugin, 'service_router_has_services',
                               return_value=True), \
-            mock.patch.object(self.plugin.fwaas_callbacks, 'get_port_fwg',
-                              return_value=firewall),\
-            mock.patch("vmware_nsx.db.db.get_nsx_switch_and_port_id",
-                       return_value=(FAKE_NSX_LS_ID, 0)),\
+            mock.patch.object(self.plugin.fwaas_callbacks, 'get_ports_fwg',
+                              return_value={FAKE_PORT_ID: firewall}),\
+            mock.patch("vmware_nsx.db.db.get_nsx_switch_and_port_ids",
+                       return_value={FAKE_PORT_ID: (FAKE_NSX_LS_ID, 0)}),\
             mock.patch("vmware_nsxlib.v3.security.NsxLibFirewallSection."
                        "update") as update_fw:
             self.firewall.create_firewall_group('nsx', apply_list, firewall)
@@ -338,12 +340,12 @@ class Nsxv3FwaasTestCase(test_v3_plugin.NsxV3PluginTestCaseMixin):
         port = {'id': FAKE_PORT_ID}
         with mock.patch.object(self.plugin, '_get_router_interfaces',
                                return_value=[port]),\
-            mock.patch.object(self.plugin.fwaas_callbacks, 'get_port_fwg',
-                              return_value=None), \
+            mock.patch.object(self.plugin.fwaas_callbacks, 'get_ports_fwg',
+                              return_value={}), \
             mock.patch.object(self.plugin, 'service_router_has_services',
                               return_value=True), \
-            mock.patch("vmware_nsx.db.db.get_nsx_switch_and_port_id",
-                       return_value=(FAKE_NSX_LS_ID, 0)),\
+            mock.patch("vmware_nsx.db.db.get_nsx_switch_and_port_ids",
+                       return_value={FAKE_PORT_ID: (FAKE_NSX_LS_ID, 0)}),\
             mock.patch("vmware_nsxlib.v3.security.NsxLibFirewallSection."
                        "update") as update_fw:
             self.firewall.delete_firewall_group('nsx', apply_list, firewall)
@@ -375,12 +377,12 @@ class Nsxv3FwaasTestCase(test_v3_plugin.NsxV3PluginTestCaseMixin):
                               return_value=port),\
             mock.patch.object(self.plugin, '_get_port_relay_servers',
                               return_value=[relay_server]),\
-            mock.patch.object(self.plugin.fwaas_callbacks, 'get_port_fwg',
-                              return_value=firewall), \
+            mock.patch.object(self.plugin.fwaas_callbacks, 'get_ports_fwg',
+                              return_value={FAKE_PORT_ID: firewall}), \
             mock.patch.object(self.plugin, 'service_router_has_services',
                               return_value=True), \
-            mock.patch("vmware_nsx.db.db.get_nsx_switch_and_port_id",
-                       return_value=(FAKE_NSX_LS_ID, 0)),\
+            mock.patch("vmware_nsx.db.db.get_nsx_switch_and_port_ids",
+                       return_value={FAKE_PORT_ID: (FAKE_NSX_LS_ID, 0)}),\
             mock.patch("vmware_nsxlib.v3.security.NsxLibFirewallSection."
                        "update") as update_fw:
             self.firewall.create_firewall_group('nsx', apply_list, firewall)
@@ -419,3 +421,59 @@ class Nsxv3FwaasTestCase(test_v3_plugin.NsxV3PluginTestCaseMixin):
             update_fw.assert_called_once_with(
                 MOCK_SECTION_ID,
                 rules=expected_rules)
+
+    def test_get_ports_fwg(self):
+        callbacks = self.plugin.fwaas_callbacks
+        fwgs = [{'id': 'fwg1', 'status': 'ACTIVE'},
+                {'id': 'fwg2', 'status': 'ERROR'}]
+        fwg_ids = {'port1': 'fwg1', 'port2': 'fwg2', 'port3': 'fwg3',
+                   'port4': 'fwg1'}
+        with mock.patch.object(callbacks, '_get_ports_firewall_group_ids',
+                               return_value=fwg_ids) as get_ids,\
+            mock.patch.object(callbacks.fwplugin_rpc,
+                              'get_firewall_groups_for_project',
+                              return_value=fwgs) as get_fwgs:
+            ports_fwg = callbacks.get_ports_fwg(
+                context.get_admin_context(),
+                ['port1', 'port2', 'port3', 'port4', 'port5'])
+            # Ports without a firewall group, with a missing firewall group
+            # or with one in error are skipped
+            self.assertEqual({'port1': fwgs[0], 'port4': fwgs[0]},
+                             ports_fwg)
+            get_ids.assert_called_once()
+            get_fwgs.assert_called_once()
+
+    def test_get_in_ns_ports_query_count(self):
+        # A firewall group attached to many router interfaces used to cost
+        # one get_port and one get_router call per port
+        callbacks = self.plugin.fwaas_callbacks
+        num_routers = 10
+        num_ports = 200
+        ports = [{'id': 'port%s' % i,
+                  'device_owner': constants.DEVICE_OWNER_ROUTER_INTF,
+                  'device_id': 'router%s' % (i % num_routers)}
+                 for i in range(num_ports)]
+        routers = [{'id': 'router%s' % i} for i in range(num_routers)]
+        port_ids = [port['id'] for port in ports]
+        ctx = context.get_admin_context()
+        with mock.patch.object(self.plugin, 'get_ports',
+                               return_value=ports) as get_ports,\
+            mock.patch.object(self.plugin, 'get_routers',
+                              return_value=routers) as get_routers,\
+            mock.patch.object(self.plugin, 'get_port') as get_port,\
+            mock.patch.object(self.plugin, 'get_router') as get_router,\
+            mock.patch.object(callbacks, '_router_dict_to_obj',
+                              side_effect=lambda r: r['id']):
+            in_ns_ports = callbacks._get_in_ns_ports(port_ids, context=ctx)
+            self.assertEqual(num_routers, len(in_ns_ports))
+            self.assertEqual(num_ports // num_routers,
+                             len(dict(in_ns_ports)['router0']))
+            self.assertEqual(1, get_ports.call_count)
+            self.assertEqual(1, get_routers.call_count)
+            get_port.assert_not_called()
+            get_router.assert_not_called()
+
+            # Later lookups of the same callback are served from its cache
+            callbacks._get_in_ns_ports(port_ids[:num_routers], context=ctx)
+            self.assertEqual(1, get_ports.call_count)
+            self.assertEqual(1, get_routers.call_count)
@@ -14,8 +14,10 @@
 #    under the License.
 import contextlib
 
+import eventlet
 import mock
 from neutron.api import extensions
+from neutron.tests import base
 from neutron_dynamic_routing.db import bgp_db  # noqa
 from neutron_dynamic_routing import extensions as dr_extensions
 from neutron_dynamic_routing.extensions import bgp as ext_bgp
@@ -29,6 +31,7 @@ from vmware_nsx.common import exceptions as exc
 from vmware_nsx.db import nsxv_db
 from vmware_nsx.plugins.nsx_v.drivers import (
     shared_router_driver as router_driver)
+from vmware_nsx.plugins.nsx_v.vshield.common import exceptions as vcns_exc
 from vmware_nsx.services.dynamic_routing import bgp_plugin
 from vmware_nsx.services.dynamic_routing.nsx_v import driver as bgp_driver
 from vmware_nsx.tests.unit.nsx_v import test_plugin
@@ -287,3 +290,94 @@ class TestNSXvBgpPlugin(test_plugin.NsxVPluginV2TestCase,
                                       self.context,
                                       speaker['id'],
                                       {'bgp_peer_id': 'aaa'})
+
+
+class StubBgpEdges(object):
+    """NSX-V routing backend which records the BGP calls of each edge"""
+
+    def __init__(self, failing_edges=()):
+        self.failing_edges = failing_edges
+        self.calls = {}
+
+    def _call(self, action, edge_id, neighbours):
+        # let other edges and requests run in the middle of the update
+        eventlet.sleep(0.01)
+        if edge_id in self.failing_edges:
+            raise vcns_exc.VcnsApiException(status='fail', response='error')
+        self.calls.setdefault(edge_id, []).append(
+            (action, [nbr['bgpNeighbour']['ipAddress']
+                      for nbr in neighbours]))
+
+    def add_bgp_neighbours(self, edge_id, neighbours):
+        self._call('add', edge_id, neighbours)
+
+    def remove_bgp_neighbours(self, edge_id, neighbours):
+        self._call('remove', edge_id, neighbours)
+
+
+class TestNSXvBgpDriverEdgeFanout(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNSXvBgpDriverEdgeFanout, self).setUp()
+        core_plugin = mock.Mock()
+        core_plugin.is_tvd_plugin.return_value = False
+        with mock.patch.object(directory, 'get_plugin',
+                               return_value=core_plugin):
+            self.driver = bgp_driver.NSXvBgpDriver(mock.Mock())
+        self.driver._validate_bgp_peer = mock.Mock()
+        self.edge_ids = ['edge-%s' % i for i in range(1, 11)]
+        bindings = [{'edge_id': edge_id, 'bgp_identifier': '10.0.0.%s' % i}
+                    for i, edge_id in enumerate(self.edge_ids, 1)]
+        mock.patch.object(nsxv_db, 'get_nsxv_bgp_speaker_bindings',
+                          return_value=bindings).start()
+        self.peer = {'id': 'peer-id', 'peer_ip': '20.0.0.1',
+                     'remote_as': 1000, 'password': None,
+                     'esg_id': 'gw-edge'}
+        self.driver._plugin.get_bgp_peer.return_value = self.peer
+        self.driver._plugin._get_id_for.return_value = self.peer['id']
+        self.driver._plugin.get_bgp_speaker.return_value = {
+            'id': 'speaker-id', 'local_as': 2000}
+        self.context = context.get_admin_context()
+
+    def test_edge_order_preserved(self):
+        self.driver._nsxv = StubBgpEdges()
+        peer_info = {'bgp_peer_id': self.peer['id']}
+        add = eventlet.spawn(self.driver.add_bgp_peer, self.context,
+                             'speaker-id', peer_info)
+        # let the first request start updating the edges
+        eventlet.sleep(0)
+        remove = eventlet.spawn(self.driver.remove_bgp_peer, self.context,
+                                'speaker-id', peer_info)
+        add.wait()
+        remove.wait()
+
+        for edge_id in self.edge_ids:
+            self.assertEqual([('add', ['20.0.0.1']),
+                              ('remove', ['20.0.0.1'])],
+                             self.driver._nsxv.calls[edge_id])
+        # The GW edge neighbours were updated with all the edges
+        bgp_identifiers = sorted('10.0.0.%s' % i for i in range(1, 11))
+        self.assertEqual(['add', 'remove'],
+                         [action for action, nbrs in
+                          self.driver._nsxv.calls['gw-edge']])
+        for action, nbrs in self.driver._nsxv.calls['gw-edge']:
+            self.assertEqual(bgp_identifiers, sorted(nbrs))
+
+    def test_edge_failures_aggregated(self):
+        self.driver._nsxv = StubBgpEdges(
+            failing_edges=('edge-2', 'edge-5'))
+        with mock.patch.object(bgp_driver.LOG, 'error') as log_error:
+            self.driver.add_bgp_peer(self.context, 'speaker-id',
+                                     {'bgp_peer_id': self.peer['id']})
+            log_error.assert_called_once()
+            self.assertEqual(2, log_error.call_args[0][1]['failed'])
+
+        failed_edges = set(['edge-2', 'edge-5'])
+        for edge_id in set(self.edge_ids) - failed_edges:
+            self.assertEqual([('add', ['20.0.0.1'])],
+                             self.driver._nsxv.calls[edge_id])
+        # only the successfully updated edges are added to the GW edge
+        [(action, nbrs)] = self.driver._nsxv.calls['gw-edge']
+        self.assertEqual(8, len(nbrs))
+        self.assertNotIn('10.0.0.2', nbrs)
+        self.assertNotIn('10.0.0.5', nbrs)
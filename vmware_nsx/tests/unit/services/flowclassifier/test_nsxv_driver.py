@@ -12,6 +12,8 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import xml.etree.ElementTree as et
+
 import mock
 from oslo_config import cfg
 from oslo_utils import importutils
@@ -224,47 +226,93 @@ class TestNsxvFlowClassifierDriver(
             rule.find('services').find('service').find('protocolName').text)
         self.assertTrue(rule.find('name').text.startswith(self._fc_name))
 
+    def _get_fc_context(self, fc):
+        return fc_ctx.FlowClassifierContext(
+            self.flowclassifier_plugin, self.ctx, fc['flow_classifier'])
+
+    def _get_backend_rules(self):
+        h, xml_section = self.fc2.get_section(
+            self.driver.get_redirect_fw_section_uri())
+        return list(et.fromstring(xml_section).iter('rule'))
+
     def test_create_flow_classifier(self):
         with self.flow_classifier(flow_classifier=self._fc) as fc:
-            fc_context = fc_ctx.FlowClassifierContext(
-                self.flowclassifier_plugin, self.ctx,
-                fc['flow_classifier']
-            )
-            with mock.patch.object(
-                self.driver,
-                'update_redirect_section_in_backed') as mock_update_section:
+            fc_context = self._get_fc_context(fc)
+            with mock.patch.object(self.fc2,
+                                   'update_section') as mock_update_section:
                 self.driver.create_flow_classifier(fc_context)
-                self.assertTrue(mock_update_section.called)
-                section = mock_update_section.call_args[0][0]
-                self._validate_rule_structure(section.find('rule'))
+                # Only the new rule was sent to the backend
+                mock_update_section.assert_not_called()
+            rules = self._get_backend_rules()
+            self.assertEqual(1, len(rules))
+            self._validate_rule_structure(rules[0])
 
     def test_update_flow_classifier(self):
         with self.flow_classifier(flow_classifier=self._fc) as fc:
-            fc_context = fc_ctx.FlowClassifierContext(
-                self.flowclassifier_plugin, self.ctx,
-                fc['flow_classifier']
-            )
+            fc_context = self._get_fc_context(fc)
             self.driver.create_flow_classifier(fc_context)
+            with mock.patch.object(self.fc2,
+                                   'update_section') as mock_update_section:
+                self.driver.update_flow_classifier(fc_context)
+                mock_update_section.assert_not_called()
+            rules = self._get_backend_rules()
+            self.assertEqual(1, len(rules))
+            self._validate_rule_structure(rules[0])
+
+    def test_update_flow_classifier_section_changed(self):
+        with self.flow_classifier(flow_classifier=self._fc) as fc:
+            fc_context = self._get_fc_context(fc)
+            self.driver.create_flow_classifier(fc_context)
+            # Another neutron server adds a rule to the section
+            section_uri = self.driver.get_redirect_fw_section_uri()
+            self.fc2.add_rule_to_section(
+                section_uri, '<rule><name>other-rule</name></rule>')
             with mock.patch.object(
-                self.driver,
-                'update_redirect_section_in_backed') as mock_update_section:
+                self.fc2, 'update_section_rule',
+                side_effect=self.fc2.update_section_rule) as update_rule:
                 self.driver.update_flow_classifier(fc_context)
-                self.assertTrue(mock_update_section.called)
-                section = mock_update_section.call_args[0][0]
-                self._validate_rule_structure(section.find('rule'))
+                # The first update was rejected, and retried after reloading
+                # the section
+                self.assertEqual(2, update_rule.call_count)
+            rules = self._get_backend_rules()
+            self.assertEqual(2, len(rules))
+            self._validate_rule_structure(rules[0])
+            self.assertEqual(self.fc2.get_section(section_uri)[0]['etag'],
+                             self.driver._section_etag)
+
+    def test_create_flow_classifier_without_etag(self):
+        with self.flow_classifier(flow_classifier=self._fc) as fc:
+            fc_context = self._get_fc_context(fc)
+            section_uri = self.driver.get_redirect_fw_section_uri()
+            h, xml_section = self.fc2.get_section(section_uri)
+            self.driver._section_etag = None
+            # The backend did not return the section ETag
+            with mock.patch.object(self.fc2, 'get_section',
+                                   return_value=({}, xml_section)),\
+                mock.patch.object(
+                    self.fc2, 'add_rule_to_section',
+                    side_effect=self.fc2.add_rule_to_section) as add_rule:
+                self.driver.create_flow_classifier(fc_context)
+                # The rule was added without an If-Match header of our own
+                self.assertIsNone(add_rule.call_args[0][2])
+            self.assertEqual(1, len(self._get_backend_rules()))
 
     def test_delete_flow_classifier(self):
         with self.flow_classifier(flow_classifier=self._fc) as fc:
-            fc_context = fc_ctx.FlowClassifierContext(
-                self.flowclassifier_plugin, self.ctx,
-                fc['flow_classifier']
-            )
+            fc_context = self._get_fc_context(fc)
             self.driver.create_flow_classifier(fc_context)
-            with mock.patch.object(
-                self.driver,
-                'update_redirect_section_in_backed') as mock_update_section:
+            with mock.patch.object(self.fc2,
+                                   'update_section') as mock_update_section:
                 self.driver.delete_flow_classifier(fc_context)
-                self.assertTrue(mock_update_section.called)
-                section = mock_update_section.call_args[0][0]
-                # make sure the rule is not there
-                self.assertIsNone(section.find('rule'))
+                mock_update_section.assert_not_called()
+            # make sure the rule is not there
+            self.assertEqual([], self._get_backend_rules())
+
+    def test_delete_flow_classifier_not_cached(self):
+        with self.flow_classifier(flow_classifier=self._fc) as fc:
+            fc_context = self._get_fc_context(fc)
+            self.driver.create_flow_classifier(fc_context)
+            # The rule was created by another neutron server
+            self.driver._rule_ids = {}
+            self.driver.delete_flow_classifier(fc_context)
+            self.assertEqual([], self._get_backend_rules())
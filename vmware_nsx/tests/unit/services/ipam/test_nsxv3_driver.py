@@ -12,13 +12,27 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import datetime
+
+import eventlet
 import mock
 import netaddr
 
+from neutron.ipam import exceptions as ipam_exc
+from neutron.ipam import requests as ipam_req
+from neutron.tests import base
+from neutron.tests.unit import testlib_api
+from neutron_lib import context
 from oslo_config import cfg
+from oslo_utils import timeutils
 from oslo_utils import uuidutils
 
+from vmware_nsx.db import nsx_models
+from vmware_nsx.extensions import projectpluginmap
+from vmware_nsx.services.ipam.common import driver as common
+from vmware_nsx.services.ipam.nsx_v3 import driver
 from vmware_nsx.tests.unit.nsx_v3 import test_plugin
+from vmware_nsx.tests.unit import test_utils
 from vmware_nsxlib.v3 import exceptions as nsx_lib_exc
 from vmware_nsxlib.v3 import nsx_constants as error
 
@@ -150,3 +164,342 @@ class TestNsxv3IpamPorts(test_plugin.TestPortsV2, MockIPPools):
 
     def test_update_port_invalid_fixed_ip_address_v6_pd_slaac(self):
         self.skipTest('Update ipam subnet is not supported')
+
+
+class StubIpPool(object):
+    """nsxlib IP pool api with a single pool, counting concurrent calls"""
+
+    def __init__(self, num_allocations, failures=None, latency=0):
+        ips = netaddr.IPNetwork('10.0.0.0/8')
+        self.allocated = set(str(ips[i + 1]) for i in range(num_allocations))
+        # Number of failed attempts to release each of those IPs
+        self.failures = failures or {}
+        self.deleted = False
+        self.calls = test_utils.ConcurrencyCounter(latency)
+
+    def get_allocations(self, pool_id):
+        return {'result_count': len(self.allocated),
+                'results': [{'allocation_id': ip} for ip in self.allocated]}
+
+    def release(self, pool_id, ip_addr):
+        self.calls.call()
+        if self.failures.get(ip_addr):
+            self.failures[ip_addr] -= 1
+            raise nsx_lib_exc.ManagerError(
+                manager='dummy', operation='release', details='error')
+        self.allocated.remove(ip_addr)
+
+    def delete(self, pool_id):
+        self.deleted = True
+
+
+class TestNsxv3IpamDeletePool(base.BaseTestCase):
+
+    def _delete_pool(self, stub_pool):
+        with mock.patch.object(driver.Nsxv3IpamDriver, '__init__',
+                               return_value=None):
+            ipam_driver = driver.Nsxv3IpamDriver(None, None)
+        ipam_driver.nsxlib_ipam = stub_pool
+        ipam_driver.delete_backend_pool('pool')
+
+    def test_delete_pool_with_allocations(self):
+        workers = cfg.CONF.nsx_v3.ipam_release_workers
+        stub_pool = StubIpPool(300)
+        self._delete_pool(stub_pool)
+        self.assertEqual(set(), stub_pool.allocated)
+        self.assertTrue(stub_pool.deleted)
+        # The releases are done concurrently by the workers
+        self.assertEqual(workers, stub_pool.calls.max_active_calls)
+
+    @test_utils.benchmark
+    def test_benchmark_delete_pool(self):
+        # Each IP release takes 1ms on the NSX
+        for num_allocations in (1000, 10000, 60000):
+            stub_pool = StubIpPool(num_allocations, latency=0.001)
+            test_utils.report_timing(
+                self, '%s allocations' % num_allocations,
+                self._delete_pool, stub_pool)
+            self.assertEqual(set(), stub_pool.allocated)
+            self.assertTrue(stub_pool.deleted)
+
+    def test_delete_pool_release_failures(self):
+        failures = {'10.0.0.1': 1,
+                    '10.0.0.2': driver.RELEASE_ATTEMPTS}
+        stub_pool = StubIpPool(100, failures=failures)
+        with mock.patch.object(driver.LOG, 'warning') as warning:
+            self._delete_pool(stub_pool)
+            # The first IP was released on retry, and the failure of the
+            # second is reported
+            self.assertEqual(set(['10.0.0.2']), stub_pool.allocated)
+            warning.assert_called_once()
+            self.assertEqual(1, warning.call_args[0][1]['num'])
+        self.assertTrue(stub_pool.deleted)
+
+
+class StubAllocationPool(object):
+    """nsxlib IP pool api with a single pool of free IPs"""
+
+    def __init__(self, num_ips):
+        ips = netaddr.IPNetwork('10.0.0.0/16')
+        self.free = [str(ips[i + 2]) for i in range(num_ips)]
+        self.allocated = set()
+
+    def get(self, pool_id):
+        return {'subnets': [{'cidr': '10.0.0.0/16',
+                             'gateway_ip': '10.0.0.1',
+                             'allocation_ranges': [
+                                 {'start': '10.0.0.2',
+                                  'end': '10.0.255.254'}]}]}
+
+    def allocate(self, pool_id, ip_addr=None):
+        # Simulate the REST round trip
+        eventlet.sleep(0)
+        if ip_addr is None:
+            if not self.free:
+                raise nsx_lib_exc.ManagerError(
+                    manager='dummy', operation='allocate',
+                    error_code=error.ERR_CODE_IPAM_POOL_EXHAUSTED)
+            ip_addr = self.free.pop(0)
+        elif ip_addr in self.free:
+            self.free.remove(ip_addr)
+        else:
+            raise nsx_lib_exc.ManagerError(
+                manager='dummy', operation='allocate',
+                error_code=error.ERR_CODE_IPAM_IP_ALLOCATED)
+        self.allocated.add(ip_addr)
+        return {'allocation_id': ip_addr}
+
+    def release(self, pool_id, ip_addr):
+        eventlet.sleep(0)
+        self.allocated.remove(ip_addr)
+        self.free.append(ip_addr)
+
+
+class TestNsxv3IpamReservation(testlib_api.SqlTestCase):
+
+    block_size = 10
+
+    def setUp(self):
+        super(TestNsxv3IpamReservation, self).setUp()
+        cfg.CONF.set_override('ipam_reservation_block_size', self.block_size,
+                              'nsx_v3')
+        self.stub_pool = StubAllocationPool(1000)
+        self.nsxlib = mock.Mock(ip_pool=self.stub_pool)
+        mock.patch.object(driver.Nsxv3IpamSubnet, '_nsxlib',
+                          new_callable=mock.PropertyMock,
+                          return_value=self.nsxlib).start()
+        self.core_plugin = mock.Mock()
+        self.core_plugin.is_tvd_plugin.return_value = False
+        mock.patch.object(driver.Nsxv3IpamSubnet, 'get_core_plugin',
+                          return_value=self.core_plugin).start()
+        mock.patch.object(common, '_stale_reservations_released_at',
+                          0).start()
+        mock.patch.dict(common._reserving_subnets, clear=True).start()
+        self.atexit_register = mock.patch.object(
+            common.atexit, 'register').start()
+        self.subnet_id = uuidutils.generate_uuid()
+
+    def _get_subnet(self):
+        # Each caller has its own context, like separate API workers
+        return driver.Nsxv3IpamSubnet.load(
+            self.subnet_id, 'pool', context.get_admin_context())
+
+    def _get_reserved_ips(self):
+        session = context.get_admin_context().session
+        return set(entry.ip_address for entry in
+                   session.query(nsx_models.NsxIpamReservedIp))
+
+    def _wait_for_refills(self):
+        while common._refills_in_progress:
+            eventlet.sleep(0)
+
+    def _allocate_concurrently(self, num_workers, num_ips):
+        def _allocate(num):
+            subnet = self._get_subnet()
+            return [subnet.allocate(ipam_req.AnyAddressRequest())
+                    for i in range(num)]
+
+        pool = eventlet.GreenPool(num_workers)
+        allocated = []
+        for ips in pool.imap(_allocate, [num_ips] * num_workers):
+            allocated.extend(ips)
+        self._wait_for_refills()
+        return allocated
+
+    def test_concurrent_allocations(self):
+        allocated = self._allocate_concurrently(20, 25)
+        self.assertEqual(500, len(allocated))
+        # No IP was handed out twice
+        self.assertEqual(500, len(set(allocated)))
+        reserved = self._get_reserved_ips()
+        self.assertEqual(set(), reserved & set(allocated))
+        self.assertLessEqual(len(reserved), self.block_size)
+        # All the IPs allocated on the backend are either used or reserved
+        self.assertEqual(self.stub_pool.allocated, set(allocated) | reserved)
+
+    def test_concurrent_allocations_pool_exhausted(self):
+        self.stub_pool = StubAllocationPool(30)
+        self.nsxlib.ip_pool = self.stub_pool
+        allocated = self._allocate_concurrently(5, 6)
+        self.assertEqual(30, len(set(allocated)))
+        self.assertEqual(set(), self._get_reserved_ips())
+        self.assertRaises(ipam_exc.IpAddressGenerationFailure,
+                          self._get_subnet().allocate,
+                          ipam_req.AnyAddressRequest())
+
+    def test_allocate_specific_reserved_ip(self):
+        subnet = self._get_subnet()
+        subnet.allocate(ipam_req.AnyAddressRequest())
+        self._wait_for_refills()
+        reserved = self._get_reserved_ips()
+        ip_address = sorted(reserved)[0]
+        self.assertEqual(ip_address, subnet.allocate(
+            ipam_req.SpecificAddressRequest(ip_address)))
+        self.assertEqual(reserved - set([ip_address]),
+                         self._get_reserved_ips())
+        # The IP was not allocated again on the backend
+        self.assertEqual(self.block_size + 1, len(self.stub_pool.allocated))
+
+    def test_deallocate_reserved_ip(self):
+        subnet = self._get_subnet()
+        subnet.allocate(ipam_req.AnyAddressRequest())
+        self._wait_for_refills()
+        # An IP whose allocation was rolled back is still reserved
+        ip_address = sorted(self._get_reserved_ips())[0]
+        subnet.deallocate(ip_address)
+        self.assertNotIn(ip_address, self._get_reserved_ips())
+        self.assertNotIn(ip_address, self.stub_pool.allocated)
+
+    def test_allocate_in_rolled_back_transaction(self):
+        subnet = self._get_subnet()
+        subnet.allocate(ipam_req.AnyAddressRequest())
+        self._wait_for_refills()
+        reserved = self._get_reserved_ips()
+        session = subnet._context.session
+        try:
+            with session.begin(subtransactions=True):
+                ip_address = subnet.allocate(ipam_req.AnyAddressRequest())
+                raise ValueError()
+        except ValueError:
+            pass
+        self._wait_for_refills()
+        # The IP was claimed in a separate transaction, so it is not reserved
+        # anymore, and neutron then deallocates it
+        self.assertIn(ip_address, reserved)
+        self.assertNotIn(ip_address, self._get_reserved_ips())
+        self.assertIn(ip_address, self.stub_pool.allocated)
+        subnet.deallocate(ip_address)
+        self.assertNotIn(ip_address, self.stub_pool.allocated)
+
+    def test_update_subnet_releases_reserved_ips(self):
+        subnet = self._get_subnet()
+        ip_address = subnet.allocate(ipam_req.AnyAddressRequest())
+        self._wait_for_refills()
+        details = subnet.get_details()
+        subnet_request = mock.Mock(
+            subnet_id=self.subnet_id, tenant_id=None,
+            gateway_ip=netaddr.IPAddress('10.0.0.254'),
+            prefixlen=details.prefixlen, subnet_cidr=details.subnet_cidr,
+            allocation_pools=details.allocation_pools)
+        with mock.patch.object(driver.Nsxv3IpamDriver, '__init__',
+                               return_value=None):
+            ipam_driver = driver.Nsxv3IpamDriver(None, None)
+        ipam_driver._context = context.get_admin_context()
+        ipam_driver.support_update_gateway = True
+        ipam_driver.support_update_pools = True
+
+        def update_backend_pool(nsx_pool_id, request):
+            # The reserved IPs are released before the pool is updated
+            self.assertEqual(set(), self._get_reserved_ips())
+            self.assertEqual(set([ip_address]), self.stub_pool.allocated)
+
+        with mock.patch.object(common.nsx_db, 'get_nsx_ipam_pool_for_subnet',
+                               return_value='pool'),\
+            mock.patch.object(ipam_driver, 'update_backend_pool',
+                              side_effect=update_backend_pool) as update:
+            ipam_driver.update_subnet(subnet_request)
+            update.assert_called_once_with('pool', subnet_request)
+
+    def test_refill_reservation_once(self):
+        # Another process already refilled the reservation
+        self._add_reserved_ips(self.subnet_id, self.block_size)
+        with mock.patch.object(common.locking.LockManager,
+                               'get_lock') as get_lock:
+            self._get_subnet()._refill_reservation()
+            get_lock.assert_called_once_with(
+                'nsx-ipam-reservation-%s' % self.subnet_id)
+        self.assertEqual(self.block_size, len(self.stub_pool.allocated))
+        self.assertEqual(self.block_size, len(self._get_reserved_ips()))
+
+    def test_release_reserved_ips_on_stop(self):
+        ip_address = self._get_subnet().allocate(
+            ipam_req.AnyAddressRequest())
+        self._wait_for_refills()
+        self.atexit_register.assert_called_once_with(
+            common._release_reserved_ips)
+        # An IP reserved by another process
+        session = context.get_admin_context().session
+        other_ip = self.stub_pool.allocate('pool')['allocation_id']
+        common.nsx_db.add_nsx_ipam_reserved_ip(
+            session, self.subnet_id, 'pool', other_ip, 'other-host:1')
+        common._release_reserved_ips()
+        # Only the IPs reserved by this process were released
+        self.assertEqual(set([other_ip]), self._get_reserved_ips())
+        self.assertEqual(set([ip_address, other_ip]),
+                         self.stub_pool.allocated)
+
+    def _add_reserved_ips(self, subnet_id, num, reserved_at=None):
+        session = context.get_admin_context().session
+        ip_addresses = set()
+        for i in range(num):
+            ip_address = self.stub_pool.allocate('pool')['allocation_id']
+            common.nsx_db.add_nsx_ipam_reserved_ip(
+                session, subnet_id, 'pool', ip_address, 'other-host:1')
+            ip_addresses.add(ip_address)
+        if reserved_at:
+            with session.begin(subtransactions=True):
+                (session.query(nsx_models.NsxIpamReservedIp).
+                 filter_by(subnet_id=subnet_id).
+                 update({'created_at': reserved_at,
+                         'updated_at': reserved_at}))
+        return ip_addresses
+
+    def test_release_stale_reservations(self):
+        stale_at = timeutils.utcnow() - datetime.timedelta(
+            seconds=common.RESERVATION_MAX_AGE + 1)
+        other_subnet_id = uuidutils.generate_uuid()
+        stale_ips = self._add_reserved_ips(self.subnet_id, 2,
+                                           reserved_at=stale_at)
+        recent_ips = self._add_reserved_ips(other_subnet_id, 2)
+        # The first refill of the process releases the stale IPs
+        allocated = set([self._get_subnet().allocate(
+            ipam_req.AnyAddressRequest())])
+        self._wait_for_refills()
+        reserved = self._get_reserved_ips()
+        stale_ips -= allocated
+        self.assertEqual(set(), stale_ips & reserved)
+        self.assertEqual(set(), stale_ips & self.stub_pool.allocated)
+        self.assertTrue(recent_ips <= reserved)
+
+    def test_release_stale_reservations_other_plugin(self):
+        stale_at = timeutils.utcnow() - datetime.timedelta(
+            seconds=common.RESERVATION_MAX_AGE + 1)
+        v_subnet_id = uuidutils.generate_uuid()
+        t_ips = self._add_reserved_ips(self.subnet_id, 2,
+                                       reserved_at=stale_at)
+        v_ips = self._add_reserved_ips(v_subnet_id, 2, reserved_at=stale_at)
+        projects = {self.subnet_id: 't-project', v_subnet_id: 'v-project'}
+        plugins = {'t-project': projectpluginmap.NsxPlugins.NSX_T,
+                   'v-project': projectpluginmap.NsxPlugins.NSX_V}
+        self.core_plugin.is_tvd_plugin.return_value = True
+        self.core_plugin.get_plugin_type_from_project.side_effect = (
+            lambda ctx, project_id: plugins[project_id])
+        with mock.patch.object(
+                driver.Nsxv3IpamSubnet, '_fetch_subnet',
+                side_effect=lambda ctx, subnet_id: {
+                    'project_id': projects[subnet_id]}):
+            self._get_subnet()._release_stale_reservations(
+                context.get_admin_context())
+        # Only the IPs of the NSX-T subnet were released
+        self.assertEqual(v_ips, self._get_reserved_ips())
+        self.assertEqual(set(), t_ips & self.stub_pool.allocated)
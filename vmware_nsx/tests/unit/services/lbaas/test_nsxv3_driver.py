@@ -22,6 +22,7 @@ from neutron_lib import exceptions as n_exc
 from vmware_nsx.db import db as nsx_db
 from vmware_nsx.services.lbaas import base_mgr
 from vmware_nsx.services.lbaas.nsx_v3.implementation import lb_utils
+from vmware_nsx.services.lbaas.nsx_v3.implementation import listener_mgr
 from vmware_nsx.services.lbaas.nsx_v3.v2 import lb_driver_v2
 
 
@@ -480,6 +481,33 @@ class TestEdgeLbaasV2Listener(BaseTestEdgeLbaasV2):
                                                           self.listener,
                                                           delete=True)
 
+    def test_stats_getter(self):
+        other_binding = {'loadbalancer_id': 'other-lb',
+                         'lb_service_id': LB_SERVICE_ID}
+        vs_stats = {'bytes_in': 10, 'bytes_out': 20,
+                    'current_sessions': 1, 'total_sessions': 5}
+        service_stats = {'virtual_servers': [
+            {'virtual_server_id': LB_VS_ID, 'statistics': vs_stats},
+            {'virtual_server_id': 'unknown-vs', 'statistics': vs_stats}]}
+        with mock.patch.object(nsx_db, 'get_nsx_lbaas_loadbalancer_bindings',
+                               return_value=[LB_BINDING, other_binding]),\
+            mock.patch.object(nsx_db, 'get_nsx_lbaas_listener_bindings',
+                              return_value=[LISTENER_BINDING]),\
+            mock.patch.object(self.service_client, 'get_stats',
+                              return_value=service_stats) as mock_get_stats:
+            stats = listener_mgr.stats_getter(self.context, self.core_plugin)
+            # The LB service shared by both loadbalancers is read once
+            mock_get_stats.assert_called_once_with(LB_SERVICE_ID)
+            self.assertEqual(1, len(stats))
+            self.assertEqual(LISTENER_ID, stats[0]['id'])
+            self.assertEqual(10, stats[0]['bytes_in'])
+            self.assertEqual(5, stats[0]['total_connections'])
+
+            # Statistics of ignored loadbalancers are not reported
+            stats = listener_mgr.stats_getter(self.context, self.core_plugin,
+                                              ignore_list=[LB_ID])
+            self.assertEqual([], stats)
+
 
 class TestEdgeLbaasV2Pool(BaseTestEdgeLbaasV2):
     def setUp(self):
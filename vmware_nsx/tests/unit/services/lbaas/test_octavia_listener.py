@@ -16,8 +16,11 @@
 import mock
 import testtools
 
+from oslo_config import cfg
+from oslo_config import fixture as config_fixture
 from oslo_utils import uuidutils
 
+from vmware_nsx.common import config  # noqa
 from vmware_nsx.services.lbaas.octavia import octavia_listener
 
 
@@ -299,3 +302,106 @@ class TestNsxOctaviaListener(testtools.TestCase):
                 {'operating_status': 'ONLINE',
                  'provisioning_status': 'ACTIVE',
                  'id': mock.ANY}]})
+
+
+class TestNsxOctaviaStatisticsCollector(testtools.TestCase):
+    def setUp(self):
+        super(TestNsxOctaviaStatisticsCollector, self).setUp()
+        self.conf = self.useFixture(config_fixture.Config(cfg.CONF))
+        self.conf.config(octavia_stats_interval=0)
+        self.stats = []
+        self.core_plugin = mock.MagicMock()
+        self.endpoint = self.core_plugin.octavia_listener.endpoints[0]
+        self.collector = octavia_listener.NSXOctaviaStatisticsCollector(
+            self.core_plugin, lambda *args, **kwargs: self.stats)
+        mock.patch.object(self.collector, '_get_nl_loadbalancers',
+                          return_value=[]).start()
+        mock.patch('neutron_lib.context.get_admin_context').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _listener_stats(self, listener_id, active=1):
+        return {'id': listener_id, 'active_connections': active,
+                'bytes_in': 0, 'bytes_out': 0, 'total_connections': active}
+
+    def _sent_listeners(self):
+        sent = []
+        for call in self.endpoint.update_listener_statistics.call_args_list:
+            sent.append([stats['id'] for stats in call[0][0]['listeners']])
+        self.endpoint.update_listener_statistics.reset_mock()
+        return sent
+
+    def test_collect_all(self):
+        self.stats = [self._listener_stats('l1'), self._listener_stats('l2')]
+        self.collector.collect()
+        self.collector.collect()
+        self.assertEqual([['l1', 'l2'], ['l1', 'l2']], self._sent_listeners())
+
+    def test_collect_changes_only(self):
+        self.conf.config(octavia_stats_changes_only=True)
+        self.stats = [self._listener_stats('l1'), self._listener_stats('l2')]
+        self.collector.collect()
+        self.assertEqual([['l1', 'l2']], self._sent_listeners())
+
+        # Nothing changed
+        self.collector.collect()
+        self.assertEqual([], self._sent_listeners())
+
+        self.stats = [self._listener_stats('l1', active=5),
+                      self._listener_stats('l2')]
+        self.collector.collect()
+        self.assertEqual([['l1']], self._sent_listeners())
+
+    def test_collect_changes_only_full_refresh(self):
+        self.conf.config(octavia_stats_changes_only=True,
+                         octavia_stats_full_refresh_interval=0)
+        self.stats = [self._listener_stats('l1')]
+        self.collector.collect()
+        self.collector.collect()
+        self.assertEqual([['l1'], ['l1']], self._sent_listeners())
+
+    def test_collect_failed_full_refresh_is_retried(self):
+        self.conf.config(octavia_stats_changes_only=True,
+                         octavia_stats_full_refresh_interval=100)
+        mock_time = mock.patch.object(octavia_listener, 'time').start()
+        self.stats = [self._listener_stats('l1')]
+        mock_time.time.return_value = 1000
+        self.collector.collect()
+        self.assertEqual([['l1']], self._sent_listeners())
+
+        # The full refresh is due, but fails
+        mock_time.time.return_value = 1200
+        self.endpoint.update_listener_statistics.side_effect = Exception
+        self.assertRaises(Exception, self.collector.collect)
+        self._sent_listeners()
+
+        # The unchanged statistics are still refreshed on the next run
+        mock_time.time.return_value = 1201
+        self.endpoint.update_listener_statistics.side_effect = None
+        self.collector.collect()
+        self.assertEqual([['l1']], self._sent_listeners())
+        mock_time.time.return_value = 1202
+        self.collector.collect()
+        self.assertEqual([], self._sent_listeners())
+
+    def test_collect_batches(self):
+        self.conf.config(octavia_stats_batch_size=2)
+        self.stats = [self._listener_stats('l%s' % i) for i in range(5)]
+        self.collector.collect()
+        self.assertEqual([['l0', 'l1'], ['l2', 'l3'], ['l4']],
+                         self._sent_listeners())
+
+    def test_collect_failed_batch_is_resent(self):
+        self.conf.config(octavia_stats_changes_only=True,
+                         octavia_stats_batch_size=1)
+        self.stats = [self._listener_stats('l1'), self._listener_stats('l2')]
+        self.collector.collect()
+        self._sent_listeners()
+        self.stats = [self._listener_stats('l1', active=2),
+                      self._listener_stats('l2', active=2)]
+        self.endpoint.update_listener_statistics.side_effect = [
+            None, Exception]
+        self.assertRaises(Exception, self.collector.collect)
+        self._sent_listeners()
+        self.endpoint.update_listener_statistics.side_effect = None
+        self.collector.collect()
+        self.assertEqual([['l2']], self._sent_listeners())
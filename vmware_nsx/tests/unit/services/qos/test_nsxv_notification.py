@@ -16,6 +16,7 @@ import copy
 
 import mock
 from neutron.services.qos import qos_plugin
+from neutron.tests import base as neutron_base
 from neutron.tests.unit.services.qos import base
 from neutron_lib import context
 from neutron_lib.objects import registry as obj_reg
@@ -24,12 +25,14 @@ from neutron_lib.services.qos import constants as qos_consts
 from oslo_config import cfg
 from oslo_utils import uuidutils
 
+from vmware_nsx.common import exceptions as nsx_exc
 from vmware_nsx.dvs import dvs
 from vmware_nsx.dvs import dvs_utils
 from vmware_nsx.services.qos.common import utils as qos_com_utils
 from vmware_nsx.services.qos.nsx_v import driver as qos_driver
 from vmware_nsx.services.qos.nsx_v import utils as qos_utils
 from vmware_nsx.tests.unit.nsx_v import test_plugin
+from vmware_nsx.tests.unit import test_utils
 
 CORE_PLUGIN = "vmware_nsx.plugins.nsx_v.plugin.NsxVPluginV2"
 QosPolicy = obj_reg.load_class('QosPolicy')
@@ -338,3 +341,89 @@ class TestQosNsxVNotification(test_plugin.NsxVPluginV2TestCase,
         is deleted
         """
         self._test_dscp_rule_action_notification('delete')
+
+
+class StubDvsManager(object):
+    """DVS manager counting the concurrent port group updates"""
+
+    def __init__(self, failing_morefs=(), latency=0):
+        self.failing_morefs = failing_morefs
+        self.updated_morefs = []
+        self.calls = test_utils.ConcurrencyCounter(latency)
+
+    def update_port_group_spec_qos(self, *args):
+        pass
+
+    def update_port_groups_config(self, dvs_id, net_id, net_moref,
+                                  spec_update_calback, spec_update_data):
+        self.calls.call()
+        if net_moref in self.failing_morefs:
+            raise Exception("Failed to update %s" % net_moref)
+        self.updated_morefs.append(net_moref)
+
+
+class TestNsxVQosDriverUpdatePolicy(neutron_base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNsxVQosDriverUpdatePolicy, self).setUp()
+        self.core_plugin = mock.Mock()
+        self.core_plugin.is_tvd_plugin.return_value = False
+        self.core_plugin._get_network_dvs_mappings.side_effect = (
+            lambda context, net_id: [('dvs-1', 'moref-%s' % net_id)])
+        self.core_plugin._update_qos_on_backend_port_groups.side_effect = (
+            self._update_qos_on_backend_port_groups)
+        self.driver = qos_driver.NSXvQosDriver.create(self.core_plugin)
+        mock.patch.object(qos_utils, 'NsxVQosRule').start()
+        self.ctxt = context.get_admin_context()
+
+    def _update_qos_on_backend_port_groups(self, net_id, dvs_id, net_moref,
+                                           qos_data):
+        vcm = self.core_plugin._vcm
+        vcm.update_port_groups_config(dvs_id, net_id, net_moref,
+                                      vcm.update_port_group_spec_qos,
+                                      qos_data)
+
+    def _update_policy(self, num_networks):
+        policy = mock.Mock(id=uuidutils.generate_uuid())
+        policy.get_bound_networks.return_value = [
+            'net-%s' % i for i in range(num_networks)]
+        self.driver.update_policy(self.ctxt, policy)
+
+    def test_update_policy(self):
+        self.core_plugin._vcm = StubDvsManager()
+        self._update_policy(20)
+        self.assertEqual(sorted('moref-net-%s' % i for i in range(20)),
+                         sorted(self.core_plugin._vcm.updated_morefs))
+
+    def test_update_policy_partial_failure(self):
+        self.core_plugin._vcm = StubDvsManager(
+            failing_morefs=('moref-net-3', 'moref-net-7'))
+        e = self.assertRaises(nsx_exc.NsxPluginException,
+                              self._update_policy, 10)
+        self.assertIn('2 out of 10 networks', str(e))
+        self.assertIn('net-3, net-7', str(e))
+        # All the other networks were still updated
+        self.assertEqual(8, len(self.core_plugin._vcm.updated_morefs))
+
+    def test_update_policy_concurrency(self):
+        workers = 10
+        cfg.CONF.set_override('qos_update_workers', workers, 'nsxv')
+        for num_networks in (5, 50):
+            self.core_plugin._vcm = StubDvsManager()
+            self._update_policy(num_networks)
+            self.assertEqual(num_networks,
+                             len(self.core_plugin._vcm.updated_morefs))
+            # The port groups are updated concurrently by the workers
+            self.assertEqual(min(workers, num_networks),
+                             self.core_plugin._vcm.calls.max_active_calls)
+
+    @test_utils.benchmark
+    def test_benchmark_update_policy(self):
+        # Each port group reconfiguration takes 50ms on the vCenter
+        for num_networks in (10, 100, 1000):
+            self.core_plugin._vcm = StubDvsManager(latency=0.05)
+            test_utils.report_timing(
+                self, '%s networks' % num_networks,
+                self._update_policy, num_networks)
+            self.assertEqual(num_networks,
+                             len(self.core_plugin._vcm.updated_morefs))
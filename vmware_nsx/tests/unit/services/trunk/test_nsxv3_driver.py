@@ -15,6 +15,7 @@
 
 import mock
 
+from neutron.services.trunk import constants as trunk_consts
 from neutron.tests import base
 
 from neutron_lib import context
@@ -22,9 +23,12 @@ from oslo_config import cfg
 from oslo_utils import importutils
 
 from vmware_nsx.common import nsx_constants
+from vmware_nsx.common import utils
 from vmware_nsx.services.trunk.nsx_v3 import driver as trunk_driver
 from vmware_nsx.tests.unit.nsx_v3 import test_constants as test_consts
 from vmware_nsx.tests.unit.nsx_v3 import test_plugin as test_nsx_v3_plugin
+from vmware_nsx.tests.unit import test_utils
+from vmware_nsxlib.v3 import exceptions as nsxlib_exc
 
 
 class TestNsxV3TrunkHandler(test_nsx_v3_plugin.NsxV3PluginTestCaseMixin,
@@ -35,6 +39,9 @@ class TestNsxV3TrunkHandler(test_nsx_v3_plugin.NsxV3PluginTestCaseMixin,
         self.core_plugin = importutils.import_object(test_consts.PLUGIN_NAME)
         self.handler = trunk_driver.NsxV3TrunkHandler(self.core_plugin)
         self.handler._update_port_at_backend = mock.Mock()
+        self.core_plugin.get_ports = mock.Mock(
+            side_effect=lambda ctx, filters: [{'id': port_id}
+                                              for port_id in filters['id']])
         self.trunk_1 = mock.Mock()
         self.trunk_1.port_id = "parent_port_1"
 
@@ -56,6 +63,9 @@ class TestNsxV3TrunkHandler(test_nsx_v3_plugin.NsxV3PluginTestCaseMixin,
         self.sub_port_3.trunk_id = "trunk-2"
         self.sub_port_3.port_id = "sub_port_3"
 
+    def _backend_call_args(self, parent_port_id, subport):
+        return (parent_port_id, subport, {'id': subport.port_id}, None)
+
     def test_trunk_created(self):
         # Create trunk with no subport
         self.trunk_1.sub_ports = []
@@ -66,21 +76,15 @@ class TestNsxV3TrunkHandler(test_nsx_v3_plugin.NsxV3PluginTestCaseMixin,
         self.trunk_1.sub_ports = [self.sub_port_1]
         self.handler.trunk_created(self.context, self.trunk_1)
         self.handler._update_port_at_backend.assert_called_with(
-            self.context,
-            self.trunk_1.port_id,
-            self.sub_port_1)
+            *self._backend_call_args(self.trunk_1.port_id, self.sub_port_1))
 
         # Create trunk with multiple subports
         self.trunk_2.sub_ports = [self.sub_port_2, self.sub_port_3]
         self.handler.trunk_created(self.context, self.trunk_2)
-        calls = [mock.call._update_port_at_backend(
-                     self.context,
-                     self.trunk_2.port_id,
-                     self.sub_port_2),
-                 mock.call._update_port_at_backend(
-                     self.context,
-                     self.trunk_2.port_id,
-                     self.sub_port_3)]
+        calls = [mock.call(*self._backend_call_args(
+                     self.trunk_2.port_id, self.sub_port_2)),
+                 mock.call(*self._backend_call_args(
+                     self.trunk_2.port_id, self.sub_port_3))]
         self.handler._update_port_at_backend.assert_has_calls(
             calls, any_order=True)
 
@@ -94,21 +98,13 @@ class TestNsxV3TrunkHandler(test_nsx_v3_plugin.NsxV3PluginTestCaseMixin,
         self.trunk_1.sub_ports = [self.sub_port_1]
         self.handler.trunk_deleted(self.context, self.trunk_1)
         self.handler._update_port_at_backend.assert_called_with(
-            context=self.context,
-            parent_port_id=None,
-            subport=self.sub_port_1)
+            *self._backend_call_args(None, self.sub_port_1))
 
         # Delete trunk with multiple subports
         self.trunk_2.sub_ports = [self.sub_port_2, self.sub_port_3]
         self.handler.trunk_deleted(self.context, self.trunk_2)
-        calls = [mock.call._update_port_at_backend(
-                     context=self.context,
-                     parent_port_id=None,
-                     subport=self.sub_port_2),
-                 mock.call._update_port_at_backend(
-                     context=self.context,
-                     parent_port_id=None,
-                     subport=self.sub_port_3)]
+        calls = [mock.call(*self._backend_call_args(None, self.sub_port_2)),
+                 mock.call(*self._backend_call_args(None, self.sub_port_3))]
         self.handler._update_port_at_backend.assert_has_calls(
             calls, any_order=True)
 
@@ -122,21 +118,15 @@ class TestNsxV3TrunkHandler(test_nsx_v3_plugin.NsxV3PluginTestCaseMixin,
         sub_ports = [self.sub_port_1]
         self.handler.subports_added(self.context, self.trunk_1, sub_ports)
         self.handler._update_port_at_backend.assert_called_with(
-            self.context,
-            self.trunk_1.port_id,
-            self.sub_port_1)
+            *self._backend_call_args(self.trunk_1.port_id, self.sub_port_1))
 
         # Update trunk with multiple subports
         sub_ports = [self.sub_port_2, self.sub_port_3]
         self.handler.subports_added(self.context, self.trunk_2, sub_ports)
-        calls = [mock.call._update_port_at_backend(
-                     self.context,
-                     self.trunk_2.port_id,
-                     self.sub_port_2),
-                 mock.call._update_port_at_backend(
-                     self.context,
-                     self.trunk_2.port_id,
-                     self.sub_port_3)]
+        calls = [mock.call(*self._backend_call_args(
+                     self.trunk_2.port_id, self.sub_port_2)),
+                 mock.call(*self._backend_call_args(
+                     self.trunk_2.port_id, self.sub_port_3))]
         self.handler._update_port_at_backend.assert_has_calls(
             calls, any_order=True)
 
@@ -150,25 +140,118 @@ class TestNsxV3TrunkHandler(test_nsx_v3_plugin.NsxV3PluginTestCaseMixin,
         sub_ports = [self.sub_port_1]
         self.handler.subports_deleted(self.context, self.trunk_1, sub_ports)
         self.handler._update_port_at_backend.assert_called_with(
-            context=self.context,
-            parent_port_id=None,
-            subport=self.sub_port_1)
+            *self._backend_call_args(None, self.sub_port_1))
 
         # Update trunk to remove multiple subports
         sub_ports = [self.sub_port_2, self.sub_port_3]
         self.handler.subports_deleted(self.context, self.trunk_2, sub_ports)
-        calls = [mock.call._update_port_at_backend(
-                     context=self.context,
-                     parent_port_id=None,
-                     subport=self.sub_port_2),
-                 mock.call._update_port_at_backend(
-                     context=self.context,
-                     parent_port_id=None,
-                     subport=self.sub_port_3)]
+        calls = [mock.call(*self._backend_call_args(None, self.sub_port_2)),
+                 mock.call(*self._backend_call_args(None, self.sub_port_3))]
         self.handler._update_port_at_backend.assert_has_calls(
             calls, any_order=True)
 
 
+class FakeLogicalPort(object):
+    """nsxlib logical port api, with the latency of the REST calls"""
+
+    def __init__(self, port_ids, latency=0.01, failing_ports=()):
+        self.ports = dict(('nsx-%s' % port_id, {'id': 'nsx-%s' % port_id})
+                          for port_id in port_ids)
+        self.failing_ports = failing_ports
+        self.calls = test_utils.ConcurrencyCounter(latency)
+
+    def get(self, lport_id):
+        self.calls.call()
+        return dict(self.ports[lport_id])
+
+    def update(self, lport_id, vif_uuid, parent_vif_id=None, traffic_tag=None,
+               **kwargs):
+        self.calls.call()
+        if vif_uuid in self.failing_ports:
+            raise nsxlib_exc.ManagerError(
+                manager='dummy', operation='update', details='error')
+        self.ports[lport_id].update(parent_vif_id=parent_vif_id,
+                                    traffic_tag=traffic_tag)
+
+
+class TestNsxV3TrunkSubports(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNsxV3TrunkSubports, self).setUp()
+        self.context = mock.Mock()
+        self.trunk = mock.Mock(port_id='parent-port')
+        self.plugin_driver = mock.Mock()
+        self.plugin_driver.get_ports.side_effect = (
+            lambda ctx, filters: [{'id': port_id}
+                                  for port_id in filters['id']])
+        self.plugin_driver._build_address_bindings.return_value = []
+        mock.patch.object(
+            trunk_driver.nsx_db, 'get_nsx_switch_and_port_ids',
+            side_effect=lambda session, port_ids: dict(
+                (port_id, ('switch', 'nsx-%s' % port_id))
+                for port_id in port_ids)).start()
+        self.handler = trunk_driver.NsxV3TrunkHandler(self.plugin_driver)
+
+    def _get_subports(self, num_subports, failing_ports=()):
+        subports = [mock.Mock(port_id='port-%s' % i, trunk_id='trunk',
+                              segmentation_type=utils.NsxV3NetworkTypes.VLAN,
+                              segmentation_id=100 + i)
+                    for i in range(num_subports)]
+        self.logical_port = FakeLogicalPort(
+            [subport.port_id for subport in subports],
+            failing_ports=failing_ports)
+        self.plugin_driver.nsxlib.logical_port = self.logical_port
+        return subports
+
+    def _get_parents(self):
+        return dict((port['id'], port.get('parent_vif_id'))
+                    for port in self.logical_port.ports.values())
+
+    def test_subports_added_concurrently(self):
+        workers = cfg.CONF.nsx_v3.trunk_subport_workers
+        subports = self._get_subports(300)
+        self.handler.subports_added(self.context, self.trunk, subports)
+        self.trunk.update.assert_called_once_with(
+            status=trunk_consts.ACTIVE_STATUS)
+        self.assertEqual(set(['parent-port']),
+                         set(self._get_parents().values()))
+        self.assertEqual(workers, self.logical_port.calls.max_active_calls)
+
+    @test_utils.benchmark
+    def test_benchmark_subports_added(self):
+        # Each NSX call takes 10ms, and each subport needs 2 calls
+        for workers in (1, cfg.CONF.nsx_v3.trunk_subport_workers):
+            cfg.CONF.set_override('trunk_subport_workers', workers, 'nsx_v3')
+            for num_subports in (100, 1000):
+                subports = self._get_subports(num_subports)
+                test_utils.report_timing(
+                    self, '%s subports, %s workers' % (num_subports, workers),
+                    self.handler.subports_added, self.context, self.trunk,
+                    subports)
+                self.assertEqual(set(['parent-port']),
+                                 set(self._get_parents().values()))
+
+    def test_subports_added_partial_failure(self):
+        subports = self._get_subports(30, failing_ports=('port-3', 'port-7'))
+        self.handler.subports_added(self.context, self.trunk, subports)
+        self.trunk.update.assert_called_once_with(
+            status=trunk_consts.ERROR_STATUS)
+        # The subports which were added were removed again
+        self.assertEqual(set([None]), set(self._get_parents().values()))
+
+    def test_subports_deleted_partial_failure(self):
+        subports = self._get_subports(30)
+        self.handler.subports_added(self.context, self.trunk, subports)
+        self.logical_port.failing_ports = ('port-3',)
+        self.handler.subports_deleted(self.context, self.trunk, subports)
+        self.trunk.update.assert_called_with(
+            status=trunk_consts.ERROR_STATUS)
+        # All the other subports were removed
+        parents = self._get_parents()
+        self.assertEqual('parent-port', parents.pop('nsx-port-3'))
+        self.assertEqual(set([None]), set(parents.values()))
+
+
 class TestNsxV3TrunkDriver(base.BaseTestCase):
     def setUp(self):
         super(TestNsxV3TrunkDriver, self).setUp()
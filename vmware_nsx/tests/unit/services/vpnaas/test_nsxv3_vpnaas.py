@@ -15,8 +15,10 @@
 
 from collections import namedtuple
 import contextlib
+import time
 
 import mock
+from oslo_config import cfg
 from oslo_utils import uuidutils
 
 from neutron.db import l3_db
@@ -495,6 +497,79 @@ class TestDriverValidation(base.BaseTestCase):
                                    router_subnets=router_subnets)
 
 
+class TestConnectionCidrIndex(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestConnectionCidrIndex, self).setUp()
+        self.index = ipsec_driver.ConnectionCidrIndex()
+        self.conns = {'conn1': '10.0.0.0/24',
+                      'conn2': '10.0.1.0/24',
+                      'conn3': '10.0.0.0/16',
+                      'conn4': '192.168.10.0/24',
+                      'conn5': '2001:db8::/64'}
+        for conn_id, cidr in self.conns.items():
+            self.index.add_connection(conn_id, cidr)
+
+    def _check(self, cidrs, expected):
+        self.assertEqual(set(expected),
+                         self.index.get_overlapping_connections(cidrs))
+
+    def test_overlapping_connections(self):
+        # subnet of a connection cidr
+        self._check(['10.0.0.128/25'], ['conn1', 'conn3'])
+        # supernet of connections cidrs
+        self._check(['10.0.0.0/8'], ['conn1', 'conn2', 'conn3'])
+        self._check(['192.168.0.0/16', '10.0.1.0/24'],
+                    ['conn2', 'conn3', 'conn4'])
+        self._check(['2001:db8::/32'], ['conn5'])
+        # no overlap
+        self._check(['10.1.0.0/16', '192.168.11.0/24', '2001:db9::/64'], [])
+
+    def test_remove_connection(self):
+        self.index.remove_connection('conn3')
+        self._check(['10.0.0.0/8'], ['conn1', 'conn2'])
+        self._check(['10.0.2.0/24'], [])
+        # removing an unknown connection does nothing
+        self.index.remove_connection('conn3')
+
+    def test_update_connection_cidr(self):
+        self.index.add_connection('conn1', '172.16.0.0/24')
+        self._check(['10.0.0.0/24'], ['conn3'])
+        self._check(['172.16.0.0/12'], ['conn1'])
+
+    def _sync(self, fingerprint, query=None):
+        with mock.patch.object(self.index, '_get_fingerprint',
+                               return_value=fingerprint),\
+            mock.patch.object(self.index, '_get_query',
+                              return_value=query) as get_query:
+            self.index.sync(mock.Mock())
+        return get_query
+
+    def test_sync_unchanged(self):
+        self.index._loaded_at = time.time()
+        self.index._fingerprint = (5, 'conn1', 'conn5')
+        # The connections are not read when the fingerprint is unchanged
+        get_query = self._sync((5, 'conn1', 'conn5'))
+        get_query.assert_not_called()
+
+    def test_sync_replaced_connection(self):
+        self.index._loaded_at = time.time()
+        self.index._fingerprint = (5, 'conn1', 'conn5')
+        # conn3 was deleted and conn6 created by another worker, so the
+        # number of connections did not change
+        self.conns.pop('conn3')
+        self.conns['conn6'] = '172.16.0.0/24'
+        query = mock.Mock()
+        query.with_entities.return_value.all.return_value = [
+            (conn_id,) for conn_id in self.conns]
+        query.filter.return_value.all.return_value = [
+            ('conn6', '172.16.0.0/24')]
+        self._sync((5, 'conn1', 'conn6'), query)
+        self.assertEqual((5, 'conn1', 'conn6'), self.index._fingerprint)
+        self._check(['10.0.0.0/8'], ['conn1', 'conn2'])
+        self._check(['172.16.0.0/12'], ['conn6'])
+
+
 class TestVpnaasDriver(test_plugin.NsxV3PluginTestCaseMixin):
 
     def setUp(self):
@@ -549,6 +624,11 @@ class TestVpnaasDriver(test_plugin.NsxV3PluginTestCaseMixin):
             create_dpd.assert_called_once()
             create_sesson.assert_called_once()
             update_adv.assert_called_once()
+            # the connection local subnet was added to the index
+            self.assertEqual(
+                set([FAKE_IPSEC_CONNECTION_ID]),
+                self.driver._cidr_index.get_overlapping_connections(
+                    ['1.1.1.128/25']))
 
     def test_update_ipsec_site_connection(self):
         with mock.patch.object(self.service_plugin, '_get_vpnservice',
@@ -597,6 +677,45 @@ class TestVpnaasDriver(test_plugin.NsxV3PluginTestCaseMixin):
             delete_dpd.assert_called_once()
             delete_sesson.assert_called_once()
             update_adv.assert_called_once()
+            self.assertEqual(
+                set(), self.driver._cidr_index.get_overlapping_connections(
+                    ['1.1.1.0/24']))
+
+    def test_get_ipsec_site_connections_status(self):
+        cfg.CONF.set_override('vpn_status_interval', 60, 'nsx_v3')
+        mappings = [{'neutron_id': 'conn1', 'session_id': 'sess1'},
+                    {'neutron_id': 'conn2', 'session_id': 'sess2'}]
+        nsx_statuses = {'sess1': {'session_status': 'UP'},
+                        'sess2': {'session_status': 'DEGRADED'}}
+        with mock.patch("vmware_nsx.db.db.get_nsx_vpn_connection_mappings",
+                        return_value=mappings) as get_mappings,\
+            mock.patch.object(self.nsxlib_vpn.session, 'get_status',
+                              side_effect=lambda sess: nsx_statuses[sess]
+                              ) as get_status:
+            statuses = self.driver.get_ipsec_site_connections_status(
+                self.context, ['conn1', 'conn2'])
+            self.assertEqual({'conn1': 'ACTIVE', 'conn2': 'DOWN'}, statuses)
+            self.assertEqual(2, get_status.call_count)
+
+            # the statuses are now served from the cache
+            self.assertEqual(
+                'DOWN', self.driver.get_ipsec_site_connection_status(
+                    self.context, 'conn2'))
+            get_mappings.assert_called_once()
+            self.assertEqual(2, get_status.call_count)
+
+    def test_get_ipsec_site_connections_status_no_cache(self):
+        mappings = [{'neutron_id': 'conn1', 'session_id': 'sess1'}]
+        with mock.patch("vmware_nsx.db.db.get_nsx_vpn_connection_mappings",
+                        return_value=mappings),\
+            mock.patch.object(self.nsxlib_vpn.session, 'get_status',
+                              return_value={'session_status': 'UP'}
+                              ) as get_status:
+            for i in range(2):
+                self.assertEqual(
+                    'ACTIVE', self.driver.get_ipsec_site_connection_status(
+                        self.context, 'conn1'))
+            self.assertEqual(2, get_status.call_count)
 
     def test_create_vpn_service_legal(self):
         """Create a legal vpn service"""
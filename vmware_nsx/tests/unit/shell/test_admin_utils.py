@@ -33,6 +33,7 @@ from vmware_nsx._i18n import _
 from vmware_nsx.common import config  # noqa
 from vmware_nsx.db import nsxv_db
 from vmware_nsx.dvs import dvs_utils
+from vmware_nsx.shell.admin.plugins.nsxv.resources import dhcp_binding
 from vmware_nsx.shell.admin.plugins.nsxv.resources import utils as nsxv_utils
 from vmware_nsx.shell.admin.plugins.nsxv3.resources import utils as nsxv3_utils
 from vmware_nsx.shell import resources
@@ -40,6 +41,7 @@ from vmware_nsx.tests import unit as vmware
 from vmware_nsx.tests.unit.nsx_p import test_plugin as test_p_plugin
 from vmware_nsx.tests.unit.nsx_v import test_plugin as test_v_plugin
 from vmware_nsx.tests.unit.nsx_v3 import test_plugin as test_v3_plugin
+from vmware_nsx.tests.unit import test_utils
 from vmware_nsxlib.v3 import core_resources
 from vmware_nsxlib.v3 import resources as nsx_v3_resources
 
@@ -234,6 +236,51 @@ class TestNsxvAdminUtils(AbstractTestAdminUtils,
         self._test_resource('routers', 'nsx-recreate', **args)
 
 
+class TestNsxvRunOnEdges(base.BaseTestCase):
+
+    def _get_edge_config(self, edge_id):
+        # Each edge completes after a different number of backend round trips
+        for i in range(int(edge_id.split('-')[1])):
+            self.calls.call()
+        if edge_id == 'edge-2':
+            raise Exception('Failed to get edge %s' % edge_id)
+        return 'config-%s' % edge_id
+
+    def _run_on_edges(self, edge_ids, pool_size):
+        self.calls = test_utils.ConcurrencyCounter()
+        return list(dhcp_binding.run_on_edges(
+            self._get_edge_config, edge_ids, pool_size=pool_size))
+
+    def test_results_streamed_by_completion(self):
+        with mock.patch.object(dhcp_binding.LOG, 'error') as log_error:
+            results = self._run_on_edges(['edge-3', 'edge-1', 'edge-2'], 3)
+            # The failure of edge-2 is logged, and the other edges are done
+            log_error.assert_called_once()
+        self.assertEqual([(1, 'edge-1', 'config-edge-1'),
+                          (2, 'edge-2', None),
+                          (3, 'edge-3', 'config-edge-3')], results)
+
+    def test_pool_size(self):
+        edge_ids = ['edge-%s' % (i % 3 + 3) for i in range(20)]
+        results = self._run_on_edges(edge_ids, 4)
+        self.assertEqual(list(range(1, 21)), [r[0] for r in results])
+        self.assertEqual(4, self.calls.max_active_calls)
+
+    def test_no_edges(self):
+        self.assertEqual([], self._run_on_edges([], 4))
+
+    def test_workers_property(self):
+        self.assertEqual(dhcp_binding.DEFAULT_EDGE_WORKERS,
+                         dhcp_binding._get_edge_workers({}))
+        self.assertEqual(5, dhcp_binding._get_edge_workers(
+            {'property': ['workers=5']}))
+        with mock.patch.object(dhcp_binding.LOG, 'error') as log_error:
+            for workers in ('0', '-1', 'many'):
+                self.assertIsNone(dhcp_binding._get_edge_workers(
+                    {'property': ['workers=%s' % workers]}))
+            self.assertEqual(3, log_error.call_count)
+
+
 class TestNsxv3AdminUtils(AbstractTestAdminUtils,
                           test_v3_plugin.NsxV3PluginTestCaseMixin):
 
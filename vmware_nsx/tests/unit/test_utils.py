@@ -13,8 +13,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
+import os
+import sys
+import time
+
+import eventlet
 from oslo_config import cfg
 
+# The benchmarks are skipped unless this environment variable is set, e.g.
+# VMWARE_NSX_BENCHMARKS=1 python -m testtools.run <benchmark test id>
+BENCHMARKS_ENV = 'VMWARE_NSX_BENCHMARKS'
+
 
 def override_nsx_ini_test():
     cfg.CONF.set_override("default_tz_uuid", "fake_tz_uuid")
@@ -43,3 +53,40 @@ def override_nsx_ini_full_test():
     cfg.CONF.set_override("http_timeout", 13)
     cfg.CONF.set_override("redirects", 12)
     cfg.CONF.set_override("retries", "11")
+
+
+class ConcurrencyCounter(object):
+    """Count the concurrent calls made to a stubbed backend api"""
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.active_calls = 0
+        self.max_active_calls = 0
+
+    def call(self):
+        """Simulate a backend round trip, letting other threads run"""
+        self.active_calls += 1
+        self.max_active_calls = max(self.max_active_calls, self.active_calls)
+        try:
+            eventlet.sleep(self.latency)
+        finally:
+            self.active_calls -= 1
+
+
+def benchmark(func):
+    """Decorate a test method which is a benchmark, skipped by default"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not os.environ.get(BENCHMARKS_ENV):
+            self.skipTest("Benchmarks run only with %s=1" % BENCHMARKS_ENV)
+        return func(self, *args, **kwargs)
+    return wrapper
+
+
+def report_timing(test, name, func, *args, **kwargs):
+    """Run func, and print its wall-clock time"""
+    start = time.time()
+    result = func(*args, **kwargs)
+    sys.stdout.write("%s %s: %.3f seconds\n" % (
+        test.id(), name, time.time() - start))
+    return result